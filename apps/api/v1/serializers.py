@@ -1,6 +1,7 @@
 # django
 from django.contrib.gis.geos import Point
 from django.core.exceptions import PermissionDenied
+from django.utils import timezone
 
 # third party
 from drf_dynamic_fields import DynamicFieldsMixin
@@ -17,6 +18,7 @@ from apps.core.utils import get_coordinates_by_address
 from apps.management.chat.models import Message
 from apps.management.drivers.models import DriverProfile
 from apps.management.orders.constants import OrderStatus, PaymentMethod
+from apps.management.orders.jobs import submit_payment
 from apps.management.orders.models import Order, Position, Payment
 from apps.management.warehouses.models import Warehouse
 from apps.shared.models import Location
@@ -129,8 +131,12 @@ class OrderSerializer(DynamicFieldsMixin,
         return order.status_verbose
 
     def get_warehouse_location(self, order):
-        serializer = WarehouseSerializer(order.warehouse)
-        return serializer.data
+        # orders of a page mostly share a few warehouses
+        locations = self.__dict__.setdefault('_warehouse_locations', {})
+        if order.warehouse_id not in locations:
+            serializer = WarehouseSerializer(order.warehouse)
+            locations[order.warehouse_id] = serializer.data
+        return locations[order.warehouse_id]
 
     def create(self, validated_data):
         request = self.context['request']
@@ -144,7 +150,9 @@ class OrderSerializer(DynamicFieldsMixin,
 
         if order.payment_method == PaymentMethod.MPESA:
             payment = Payment.objects.create(order=order)
-            payment.new_submit()
+            order.pending_transaction = True
+            order.save(update_fields=['pending_transaction'])
+            submit_payment.delay(payment_id=payment.id)
 
         return order
 
@@ -213,10 +221,12 @@ class DriverLocationSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         latitude = validated_data.pop('latitude')
         longitude = validated_data.pop('longitude')
-        instance = super().update(instance, validated_data)
-        coordinates = Point(latitude, longitude)
-        instance.coordinates = coordinates
-        instance.save()
+        # a ping rewrites the location only, not the whole profile
+        instance.coordinates = Point(latitude, longitude)
+        instance.location_recorded_at = timezone.now()
+        instance.save(update_fields=[
+            'coordinates', 'location_recorded_at', 'last_update'
+        ])
         return instance
 
 
@@ -235,7 +245,7 @@ class DriverProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = DriverProfile
         read_only_fields = ('coordinates', )
-        exclude = ('id', )
+        exclude = ('id', 'location_recorded_at')
 
     def get_changed_password(self, obj):
         return obj.user.changed_password
@@ -8,7 +8,7 @@ from rest_framework import routers
 from apps.api.v1.views import OrdersViewSet, DriverLocationViewSet, \
     DriverOrdersViewSet, ChangePasswordView, RestorePasswordRequestView, \
     RestorePasswordSubmitView, MessageView, DriverProfileViewSet, \
-    UnregisterDeviceView
+    UnregisterDeviceView, DriverLocationsView
 
 router = routers.DefaultRouter()
 router.register(r'orders', OrdersViewSet)
@@ -29,6 +29,11 @@ drivers_urls = [
         DriverLocationViewSet.as_view({'patch': 'update'}),
         name='driver-location'
     ),
+    re_path(
+        r'^locations/$',
+        DriverLocationsView.as_view(),
+        name='driver-locations'
+    ),
     re_path(
         r'^order/(?P<pk>[^/.]+)/accept/$',
         DriverOrdersViewSet.as_view({'post': 'accept'}),
@@ -10,7 +10,8 @@ from django.core.mail import send_mail
 from django.shortcuts import get_object_or_404
 from push_notifications.models import GCMDevice
 from rest_framework import mixins, status
-from rest_framework.generics import UpdateAPIView
+from rest_framework.generics import UpdateAPIView, \
+    get_object_or_404 as get_object_or_404_api
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -23,10 +24,15 @@ from apps.api.v1.serializers import OrderSerializer, DriverLocationSerializer, \
     DriverProfileSerializer, OfintaUserSerializer
 from apps.core.models import OfintaUser
 from apps.management.chat.models import Message
+from apps.management.drivers.locations import parse_location_points, \
+    record_locations
 from apps.management.drivers.models import DriverProfile
 from apps.management.orders.constants import OrderStatus, OrderAssignmentStatus, \
     PaymentMethod
-from apps.management.orders.models import Order, OrderAssignments, Payment
+from apps.management.orders.jobs import submit_payment
+from apps.management.orders.models import Order, Payment
+from apps.management.orders.snapshots import get_order_snapshots, \
+    filter_snapshot
 
 
 class OrdersViewSet(mixins.CreateModelMixin,
@@ -39,7 +45,7 @@ class OrdersViewSet(mixins.CreateModelMixin,
 
     def get_queryset(self):
         shop = self.request.user.shop
-        queryset = shop.get_orders()
+        queryset = shop.get_orders().for_serialization()
         is_active = self.request.query_params.get('is_active', None)
         if is_active is not None:
             if is_active == 'True':
@@ -84,6 +90,33 @@ class DriverOrdersViewSet(mixins.RetrieveModelMixin,
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        The order is served from the snapshot cache, only its version is
+        read from the database. The version is the ETag of the response:
+        apps polling with If-None-Match get 304 while the order is unchanged.
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        order_id, version = get_object_or_404_api(
+            queryset.values_list('pk', 'version'),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+
+        etag = '"{}"'.format(version)
+        if request.headers.get('If-None-Match') == etag:
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag}
+            )
+
+        snapshots = get_order_snapshots({order_id: version}, queryset)
+        data = filter_snapshot(
+            snapshots[order_id],
+            fields=request.query_params.get('fields'),
+            omit=request.query_params.get('omit')
+        )
+        return Response(data, headers={'ETag': etag})
+
     def history_list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset(is_active=False))
         page = self.paginate_queryset(queryset)
@@ -96,45 +129,16 @@ class DriverOrdersViewSet(mixins.RetrieveModelMixin,
 
     def get_queryset(self, is_active=None):
         shop = self.request.user.shop
-        queryset = shop.get_orders()
-        driver_assignments = OrderAssignments.objects.filter(
-            driver=self.request.user
-        )
+        queryset = shop.get_orders().for_serialization()
 
         if is_active is None:
             return queryset
 
-        orders_pks = []
-        orders = queryset.filter(
-            pk__in=driver_assignments.values_list('order', flat=True)
-        )
-
-        if is_active or is_active is None:
-            for order in orders:
-                last_assignment = driver_assignments.filter(order=order).last()
-                if not last_assignment:
-                    continue
-
-                if last_assignment.status == OrderAssignmentStatus.REJECTED:
-                    continue
-
-                orders_pks.append(order.pk)
-        else:
-            for order in orders:
-                last_assignment = driver_assignments.filter(order=order).last()
-                if not last_assignment:
-                    continue
-
-                if last_assignment.status != OrderAssignmentStatus.ACCEPTED:
-                    continue
-
-                orders_pks.append(order.pk)
-
-        queryset = queryset.filter(pk__in=orders_pks)
-
         if is_active:
+            queryset = queryset.get_driver_active(self.request.user)
             queryset = queryset.get_open()
         else:
+            queryset = queryset.get_driver_history(self.request.user)
             queryset = queryset.get_recent()
 
         return queryset
@@ -150,6 +154,9 @@ class DriverOrdersViewSet(mixins.RetrieveModelMixin,
                 # If 'prefetch_related' has been applied to a queryset, we need to
                 # forcibly invalidate the prefetch cache on the instance.
                 instance._prefetched_objects_cache = {}
+            # positions or delivery fee may have changed
+            instance.order_quantity = None
+            instance.order_amount = None
 
             return Response(serializer.data)
         else:
@@ -257,21 +264,22 @@ class DriverOrdersViewSet(mixins.RetrieveModelMixin,
         # remove previous payments for the order
         Payment.objects.filter(order=order).delete()
 
-        # create new one
+        # create new one, STK push is sent by a background job
         payment = Payment.objects.create(order=order)
-        success = payment.new_submit()
 
         order.verification_required = False
+        order.pending_transaction = True
         order.save()
 
-        if success:
-            response_data = {'message': 'Paid request sent successfully'}
-        else:
-            response_data = {'message': 'Failed to send paid request'}
+        submit_payment.delay(payment_id=payment.id)
 
+        response_data = {
+            'message': 'Paid request queued',
+            'pending_transaction': True
+        }
         return Response(
             data=response_data,
-            status=status.HTTP_200_OK
+            status=status.HTTP_202_ACCEPTED
         )
 
 
@@ -301,6 +309,33 @@ class DriverLocationViewSet(mixins.UpdateModelMixin, GenericViewSet):
         )
 
 
+class DriverLocationsView(APIView):
+    """
+    Location pings of the driver app: one point or the points buffered
+    while the app was offline. Only the latest point is stored, with a
+    single update, pings of a driver who hasn't moved are dropped. Users
+    without a driver profile get 403.
+    """
+    permission_classes = (IsAuthenticated, )
+
+    def post(self, request, *args, **kwargs):
+        try:
+            points = parse_location_points(request.data)
+        except ValueError as e:
+            return Response(
+                {'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            stored = record_locations(request.user.pk, points)
+        except DriverProfile.DoesNotExist:
+            return Response(
+                {'detail': 'Only drivers can send locations'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response({'received': len(points), 'stored': stored})
+
+
 class DriverProfileViewSet(mixins.UpdateModelMixin,
                            mixins.RetrieveModelMixin,
                            GenericViewSet):
@@ -6,7 +6,7 @@ from django.utils.translation import gettext_lazy as _
 from django.contrib.sessions.models import Session
 
 # ofinta
-from apps.core.models import Request
+from apps.core.models import Request, Job
 from .models import OfintaUser
 
 
@@ -16,11 +16,26 @@ class RequestAdmin(ModelAdmin):
         'ip', 'user', 'referer', 'user_agent'
     )
     search_fields = ('path', 'ip', 'referer')
+    list_filter = ('method', 'response')
+    list_select_related = ('user', )
+    raw_id_fields = ('user', )
+    # counting a partitioned log table is expensive
+    show_full_result_count = False
 
 
 admin.site.register(Request, RequestAdmin)
 
 
+@admin.register(Job)
+class JobAdmin(ModelAdmin):
+    list_display = (
+        'id', 'name', 'status', 'attempts', 'run_at', 'created_at',
+        'finished_at'
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', )
+
+
 @admin.register(OfintaUser)
 class OfintaUserAdmin(DjangoUserAdmin):
     fieldsets = (
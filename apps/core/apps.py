@@ -7,6 +7,7 @@ class CoreConfig(AppConfig):
     name = 'apps.core'
 
     def ready(self):
+        from django.utils.module_loading import autodiscover_modules
         from apps.core.signals import create_auth_token
         from django.db.models.signals import post_save
         post_save.connect(
@@ -14,3 +15,6 @@ class CoreConfig(AppConfig):
             sender=settings.AUTH_USER_MODEL,
             dispatch_uid='user_created'
         )
+
+        # register background jobs of all apps
+        autodiscover_modules('jobs')
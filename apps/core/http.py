@@ -0,0 +1,458 @@
+# system
+import asyncio
+import bisect
+import logging
+import random
+import threading
+import time
+import weakref
+
+# django
+from django.conf import settings
+
+# third party
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+RETRY_STATUSES = frozenset((502, 503, 504))
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    The endpoint failed too many times in a row, the call was not made
+    """
+
+
+class CircuitState:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+    CHOICES = (
+        (CLOSED, 'Calls go through'),
+        (OPEN, 'Calls fail immediately'),
+        (HALF_OPEN, 'A single trial call goes through'),
+    )
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures. After
+    ``reset_timeout`` seconds one trial call is let through: its success
+    closes the circuit, its failure opens it again.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == CircuitState.CLOSED:
+                return
+
+            if self.state == CircuitState.OPEN \
+                    and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = CircuitState.HALF_OPEN
+                return
+
+            raise CircuitOpenError('Circuit is {}'.format(self.state))
+
+    def record_success(self):
+        with self._lock:
+            self.state = CircuitState.CLOSED
+            self.failures = 0
+
+    def release(self):
+        """
+        Give up a trial call without an outcome, the next call is
+        a trial again
+        """
+        with self._lock:
+            if self.state == CircuitState.HALF_OPEN:
+                self.state = CircuitState.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == CircuitState.HALF_OPEN \
+                    or self.failures >= self.failure_threshold:
+                self.state = CircuitState.OPEN
+                self.opened_at = self.clock()
+
+
+class Histogram:
+    """
+    Cumulative latency histogram, buckets are upper bounds in seconds
+    """
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+
+        cumulative, buckets = 0, {}
+        for bound, bucket_count in zip(self.buckets + ('+Inf', ), counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {'buckets': buckets, 'count': count, 'sum': total}
+
+
+class RateLimiter:
+    """
+    Token bucket shared by threads: on average at most ``rate`` calls per
+    second, up to ``burst`` calls at once. ``acquire`` reserves the next
+    slot and sleeps until it comes.
+    """
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+
+        self.tokens = burst
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        :return: seconds waited
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+class Endpoint:
+    """
+    Per endpoint call options, circuit breaker and metrics
+    """
+    def __init__(self, name, timeout=(3.05, 30), retries=0,
+                 backoff=0.5, max_backoff=5, failure_threshold=5,
+                 reset_timeout=30):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = Histogram()
+        self.errors = 0
+
+    def __str__(self):
+        return self.name
+
+    def get_delay(self, attempt):
+        # "full jitter" exponential backoff
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** attempt)
+        )
+
+
+class BaseHttpClient:
+    """
+    Named endpoints (see ``OUTBOUND_HTTP`` setting) with their options,
+    circuit breakers and latency histograms
+    """
+    def __init__(self, pool_size=10, endpoints=None):
+        self.pool_size = pool_size
+        self.endpoint_options = endpoints or {}
+        self.endpoints = {}
+
+        self._lock = threading.Lock()
+
+    def get_endpoint(self, name):
+        endpoint = self.endpoints.get(name)
+        if endpoint is None:
+            with self._lock:
+                endpoint = self.endpoints.get(name)
+                if endpoint is None:
+                    options = self.endpoint_options.get(name, {})
+                    endpoint = self.endpoints[name] = Endpoint(
+                        name, **{
+                            key.lower(): value
+                            for key, value in options.items()
+                        }
+                    )
+        return endpoint
+
+    def get_retries(self, endpoint, method, idempotent=None):
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        return endpoint.retries if idempotent else 0
+
+    def stats(self):
+        return {
+            name: {
+                'state': endpoint.breaker.state,
+                'errors': endpoint.errors,
+                'latency': endpoint.latency.snapshot(),
+            }
+            for name, endpoint in self.endpoints.items()
+        }
+
+
+class HttpClient(BaseHttpClient):
+    """
+    Outbound HTTP client sharing one pooled keep-alive session.
+
+    Calls are made on behalf of a named endpoint (see ``OUTBOUND_HTTP``
+    setting) which defines the timeout, the number of retries, and holds a
+    circuit breaker and a latency histogram. Only idempotent calls are
+    retried, on connection errors, timeouts and 502/503/504 responses.
+    """
+    def __init__(self, pool_size=10, endpoints=None):
+        super().__init__(pool_size, endpoints)
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_size,
+                        pool_maxsize=self.pool_size
+                    )
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def request(self, endpoint_name, method, url, idempotent=None, **kwargs):
+        """
+        :param endpoint_name: name of the endpoint options
+        :param method: HTTP method
+        :param url: URL
+        :param idempotent: allow retries, by default only for
+            idempotent methods
+        :return: requests.Response
+        :raise: requests.RequestException, CircuitOpenError if
+            the endpoint is failing
+        """
+        endpoint = self.get_endpoint(endpoint_name)
+        retries = self.get_retries(endpoint, method, idempotent)
+        kwargs.setdefault('timeout', endpoint.timeout)
+
+        attempt = 0
+        while True:
+            endpoint.breaker.before_call()
+
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                endpoint.latency.observe(time.monotonic() - started)
+                endpoint.errors += 1
+                endpoint.breaker.record_failure()
+                if attempt >= retries:
+                    raise
+                logger.info('%s call failed, retrying: %s', endpoint, e)
+            except Exception:
+                # any other error must not leave a half-open circuit
+                # waiting for the result of its trial call forever
+                endpoint.errors += 1
+                endpoint.breaker.record_failure()
+                raise
+            except BaseException:
+                # cancelled or interrupted, says nothing about the endpoint
+                endpoint.breaker.release()
+                raise
+            else:
+                endpoint.latency.observe(time.monotonic() - started)
+                if response.status_code < 500:
+                    endpoint.breaker.record_success()
+                    return response
+
+                endpoint.errors += 1
+                endpoint.breaker.record_failure()
+                if attempt >= retries \
+                        or response.status_code not in RETRY_STATUSES:
+                    return response
+                logger.info(
+                    '%s responded with %s, retrying',
+                    endpoint, response.status_code
+                )
+
+            time.sleep(endpoint.get_delay(attempt))
+            attempt += 1
+
+    def get(self, endpoint_name, url, **kwargs):
+        return self.request(endpoint_name, 'GET', url, **kwargs)
+
+    def post(self, endpoint_name, url, **kwargs):
+        return self.request(endpoint_name, 'POST', url, **kwargs)
+
+
+class AsyncHttpClient(BaseHttpClient):
+    """
+    asyncio counterpart of HttpClient built on httpx, with the same
+    endpoint options, retries and circuit breakers.
+
+    httpx clients can't be shared between event loops, every loop gets
+    its own pooled client (one per ``verify`` value as httpx verifies
+    certificates per client, not per request). When ``sync_client`` is
+    given its endpoints are shared, so a failing upstream opens the
+    circuit for both clients.
+    """
+    def __init__(self, pool_size=10, endpoints=None, sync_client=None):
+        super().__init__(pool_size, endpoints)
+        if sync_client is not None:
+            self.endpoint_options = sync_client.endpoint_options
+            self.endpoints = sync_client.endpoints
+            self._lock = sync_client._lock
+
+        self._clients = weakref.WeakKeyDictionary()
+
+    def get_client(self, verify=True):
+        clients = self._clients.setdefault(asyncio.get_running_loop(), {})
+        client = clients.get(verify)
+        if client is None:
+            client = clients[verify] = httpx.AsyncClient(
+                verify=verify,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                )
+            )
+        return client
+
+    async def aclose(self):
+        """
+        Close the clients of the running event loop
+        """
+        clients = self._clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+    async def request(self, endpoint_name, method, url, idempotent=None,
+                      verify=True, **kwargs):
+        """
+        :param endpoint_name: name of the endpoint options
+        :param method: HTTP method
+        :param url: URL
+        :param idempotent: allow retries, by default only for
+            idempotent methods
+        :param verify: verify the server certificate
+        :return: httpx.Response
+        :raise: httpx.HTTPError, CircuitOpenError if the endpoint
+            is failing
+        """
+        endpoint = self.get_endpoint(endpoint_name)
+        retries = self.get_retries(endpoint, method, idempotent)
+        kwargs.setdefault('timeout', self.get_timeout(endpoint))
+        client = self.get_client(verify)
+
+        attempt = 0
+        while True:
+            endpoint.breaker.before_call()
+
+            started = time.monotonic()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                endpoint.latency.observe(time.monotonic() - started)
+                endpoint.errors += 1
+                endpoint.breaker.record_failure()
+                if attempt >= retries:
+                    raise
+                logger.info('%s call failed, retrying: %s', endpoint, e)
+            except Exception:
+                # any other error must not leave a half-open circuit
+                # waiting for the result of its trial call forever
+                endpoint.errors += 1
+                endpoint.breaker.record_failure()
+                raise
+            except BaseException:
+                # cancelled or interrupted, says nothing about the endpoint
+                endpoint.breaker.release()
+                raise
+            else:
+                endpoint.latency.observe(time.monotonic() - started)
+                if response.status_code < 500:
+                    endpoint.breaker.record_success()
+                    return response
+
+                endpoint.errors += 1
+                endpoint.breaker.record_failure()
+                if attempt >= retries \
+                        or response.status_code not in RETRY_STATUSES:
+                    return response
+                logger.info(
+                    '%s responded with %s, retrying',
+                    endpoint, response.status_code
+                )
+
+            await asyncio.sleep(endpoint.get_delay(attempt))
+            attempt += 1
+
+    async def get(self, endpoint_name, url, **kwargs):
+        return await self.request(endpoint_name, 'GET', url, **kwargs)
+
+    async def post(self, endpoint_name, url, **kwargs):
+        return await self.request(endpoint_name, 'POST', url, **kwargs)
+
+    @staticmethod
+    def get_timeout(endpoint):
+        # requests style (connect, read) timeouts
+        if isinstance(endpoint.timeout, (tuple, list)):
+            connect, read = endpoint.timeout
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(endpoint.timeout)
+
+
+def get_http_client():
+    options = getattr(settings, 'OUTBOUND_HTTP', {})
+    return HttpClient(
+        pool_size=options.get('POOL_SIZE', 10),
+        endpoints=options.get('ENDPOINTS', {}),
+    )
+
+
+def get_async_http_client(sync_client=None):
+    options = getattr(settings, 'OUTBOUND_HTTP', {})
+    return AsyncHttpClient(
+        pool_size=options.get('ASYNC_POOL_SIZE', 100),
+        endpoints=options.get('ENDPOINTS', {}),
+        sync_client=sync_client,
+    )
+
+
+http_client = get_http_client()
+async_http_client = get_async_http_client(http_client)
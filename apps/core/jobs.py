@@ -0,0 +1,176 @@
+# system
+import datetime
+import logging
+import traceback
+
+# django
+from django.conf import settings
+from django.db import transaction
+from django.db.models.expressions import F
+from django.utils import timezone
+
+# ofinta
+from apps.core.models import Job, JobStatus
+
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def get_jobs_option(name, default):
+    return getattr(settings, 'JOBS', {}).get(name, default)
+
+
+def job(name, max_attempts=3):
+    """
+    Register the function as a background job. Jobs are defined in
+    ``jobs`` modules of the apps and called with keyword arguments which
+    must be JSON serializable:
+
+        @job('orders.submit_payment')
+        def submit_payment(payment_id):
+            ...
+
+        submit_payment.delay(payment_id=payment.id)
+    """
+    def decorator(func):
+        registry[name] = func
+        func.job_name = name
+        func.delay = lambda **kwargs: enqueue(
+            name, kwargs, max_attempts=max_attempts
+        )
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, run_at=None, max_attempts=3):
+    """
+    Store the job, it runs once the current transaction is committed and
+    a worker (``run_jobs`` command) picks it up. With ``JOBS['EAGER']``
+    the job runs right away in the calling thread.
+    :return: Job instance
+    """
+    if name not in registry:
+        raise KeyError(f'Job {name} is not registered')
+
+    job_obj = Job(
+        name=name,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        run_at=run_at or timezone.now()
+    )
+    if get_jobs_option('EAGER', False):
+        job_obj.status = JobStatus.RUNNING
+        job_obj.attempts = 1
+        job_obj.started_at = timezone.now()
+        job_obj.save()
+        execute(job_obj)
+    else:
+        job_obj.save()
+    return job_obj
+
+
+def claim(batch_size, names=None):
+    """
+    Lock the jobs which are due and mark them as running. Jobs locked by
+    other workers are skipped.
+    :param names: claim only the jobs with these names
+    :return: list of Job instances
+    """
+    now = timezone.now()
+    due = Job.objects.filter(status=JobStatus.PENDING, run_at__lte=now)
+    if names is not None:
+        due = due.filter(name__in=names)
+    with transaction.atomic():
+        jobs = list(
+            due.select_for_update(skip_locked=True).order_by(
+                'run_at'
+            )[:batch_size]
+        )
+        if jobs:
+            Job.objects.filter(pk__in=[j.pk for j in jobs]).update(
+                status=JobStatus.RUNNING,
+                attempts=F('attempts') + 1,
+                started_at=now
+            )
+            for job_obj in jobs:
+                job_obj.status = JobStatus.RUNNING
+                job_obj.attempts += 1
+                job_obj.started_at = now
+    return jobs
+
+
+def execute(job_obj):
+    """
+    Run the claimed job and store its outcome, failed jobs are retried
+    with an exponential delay until ``max_attempts`` is reached
+    :return: True on success
+    """
+    func = registry.get(job_obj.name)
+    try:
+        if func is None:
+            raise KeyError(f'Job {job_obj.name} is not registered')
+        func(**job_obj.payload)
+    except Exception:
+        logger.exception('Job %s #%s failed', job_obj.name, job_obj.pk)
+        job_obj.last_error = traceback.format_exc()
+        if job_obj.attempts < job_obj.max_attempts:
+            delay = get_jobs_option('RETRY_DELAY', 30) * \
+                2 ** (job_obj.attempts - 1)
+            job_obj.status = JobStatus.PENDING
+            job_obj.run_at = timezone.now() + datetime.timedelta(
+                seconds=delay
+            )
+        else:
+            job_obj.status = JobStatus.FAILED
+            job_obj.finished_at = timezone.now()
+        job_obj.save(update_fields=[
+            'status', 'run_at', 'finished_at', 'last_error'
+        ])
+        return False
+
+    job_obj.status = JobStatus.DONE
+    job_obj.finished_at = timezone.now()
+    job_obj.save(update_fields=['status', 'finished_at'])
+    return True
+
+
+def requeue_stale():
+    """
+    Return jobs of crashed workers to the queue. A stale job may have done
+    its work already, so it's requeued only if it has attempts left; the
+    others, e.g. non idempotent jobs with max_attempts=1, are failed.
+    :return: number of requeued jobs
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=JobStatus.RUNNING,
+        started_at__lt=now - datetime.timedelta(
+            seconds=get_jobs_option('STALE_TIMEOUT', 600)
+        )
+    )
+    with transaction.atomic():
+        failed = stale.filter(attempts__gte=F('max_attempts')).update(
+            status=JobStatus.FAILED,
+            finished_at=now,
+            last_error='Stale, the worker died or timed out'
+        )
+        requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+            status=JobStatus.PENDING
+        )
+    if failed:
+        logger.warning('Failed %s stale jobs without attempts left', failed)
+    return requeued
+
+
+def run_pending(batch_size=None, names=None):
+    """
+    Claim and run one batch of due jobs
+    :param names: run only the jobs with these names
+    :return: number of processed jobs
+    """
+    jobs = claim(batch_size or get_jobs_option('BATCH_SIZE', 10), names)
+    for job_obj in jobs:
+        execute(job_obj)
+    return len(jobs)
@@ -0,0 +1,64 @@
+# system
+import timeit
+
+# django
+from django.conf import settings
+from django.core.management import BaseCommand
+
+# ofinta
+from apps.core.router import patterns, PathMatcher
+
+
+SAMPLE_PATHS = (
+    'api/v1/driver/location/',
+    'api/v1/driver/orders/',
+    'api/v1/driver/orders/history/',
+    'admin/core/request/',
+    'media/photos/driver.png',
+    'mpesa-result/',
+    'management/orders/',
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-request ignore-path rebuild with PathMatcher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        number = options['number']
+        ignore_paths = settings.REQUEST_IGNORE_PATHS
+        paths = SAMPLE_PATHS * (number // len(SAMPLE_PATHS) + 1)
+        paths = paths[:number]
+
+        def rebuild():
+            for path in paths:
+                patterns(False, *ignore_paths).resolve(path)
+
+        matcher = PathMatcher(*ignore_paths)
+
+        def compiled():
+            for path in paths:
+                matcher.match(path)
+
+        for path in SAMPLE_PATHS:
+            old = bool(patterns(False, *ignore_paths).resolve(path))
+            assert old == matcher.match(path), path
+
+        rebuild_time = min(timeit.repeat(rebuild, number=1, repeat=3))
+        compiled_time = min(timeit.repeat(compiled, number=1, repeat=3))
+
+        self.stdout.write(
+            f'{number} lookups over {len(SAMPLE_PATHS)} distinct paths'
+        )
+        self.stdout.write(
+            f'rebuild per request: {rebuild_time:.4f}s '
+            f'({rebuild_time / number * 1e6:.2f} us/lookup)'
+        )
+        self.stdout.write(
+            f'PathMatcher:         {compiled_time:.4f}s '
+            f'({compiled_time / number * 1e6:.2f} us/lookup)'
+        )
+        self.stdout.write(f'speedup: {rebuild_time / compiled_time:.1f}x')
+        self.stdout.write(f'cache: {matcher.match.cache_info()}')
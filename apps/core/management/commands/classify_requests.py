@@ -0,0 +1,45 @@
+# django
+from django.core.management import BaseCommand
+
+# ofinta
+from apps.core.models import Request
+from apps.core.utils import resolve_browser
+
+
+class Command(BaseCommand):
+    help = 'Store the resolved browser name for logged requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        unclassified = Request.objects.filter(
+            browser_name=''
+        ).exclude(user_agent='').exclude(user_agent__isnull=True)
+
+        # one UPDATE per distinct user agent instead of one per row
+        user_agents = unclassified.order_by().values_list(
+            'user_agent', flat=True
+        ).distinct()
+
+        updated = 0
+        batch = []
+        for user_agent in user_agents.iterator(chunk_size=batch_size):
+            batch.append(user_agent)
+            if len(batch) >= batch_size:
+                updated += self.classify(unclassified, batch)
+                batch = []
+        if batch:
+            updated += self.classify(unclassified, batch)
+
+        self.stdout.write(f'{updated} requests classified')
+
+    def classify(self, queryset, user_agents):
+        updated = 0
+        for user_agent in user_agents:
+            name = resolve_browser(user_agent)[0][:64]
+            updated += queryset.filter(user_agent=user_agent).update(
+                browser_name=name
+            )
+        return updated
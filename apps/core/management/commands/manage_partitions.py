@@ -0,0 +1,47 @@
+# django
+from django.apps import apps
+from django.conf import settings
+from django.core.management import BaseCommand
+
+# ofinta
+from apps.core.partitions import PartitionManager
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming daily partitions and archive/drop expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', action='append', dest='models',
+            help='Limit to the given model label, e.g. core.Request'
+        )
+        parser.add_argument(
+            '--no-archive', action='store_true',
+            help='Drop expired partitions without archiving them'
+        )
+        parser.add_argument(
+            '--archive-dir', default=settings.PARTITIONS_ARCHIVE_DIR
+        )
+
+    def handle(self, *args, **options):
+        labels = options['models'] or settings.PARTITIONED_MODELS.keys()
+
+        for label in labels:
+            config = settings.PARTITIONED_MODELS[label]
+            manager = PartitionManager(
+                apps.get_model(label),
+                field=config['field'],
+                retention_days=config['retention_days'],
+                premake_days=config.get('premake_days', 7),
+                archive=config.get('archive', True)
+                and not options['no_archive'],
+                archive_dir=options['archive_dir']
+            )
+
+            for name in manager.create_upcoming():
+                self.stdout.write(f'{manager}: created {name}')
+
+            for name, archived in manager.drop_expired():
+                self.stdout.write(
+                    f'{manager}: dropped {name} ({archived} rows archived)'
+                )
@@ -0,0 +1,42 @@
+# system
+import time
+
+# django
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+# ofinta
+from apps.core.jobs import run_pending, requeue_stale, get_jobs_option
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs stored in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Run the jobs which are due and exit'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=get_jobs_option('BATCH_SIZE', 10)
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=get_jobs_option('POLL_INTERVAL', 1),
+            help='Seconds to wait when there are no due jobs'
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale jobs')
+
+        while True:
+            close_old_connections()
+            processed = run_pending(options['batch_size'])
+            if options['once'] and not processed:
+                break
+
+            if not processed:
+                time.sleep(options['poll_interval'])
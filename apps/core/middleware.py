@@ -4,21 +4,45 @@ from django.utils.deprecation import MiddlewareMixin
 
 # ofinta
 from .models import Request
-from apps.core.router import patterns
- 
- 
+from apps.core.policies import RequestLogPolicies
+from apps.core.router import PathMatcher
+from apps.core.writers import BufferedWriter, get_writer_options
+
+
+request_log_writer = BufferedWriter(
+    Request, **get_writer_options('REQUEST_LOG_WRITER')
+)
+
+
 class RequestMiddleware(MiddlewareMixin):
-    
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.ignore = PathMatcher(
+            *settings.REQUEST_IGNORE_PATHS,
+            cache_size=settings.REQUEST_IGNORE_CACHE_SIZE
+        )
+        self.policies = RequestLogPolicies(
+            settings.REQUEST_LOG_POLICIES,
+            default=settings.REQUEST_LOG_DEFAULT_POLICY,
+            cache_size=settings.REQUEST_IGNORE_CACHE_SIZE
+        )
+
     def process_request(self, request):
         request._body_to_log = request.body
     
     def process_response(self, request, response):
- 
-        ignore = patterns(False, *settings.REQUEST_IGNORE_PATHS)
-        if ignore.resolve(request.path[1:]):
+
+        path = request.path[1:]
+        if self.ignore.match(path):
+            return response
+
+        policy = self.policies.resolve(path, request.method)
+        if not policy.sample():
             return response
- 
+
         r = Request()
-        r.from_http_request(request, response)
- 
+        r.from_http_request(request, response, commit=False, policy=policy)
+        request_log_writer.put(r)
+
         return response
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_ofintauser_changed_password'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='request',
+            name='time',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='time'),
+        ),
+    ]
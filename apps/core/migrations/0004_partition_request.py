@@ -0,0 +1,90 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# core_request becomes a table partitioned by day on "time". The primary key
+# has to include the partition key, so it is (id, time); ids keep coming
+# from a sequence owned by core_request.id. Daily partitions are created by
+# the manage_partitions command, everything else goes to core_request_default.
+PARTITION_SQL = """
+CREATE SEQUENCE core_request_log_id_seq;
+SELECT setval(
+    'core_request_log_id_seq',
+    COALESCE((SELECT MAX(id) FROM core_request), 0) + 1,
+    false
+);
+
+CREATE TABLE core_request_partitioned (
+    LIKE core_request INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+) PARTITION BY RANGE ("time");
+ALTER TABLE core_request_partitioned
+    ALTER COLUMN id SET DEFAULT nextval('core_request_log_id_seq');
+ALTER TABLE core_request_partitioned
+    ADD CONSTRAINT core_request_pkey_id_time PRIMARY KEY (id, "time");
+
+CREATE TABLE core_request_default
+    PARTITION OF core_request_partitioned DEFAULT;
+
+INSERT INTO core_request_partitioned SELECT * FROM core_request;
+DROP TABLE core_request;
+
+ALTER TABLE core_request_partitioned RENAME TO core_request;
+ALTER SEQUENCE core_request_log_id_seq OWNED BY core_request.id;
+ALTER TABLE core_request
+    ADD CONSTRAINT core_request_user_id_fk_core_ofintauser_id
+    FOREIGN KEY (user_id) REFERENCES core_ofintauser (id)
+    DEFERRABLE INITIALLY DEFERRED;
+"""
+
+UNPARTITION_SQL = """
+CREATE TABLE core_request_plain (
+    LIKE core_request INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+);
+INSERT INTO core_request_plain SELECT * FROM core_request;
+ALTER SEQUENCE core_request_log_id_seq OWNED BY core_request_plain.id;
+DROP TABLE core_request;
+
+ALTER TABLE core_request_plain RENAME TO core_request;
+ALTER TABLE core_request ADD PRIMARY KEY (id);
+ALTER TABLE core_request
+    ADD CONSTRAINT core_request_user_id_fk_core_ofintauser_id
+    FOREIGN KEY (user_id) REFERENCES core_ofintauser (id)
+    DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX core_request_user_id_idx ON core_request (user_id);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_request_time'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION_SQL, UNPARTITION_SQL),
+        # the old user_id index was dropped together with the old table
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='request',
+                    name='user',
+                    field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='user'),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['-time'], name='core_req_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['user', '-time'], name='core_req_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['path', '-time'], name='core_req_path_time_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_partition_request'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='browser_name',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='browser'),
+        ),
+    ]
@@ -2,18 +2,18 @@
 import re
 
 # django
-from _socket import gethostbyaddr
-
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 # ofinta
 from apps.core.managers import OfintaUserManager
 from apps.core.mixins import ModelDiffMixin
-from apps.core.utils import browsers, engines, HTTP_STATUS_CODES, chunked_to_max
+from apps.core.utils import HTTP_STATUS_CODES, chunked_to_max, \
+    MAX_BODY_LENGTH, resolve_browser, resolve_engine, hostname_resolver
 from apps.management.shops.models import Shop
 
 
@@ -30,6 +30,19 @@ class UserRoles:
     )
 
 
+class JobStatus:
+    PENDING = 1
+    RUNNING = 2
+    DONE = 3
+    FAILED = 4
+    CHOICES = (
+        (PENDING, 'pending'),
+        (RUNNING, 'running'),
+        (DONE, 'done'),
+        (FAILED, 'failed')
+    )
+
+
 class OfintaUser(AbstractUser, ModelDiffMixin):
     """
     Ordinary django user with role support
@@ -106,7 +119,7 @@ class Request(models.Model):
     # Request information
     method = models.CharField('method', default='GET', max_length=7)
     path = models.CharField('path', max_length=255)
-    time = models.DateTimeField('time', auto_now_add=True)
+    time = models.DateTimeField('time', default=timezone.now)
 
     is_secure = models.BooleanField('is secure', default=False)
     is_ajax = models.BooleanField(
@@ -127,18 +140,32 @@ class Request(models.Model):
         settings.AUTH_USER_MODEL,
         blank=True, null=True,
         verbose_name='user',
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False  # covered by the (user, -time) index
     )
     referer = models.URLField('referer', max_length=255, blank=True, null=True)
     user_agent = models.CharField(
         'User agent', max_length=255,
         blank=True, null=True
     )
+    # filled on write and by the classify_requests command,
+    # see Request.browser
+    browser_name = models.CharField(
+        'browser', max_length=64,
+        blank=True, default=''
+    )
 
     class Meta:
         verbose_name = 'request'
         verbose_name_plural = 'requests'
         ordering = ('-time',)
+        # the table is partitioned by day on `time`,
+        # see apps.core.partitions and the manage_partitions command
+        indexes = [
+            models.Index(fields=['-time'], name='core_req_time_idx'),
+            models.Index(fields=['user', '-time'], name='core_req_user_time_idx'),
+            models.Index(fields=['path', '-time'], name='core_req_path_time_idx'),
+        ]
 
     def __str__(self):
         return '[%s] %s %s %s' % (
@@ -148,7 +175,16 @@ class Request(models.Model):
     def get_user(self):
         return get_user_model().objects.get(pk=self.user.id)
 
-    def from_http_request(self, request, response=None, commit=True):
+    def from_http_request(self, request, response=None, commit=True,
+                          policy=None):
+        """
+        :param policy: RequestLogPolicy, if given decides whether body and
+        response are stored and how much of them is kept
+        """
+        log_body = policy.log_body if policy else True
+        log_response = policy.log_response if policy else True
+        max_size = policy.max_size if policy else MAX_BODY_LENGTH
+
         # Request information
         self.method = request.method
         self.path = request.path[:255]
@@ -156,28 +192,32 @@ class Request(models.Model):
         self.is_secure = request.is_secure()
         # self.is_ajax = request.is_ajax()
 
-        if re.match(
+        if log_response and response is not None and re.match(
                 '^application/json',
                 response.get('Content-Type', ''),
                 re.I
         ):
-            self.response_content = response.content
+            self.response_content = chunked_to_max(
+                response.content, max_size
+            ).decode('utf-8', 'ignore')
 
         # User information
         self.ip = request.META.get('REMOTE_ADDR', '')
         self.referer = request.META.get('HTTP_REFERER', '')[:255]
         self.user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
+        if self.user_agent:
+            self.browser_name = resolve_browser(self.user_agent)[0][:64]
         self.language = request.META.get('HTTP_ACCEPT_LANGUAGE', '')[:255]
 
-        if request.method in ('POST', 'PUT'):
+        if log_body and request.method in ('POST', 'PUT', 'PATCH'):
             # if request.body is not empty
             # if there's an image in data, it might have
             # non-utf chars and break the server on self.save() below
             # we remove those
             try:
                 self.data = chunked_to_max(
-                    request._body_to_log
-                ).decode('utf-8', 'ignore').encode('utf-8')
+                    request._body_to_log, max_size
+                ).decode('utf-8', 'ignore')
             except:
                 self.data = ''
 
@@ -196,26 +236,55 @@ class Request(models.Model):
 
     @property
     def browser(self):
+        if self.browser_name:
+            return self.browser_name
+
         if not self.user_agent:
             return
 
-        if not hasattr(self, '_browser'):
-            self._browser = browsers.resolve(self.user_agent)
-        return self._browser[0]
+        return resolve_browser(self.user_agent)[0]
 
     @property
     def keywords(self):
         if not self.referer:
             return
 
-        if not hasattr(self, '_keywords'):
-            self._keywords = engines.resolve(self.referer)
-        if self._keywords:
-            return ' '.join(self._keywords[1]['keywords'].split('+'))
+        engine = resolve_engine(self.referer)
+        if engine:
+            return ' '.join(engine[1]['keywords'].split('+'))
 
     @property
     def hostname(self):
-        try:
-            return gethostbyaddr(self.ip)[0]
-        except Exception:  # socket.gaierror, socket.herror, etc
-            return self.ip
+        return hostname_resolver.resolve(self.ip)
+
+
+class Job(models.Model):
+    """
+    Background job stored in the database, see apps.core.jobs
+    """
+    name = models.CharField('name', max_length=128)
+    payload = models.JSONField('payload', default=dict, blank=True)
+    status = models.PositiveSmallIntegerField(
+        'status',
+        choices=JobStatus.CHOICES,
+        default=JobStatus.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('attempts', default=0)
+    max_attempts = models.PositiveSmallIntegerField('max attempts', default=3)
+    run_at = models.DateTimeField('run at', default=timezone.now)
+    created_at = models.DateTimeField('created at', default=timezone.now)
+    started_at = models.DateTimeField('started at', null=True, blank=True)
+    finished_at = models.DateTimeField('finished at', null=True, blank=True)
+    last_error = models.TextField('last error', blank=True)
+
+    class Meta:
+        verbose_name = 'job'
+        verbose_name_plural = 'jobs'
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'], name='core_job_status_run_at_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
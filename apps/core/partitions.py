@@ -0,0 +1,198 @@
+# system
+import os
+import re
+import gzip
+import json
+import datetime
+
+# django
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+def partition_name(table, day):
+    return '{}_p{:%Y%m%d}'.format(table, day)
+
+
+def default_partition_name(table):
+    return '{}_default'.format(table)
+
+
+def day_bounds(day):
+    start = datetime.datetime.combine(
+        day, datetime.time.min, tzinfo=datetime.timezone.utc
+    )
+    return start, start + datetime.timedelta(days=1)
+
+
+def get_partitions(table):
+    """
+    :param table: partitioned table name
+    :return: {day: partition name} for the daily partitions of the table
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = %s
+            """,
+            [table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    regex = re.compile(r'^{}_p(\d{{8}})$'.format(re.escape(table)))
+    partitions = {}
+    for name in names:
+        match = regex.match(name)
+        if match:
+            day = datetime.datetime.strptime(match.group(1), '%Y%m%d').date()
+            partitions[day] = name
+    return partitions
+
+
+def create_partition(table, field, day):
+    """
+    Create the partition for the given day. Rows of that day which already
+    landed in the default partition are moved into the new one.
+    """
+    qn = connection.ops.quote_name
+    name = partition_name(table, day)
+    start, end = day_bounds(day)
+    params = {
+        'table': qn(table),
+        'name': qn(name),
+        'default': qn(default_partition_name(table)),
+        'field': qn(field),
+    }
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TABLE {name} '
+            '(LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(
+                **params
+            )
+        )
+        cursor.execute(
+            'WITH moved AS ('
+            'DELETE FROM {default} WHERE {field} >= %s AND {field} < %s '
+            'RETURNING *'
+            ') INSERT INTO {name} SELECT * FROM moved'.format(**params),
+            [start, end]
+        )
+        cursor.execute(
+            'ALTER TABLE {table} ATTACH PARTITION {name} '
+            'FOR VALUES FROM (%s) TO (%s)'.format(**params),
+            [start, end]
+        )
+    return name
+
+
+def drop_partition(table, name):
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(
+            qn(table), qn(name)
+        ))
+        cursor.execute('DROP TABLE {}'.format(qn(name)))
+
+
+def archive_queryset(queryset, path, chunk_size=2000):
+    """
+    Stream rows of the queryset to a gzip compressed JSON lines file
+    :return: number of archived rows
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as archive:
+        for row in queryset.values().iterator(chunk_size=chunk_size):
+            archive.write(json.dumps(row, cls=DjangoJSONEncoder))
+            archive.write('\n')
+            count += 1
+    return count
+
+
+class PartitionManager:
+    """
+    Keeps daily partitions of a model table: creates upcoming ones and
+    archives/drops the ones older than the retention period
+    """
+    def __init__(self, model, field, retention_days, premake_days=7,
+                 archive=True, archive_dir=None):
+        self.model = model
+        self.table = model._meta.db_table
+        self.field = field
+        self.retention_days = retention_days
+        self.premake_days = premake_days
+        self.archive = archive
+        self.archive_dir = archive_dir
+
+    def __str__(self):
+        return self.table
+
+    @property
+    def cutoff(self):
+        today = timezone.now().date()
+        return today - datetime.timedelta(days=self.retention_days)
+
+    def archive_path(self, suffix):
+        return os.path.join(
+            self.archive_dir, self.table,
+            '{}_{}.jsonl.gz'.format(self.table, suffix)
+        )
+
+    def create_upcoming(self):
+        existing = get_partitions(self.table)
+        today = timezone.now().date()
+        created = []
+        for offset in range(self.premake_days + 1):
+            day = today + datetime.timedelta(days=offset)
+            if day not in existing:
+                created.append(create_partition(self.table, self.field, day))
+        return created
+
+    def expired(self):
+        cutoff = self.cutoff
+        return sorted(
+            (day, name) for day, name in get_partitions(self.table).items()
+            if day < cutoff
+        )
+
+    def drop_expired(self):
+        """
+        :return: list of (partition name, archived rows)
+        """
+        dropped = []
+        for day, name in self.expired():
+            archived = 0
+            if self.archive:
+                start, end = day_bounds(day)
+                queryset = self.model.objects.filter(**{
+                    f'{self.field}__gte': start,
+                    f'{self.field}__lt': end
+                }).order_by()
+                archived = archive_queryset(
+                    queryset, self.archive_path('{:%Y%m%d}'.format(day))
+                )
+            drop_partition(self.table, name)
+            dropped.append((name, archived))
+
+        # rows which were written before their partition existed
+        start, _ = day_bounds(self.cutoff)
+        leftovers = self.model.objects.filter(**{
+            f'{self.field}__lt': start
+        }).order_by()
+        if leftovers.exists():
+            archived = 0
+            if self.archive:
+                archived = archive_queryset(
+                    leftovers,
+                    self.archive_path('default_{:%Y%m%d}'.format(self.cutoff))
+                )
+            leftovers.delete()
+            dropped.append((default_partition_name(self.table), archived))
+
+        return dropped
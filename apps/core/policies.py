@@ -0,0 +1,55 @@
+# system
+import re
+import random
+from functools import lru_cache
+
+# ofinta
+from apps.core.utils import MAX_BODY_LENGTH
+
+
+class RequestLogPolicy(object):
+    """
+    Describes how requests to a route are logged:
+    which share of them is stored and how much of the payload is kept
+    """
+    def __init__(self, path=None, methods=None, sample_rate=1.0,
+                 log_body=True, log_response=True, max_size=MAX_BODY_LENGTH):
+        self.regex = re.compile(path, re.UNICODE) if path else None
+        self.methods = tuple(m.upper() for m in methods) if methods else None
+        self.sample_rate = sample_rate
+        self.log_body = log_body
+        self.log_response = log_response
+        self.max_size = max_size
+
+    def matches(self, path, method):
+        if self.methods and method.upper() not in self.methods:
+            return False
+        if self.regex and not self.regex.search(path):
+            return False
+        return True
+
+    def sample(self):
+        """
+        :return: True if the current request should be logged
+        """
+        if self.sample_rate >= 1:
+            return True
+        if self.sample_rate <= 0:
+            return False
+        return random.random() < self.sample_rate
+
+
+class RequestLogPolicies(object):
+    """
+    Ordered list of policies, the first one matching path and method wins
+    """
+    def __init__(self, policies=(), default=None, cache_size=1024):
+        self.policies = [RequestLogPolicy(**policy) for policy in policies]
+        self.default = RequestLogPolicy(**(default or {}))
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _resolve(self, path, method):
+        for policy in self.policies:
+            if policy.matches(path, method):
+                return policy
+        return self.default
@@ -1,5 +1,6 @@
 # system
 import re
+from functools import lru_cache
 
 
 class RegexPattern(object):
@@ -30,3 +31,25 @@ class patterns(object):
             if match:
                 return match
         return self.unknown
+
+
+class PathMatcher(object):
+    """
+    Compiles all regexes into a single alternation once and remembers the
+    result for the most recently seen paths
+    """
+    def __init__(self, *regexes, cache_size=1024):
+        if regexes:
+            self.regex = re.compile(
+                '|'.join('(?:{})'.format(regex) for regex in regexes),
+                re.UNICODE
+            )
+        else:
+            self.regex = None
+
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+
+    def _match(self, path):
+        if self.regex is None:
+            return False
+        return self.regex.search(path) is not None
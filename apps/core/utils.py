@@ -1,3 +1,10 @@
+# system
+import socket
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import lru_cache
+
 # django
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
@@ -11,9 +18,10 @@ MAX_BODY_LENGTH = 3000 # log no more than 3k bytes of content
 AUTH_USER_MODEL = getattr(settings, 'AUTH_USER_MODEL', 'auth.User')
 
 
-def chunked_to_max(msg):
-    if len(msg) > MAX_BODY_LENGTH:
-        return "{0}\n...\n".format(msg[0:MAX_BODY_LENGTH])
+def chunked_to_max(msg, max_length=MAX_BODY_LENGTH):
+    if len(msg) > max_length:
+        tail = b'\n...\n' if isinstance(msg, bytes) else '\n...\n'
+        return msg[0:max_length] + tail
     else:
         return msg
 
@@ -144,6 +152,90 @@ engines = patterns(None,
 )
 
 
+@lru_cache(maxsize=4096)
+def resolve_browser(user_agent):
+    """
+    :return: (browser name, version info) shared by all rows with this UA
+    """
+    return browsers.resolve(user_agent)
+
+
+@lru_cache(maxsize=4096)
+def resolve_engine(referer):
+    return engines.resolve(referer)
+
+
+class HostnameResolver(object):
+    """
+    Reverse DNS lookups in a small thread pool. Results are kept in a
+    bounded LRU cache, a caller waits at most `timeout` seconds and gets the
+    ip back if the lookup is not finished yet; the lookup keeps running and
+    its result is cached for the next caller.
+    """
+    def __init__(self, cache_size=4096, timeout=0.1, workers=4):
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.workers = workers
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix='reverse-dns'
+            )
+        return self._executor
+
+    def _lookup(self, ip):
+        try:
+            hostname = socket.gethostbyaddr(ip)[0]
+        except Exception:  # socket.gaierror, socket.herror, etc
+            hostname = ip
+
+        with self.lock:
+            self.cache[ip] = hostname
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            self.pending.pop(ip, None)
+        return hostname
+
+    def _submit(self, ip):
+        """
+        Must be called with the lock held
+        """
+        future = self.pending.get(ip)
+        if future is None:
+            future = self.executor.submit(self._lookup, ip)
+            self.pending[ip] = future
+        return future
+
+    def resolve(self, ip, timeout=None):
+        if not ip:
+            return ip
+
+        with self.lock:
+            if ip in self.cache:
+                self.cache.move_to_end(ip)
+                return self.cache[ip]
+            future = self._submit(ip)
+
+        try:
+            return future.result(
+                timeout=self.timeout if timeout is None else timeout
+            )
+        except TimeoutError:
+            return ip
+
+
+hostname_resolver = HostnameResolver(
+    timeout=getattr(settings, 'REVERSE_DNS_TIMEOUT', 0.1)
+)
+
+
 def get_coordinates_by_address(address):
     """
     :param address: address text
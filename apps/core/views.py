@@ -1,3 +1,15 @@
-from django.shortcuts import render
+# django
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http.response import JsonResponse
 
-# Create your views here.
+# ofinta
+from apps.core.http import http_client
+
+
+@staff_member_required
+def outbound_http_stats(request):
+    """
+    Circuit state, errors and latency histogram of every outbound
+    endpoint called by the current process
+    """
+    return JsonResponse(http_client.stats())
@@ -0,0 +1,186 @@
+# system
+import atexit
+import logging
+import queue
+import threading
+import time
+
+# django
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy:
+    DROP = 'drop'
+    BLOCK = 'block'
+    CHOICES = (
+        (DROP, 'Drop new rows when the queue is full'),
+        (BLOCK, 'Block the caller until there is room in the queue'),
+    )
+
+
+class BufferedWriter:
+    """
+    Collects unsaved model instances in a bounded in-memory queue and writes
+    them with ``bulk_create`` from a background thread, once ``batch_size``
+    rows are queued or ``flush_interval`` seconds have passed.
+
+    With ``asynchronous=False`` every row is saved immediately on ``put``.
+    """
+    def __init__(self, model, batch_size=100, flush_interval=2.0,
+                 max_queue_size=10000, overflow=OverflowPolicy.DROP,
+                 block_timeout=None, asynchronous=True):
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.asynchronous = asynchronous
+
+        self.queue = queue.Queue(maxsize=max_queue_size)
+
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+        atexit.register(self.stop)
+
+    def __str__(self):
+        return f'Buffered writer for {self.model._meta.label}'
+
+    @property
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'enqueued': self.enqueued,
+            'flushed': self.flushed,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    def put(self, obj):
+        """
+        Queue an unsaved instance
+        :param obj: model instance
+        :return: True if the row was accepted, False if it was dropped
+        """
+        if not self.asynchronous:
+            self._write([obj])
+            return True
+
+        self.start()
+
+        try:
+            if self.overflow == OverflowPolicy.BLOCK:
+                self.queue.put(obj, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(obj)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f'{self.model._meta.label_lower}-writer',
+                daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        """
+        Stop the background thread and write everything that is left
+        """
+        self._stopped.set()
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout)
+        self.flush()
+
+    def flush(self):
+        """
+        Write all queued rows in the calling thread
+        :return: number of written rows
+        """
+        written = 0
+        batch = self._drain(self.batch_size)
+        while batch:
+            written += self._write(batch)
+            batch = self._drain(self.batch_size)
+        return written
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _collect(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stopped.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if batch:
+                close_old_connections()
+                self._write(batch)
+
+        connection.close()
+
+    def _write(self, batch):
+        try:
+            self.model.objects.bulk_create(batch)
+        except Exception as e:
+            logger.exception(e)
+            with self._lock:
+                self.failed += len(batch)
+            return 0
+
+        with self._lock:
+            self.flushed += len(batch)
+        return len(batch)
+
+
+def get_writer_options(name):
+    options = getattr(settings, name, {})
+    return {
+        'batch_size': options.get('BATCH_SIZE', 100),
+        'flush_interval': options.get('FLUSH_INTERVAL', 2.0),
+        'max_queue_size': options.get('MAX_QUEUE_SIZE', 10000),
+        'overflow': options.get('OVERFLOW', OverflowPolicy.DROP),
+        'block_timeout': options.get('BLOCK_TIMEOUT'),
+        'asynchronous': options.get('ASYNC', True),
+    }
@@ -2,7 +2,7 @@
 from django.contrib import admin
 
 # ofinta
-from apps.management.drivers.models import DriverProfile
+from apps.management.drivers.models import DriverProfile, PushMessage
 
 
 @admin.register(DriverProfile)
@@ -19,3 +19,12 @@ class DriverProfileAdmin(admin.ModelAdmin):
         'last_update', 'photo'
     )
     readonly_fields = ('last_update', )
+
+
+@admin.register(PushMessage)
+class PushMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'user', 'order', 'status', 'attempts', 'created_at', 'sent_at'
+    )
+    list_filter = ('status', )
+    raw_id_fields = ('user', 'order')
@@ -0,0 +1,261 @@
+# system
+import datetime
+import math
+from collections import namedtuple
+
+# django
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.db.models.query_utils import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+# ofinta
+from apps.core.writers import BufferedWriter, get_writer_options
+from apps.management.drivers.models import DriverProfile, DriverLocation
+
+
+EARTH_RADIUS = 6371000  # meters
+
+LocationPoint = namedtuple(
+    'LocationPoint', ('latitude', 'longitude', 'recorded_at')
+)
+
+location_writer = BufferedWriter(
+    DriverLocation, **get_writer_options('DRIVER_LOCATION_WRITER')
+)
+
+
+def get_location_option(name, default):
+    return getattr(settings, 'DRIVER_LOCATION', {}).get(name, default)
+
+
+def distance(a, b):
+    """
+    Great-circle distance between two points
+    :param a: (latitude, longitude)
+    :param b: (latitude, longitude)
+    :return: meters
+    """
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(h)))
+
+
+def parse_timestamp(value, now):
+    """
+    :param value: ISO 8601 string, unix time or None for now
+    :return: aware datetime, not later than now
+    """
+    if value is None:
+        return now
+    if isinstance(value, bool):
+        raise ValueError('Invalid timestamp')
+    if isinstance(value, (int, float)):
+        try:
+            recorded_at = datetime.datetime.fromtimestamp(
+                value, tz=datetime.timezone.utc
+            )
+        except (OverflowError, OSError, ValueError):
+            raise ValueError('Invalid timestamp')
+    else:
+        recorded_at = parse_datetime(str(value))
+        if recorded_at is None:
+            raise ValueError('Invalid timestamp')
+        if timezone.is_naive(recorded_at):
+            recorded_at = timezone.make_aware(
+                recorded_at, datetime.timezone.utc
+            )
+    # device clocks run ahead sometimes
+    return min(recorded_at, now)
+
+
+def parse_point(data, now):
+    try:
+        latitude = float(data['latitude'])
+        longitude = float(data['longitude'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('latitude and longitude are required numbers')
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValueError('Coordinates are out of range')
+    return LocationPoint(
+        latitude, longitude, parse_timestamp(data.get('timestamp'), now)
+    )
+
+
+def parse_location_points(data, now=None):
+    """
+    Minimal validation of a location ping: a single
+    ``{"latitude", "longitude", "timestamp"}`` point or ``{"points": [...]}``
+    buffered by the app while it was offline
+    :return: list of LocationPoint, oldest first
+    :raise: ValueError
+    """
+    now = now or timezone.now()
+    if not isinstance(data, dict):
+        raise ValueError('Invalid location data')
+
+    points = data.get('points')
+    if points is None:
+        return [parse_point(data, now)]
+
+    if not isinstance(points, list) or not points:
+        raise ValueError('points must be a non-empty list')
+    max_points = get_location_option('MAX_POINTS', 500)
+    if len(points) > max_points:
+        raise ValueError(f'At most {max_points} points are accepted at once')
+    for point in points:
+        if not isinstance(point, dict):
+            raise ValueError('Invalid location data')
+    return sorted(
+        (parse_point(point, now) for point in points),
+        key=lambda point: point.recorded_at
+    )
+
+
+def get_cache_key(user_id):
+    return f'driver-location:{user_id}'
+
+
+def record_locations(user_id, points):
+    """
+    Append the points to the driver's location history and store the
+    latest of them as the driver's location, with a single UPDATE of
+    coordinates, location_recorded_at and last_update only.
+
+    Points closer than MIN_DISTANCE meters to the previous recorded one
+    are dropped. A ping of a driver who stands still is dropped without
+    a query, such a driver's location is refreshed every MIN_INTERVAL
+    seconds so they still count as active. Points recorded before the
+    stored location don't replace it. last_update is the time the ping
+    was received, so a driver sending an offline batch stays active.
+    :param user_id: driver id
+    :param points: LocationPoint list, oldest first
+    :return: True if the location was stored
+    :raise: DriverProfile.DoesNotExist if the user is not a driver
+    """
+    min_distance = get_location_option('MIN_DISTANCE', 10)
+    key = get_cache_key(user_id)
+    previous = cache.get(key)
+
+    latest = points[-1]
+    stored = False
+    # cached only after the driver's location was stored
+    if previous is None or distance(
+            previous, (latest.latitude, latest.longitude)
+    ) >= min_distance:
+        now = timezone.now()
+        profiles = DriverProfile.objects.filter(user_id=user_id)
+        stored = bool(profiles.filter(
+            Q(location_recorded_at__lt=latest.recorded_at) |
+            Q(location_recorded_at__isnull=True)
+        ).update(
+            coordinates=Point(latest.latitude, latest.longitude),
+            location_recorded_at=latest.recorded_at,
+            last_update=now
+        ))
+        if stored:
+            cache.set(
+                key, (latest.latitude, latest.longitude),
+                timeout=get_location_option('MIN_INTERVAL', 60)
+            )
+        elif not profiles.update(last_update=now):
+            raise DriverProfile.DoesNotExist(
+                f'User {user_id} is not a driver'
+            )
+
+    for point in points:
+        position = (point.latitude, point.longitude)
+        if previous is not None and distance(previous, position) < \
+                min_distance:
+            continue
+        location_writer.put(DriverLocation(
+            user_id=user_id,
+            latitude=point.latitude,
+            longitude=point.longitude,
+            recorded_at=point.recorded_at
+        ))
+        previous = position
+
+    return stored
+
+
+def to_meters(point, origin):
+    """
+    Equirectangular projection around origin, precise enough for the
+    distances within a track
+    :return: (x, y) in meters
+    """
+    x = math.radians(point[1] - origin[1]) * \
+        math.cos(math.radians(origin[0])) * EARTH_RADIUS
+    y = math.radians(point[0] - origin[0]) * EARTH_RADIUS
+    return x, y
+
+
+def simplify(points, tolerance):
+    """
+    Douglas-Peucker simplification of a track, iterative so long tracks
+    don't hit the recursion limit
+    :param points: (latitude, longitude, ...) tuples
+    :param tolerance: meters the simplified track may deviate
+    :return: list of the kept points
+    """
+    if len(points) < 3 or not tolerance:
+        return list(points)
+
+    projected = [to_meters(point, points[0]) for point in points]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    # squared distances, no square roots in the inner loop
+    tolerance = tolerance * tolerance
+    while stack:
+        first, last = stack.pop()
+        ax, ay = projected[first]
+        dx, dy = projected[last][0] - ax, projected[last][1] - ay
+        length = dx * dx + dy * dy
+        index, max_distance = None, tolerance
+        for i in range(first + 1, last):
+            px, py = projected[i][0] - ax, projected[i][1] - ay
+            if length:
+                # distance to the closest point of the segment
+                t = max(0, min(1, (px * dx + py * dy) / length))
+                px, py = px - t * dx, py - t * dy
+            d = px * px + py * py
+            if d > max_distance:
+                index, max_distance = i, d
+        if index is not None:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def track_distance(points):
+    """
+    :param points: (latitude, longitude, ...) tuples
+    :return: length of the track in meters
+    """
+    return sum(distance(a, b) for a, b in zip(points, points[1:]))
+
+
+def get_track(user_id, start, end, tolerance=None):
+    """
+    The driver's recorded locations between start and end, only the
+    partitions of that range are scanned
+    :param tolerance: meters, simplify the track with Douglas-Peucker
+    :return: list of LocationPoint, oldest first
+    """
+    points = [
+        LocationPoint(*row) for row in DriverLocation.objects.filter(
+            user_id=user_id,
+            recorded_at__gte=start,
+            recorded_at__lt=end
+        ).order_by('recorded_at').values_list(
+            'latitude', 'longitude', 'recorded_at'
+        ).iterator(chunk_size=5000)
+    ]
+    return simplify(points, tolerance)
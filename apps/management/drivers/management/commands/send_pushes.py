@@ -0,0 +1,68 @@
+# system
+import time
+
+# django
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+# ofinta
+from apps.management.drivers.push import dispatch_pending, requeue_stale, \
+    get_push_option, stats
+
+
+class Command(BaseCommand):
+    help = 'Send the pushes queued in the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Send the pushes which are due and exit'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=get_push_option('BATCH_SIZE', 500)
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=get_push_option('POLL_INTERVAL', 0.5),
+            help='Seconds to wait when there are no due pushes'
+        )
+        parser.add_argument(
+            '--stats-interval', type=float, default=60,
+            help='Seconds between outbox stats reports, 0 to disable'
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale pushes')
+
+        reported_at = time.monotonic()
+        while True:
+            close_old_connections()
+            processed = dispatch_pending(options['batch_size'])
+
+            interval = options['stats_interval']
+            if interval and time.monotonic() - reported_at >= interval:
+                self.report()
+                reported_at = time.monotonic()
+
+            if options['once'] and not processed:
+                break
+
+            if not processed:
+                time.sleep(options['poll_interval'])
+
+        if options['once']:
+            self.report()
+
+    def report(self):
+        outbox = stats()
+        latency = outbox['latency']
+        average = latency['sum'] / latency['count'] if latency['count'] else 0
+        self.stdout.write(
+            f"outbox depth {outbox['depth']}, "
+            f"oldest {outbox['oldest_age']:.1f}s, "
+            f"sent {latency['count']}, "
+            f"average latency {average:.2f}s"
+        )
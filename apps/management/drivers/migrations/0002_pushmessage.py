@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 22:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('drivers', '0001_initial'),
+        ('orders', '0015_order_number_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.TextField(blank=True, null=True, verbose_name='message')),
+                ('extra', models.JSONField(blank=True, default=dict, verbose_name='extra')),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'sending'), (3, 'sent'), (4, 'failed'), (5, 'no active device')], default=1, verbose_name='status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='run at')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='started at')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='sent at')),
+                ('last_error', models.TextField(blank=True, verbose_name='last error')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.order', verbose_name='order')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='push_messages', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_at'], name='drivers_push_status_run_at_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# drivers_driverlocation is partitioned by day on "recorded_at", so the
+# primary key has to be (id, recorded_at). Daily partitions are created by
+# the manage_partitions command, everything else goes to
+# drivers_driverlocation_default.
+CREATE_SQL = """
+CREATE SEQUENCE drivers_driverlocation_id_seq;
+CREATE TABLE drivers_driverlocation (
+    id bigint NOT NULL DEFAULT nextval('drivers_driverlocation_id_seq'),
+    user_id integer NOT NULL,
+    latitude double precision NOT NULL,
+    longitude double precision NOT NULL,
+    recorded_at timestamp with time zone NOT NULL,
+    CONSTRAINT drivers_driverlocation_pkey_id_time
+        PRIMARY KEY (id, recorded_at)
+) PARTITION BY RANGE (recorded_at);
+ALTER SEQUENCE drivers_driverlocation_id_seq
+    OWNED BY drivers_driverlocation.id;
+ALTER TABLE drivers_driverlocation
+    ADD CONSTRAINT drivers_driverlocation_user_id_fk_core_ofintauser_id
+    FOREIGN KEY (user_id) REFERENCES core_ofintauser (id)
+    DEFERRABLE INITIALLY DEFERRED;
+
+CREATE TABLE drivers_driverlocation_default
+    PARTITION OF drivers_driverlocation DEFAULT;
+"""
+
+DROP_SQL = """
+DROP TABLE drivers_driverlocation;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('drivers', '0002_pushmessage'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(CREATE_SQL, DROP_SQL),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name='DriverLocation',
+                    fields=[
+                        ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                        ('latitude', models.FloatField(verbose_name='latitude')),
+                        ('longitude', models.FloatField(verbose_name='longitude')),
+                        ('recorded_at', models.DateTimeField(verbose_name='recorded at')),
+                        ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='locations', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+                    ],
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='driverlocation',
+            index=models.Index(fields=['user', 'recorded_at'], name='drivers_loc_user_time_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:55
+
+from django.db import migrations, models
+from django.db.models.expressions import F
+
+
+def copy_last_update(apps, schema_editor):
+    # last_update held the device time of the stored location so far
+    DriverProfile = apps.get_model('drivers', 'DriverProfile')
+    DriverProfile.objects.filter(coordinates__isnull=False).update(
+        location_recorded_at=F('last_update')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0003_driverlocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driverprofile',
+            name='location_recorded_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='location recorded at'),
+        ),
+        migrations.RunPython(copy_last_update, migrations.RunPython.noop),
+    ]
@@ -5,12 +5,12 @@ import logging
 from django.contrib.gis.db.models import PointField
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 
 # third party
 from phonenumber_field.modelfields import PhoneNumberField
 
 # ofinta
-from push_notifications.models import GCMDevice
 from apps.core.models import OfintaUser
 from apps.management.drivers.managers import DriverManager
 
@@ -18,6 +18,21 @@ from apps.management.drivers.managers import DriverManager
 logger = logging.getLogger(__name__)
 
 
+class PushMessageStatus:
+    PENDING = 1
+    SENDING = 2
+    SENT = 3
+    FAILED = 4
+    NO_DEVICE = 5
+    CHOICES = (
+        (PENDING, 'pending'),
+        (SENDING, 'sending'),
+        (SENT, 'sent'),
+        (FAILED, 'failed'),
+        (NO_DEVICE, 'no active device'),
+    )
+
+
 class DriverProfile(models.Model):
     """
     Stores driver information
@@ -39,6 +54,11 @@ class DriverProfile(models.Model):
         verbose_name='coordinates',
         null=True, blank=True
     )
+    # device time of the point stored in coordinates
+    location_recorded_at = models.DateTimeField(
+        verbose_name='location recorded at',
+        null=True, blank=True
+    )
     last_update = models.DateTimeField(
         verbose_name='last update',
         auto_now=True
@@ -64,22 +84,97 @@ class DriverProfile(models.Model):
             '/static/img/user_default.svg'
 
     def send_push(self, message, push_extra, order=None):
-        from apps.api.v1.serializers import OrderSerializer
-        driver_device = GCMDevice.objects.filter(
-            cloud_message_type='FCM',
-            user=self.user,
-            active=True
-        ).last()
-
-        if order:
-            serializer = OrderSerializer(order)
-            push_extra.update(**{'order': serializer.data})
-
-        if driver_device:
-            driver_device.send_message(message, extra=push_extra)
-        else:
-            logger.warning(
-                'Current driver {} has no registered and active device'.format(
-                    self.user.email
-                )
-            )
\ No newline at end of file
+        """
+        Queue the push to the driver's device, it is sent once the current
+        transaction is committed, see apps.management.drivers.push
+        """
+        from apps.management.drivers.push import enqueue_push
+
+        return enqueue_push(self.user_id, message, push_extra, order)
+
+
+class PushMessage(models.Model):
+    """
+    Outbox of push notifications to the drivers, sent in batches by
+    the send_pushes command
+    """
+    user = models.ForeignKey(
+        OfintaUser,
+        verbose_name='user',
+        related_name='push_messages',
+        on_delete=models.CASCADE
+    )
+    # serialized into the push when it is sent
+    order = models.ForeignKey(
+        'orders.Order',
+        verbose_name='order',
+        related_name='+',
+        null=True, blank=True,
+        on_delete=models.CASCADE
+    )
+    message = models.TextField(verbose_name='message', null=True, blank=True)
+    extra = models.JSONField(verbose_name='extra', default=dict, blank=True)
+    status = models.PositiveSmallIntegerField(
+        verbose_name='status',
+        choices=PushMessageStatus.CHOICES,
+        default=PushMessageStatus.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='attempts', default=0
+    )
+    run_at = models.DateTimeField(verbose_name='run at', default=timezone.now)
+    created_at = models.DateTimeField(
+        verbose_name='created at', default=timezone.now
+    )
+    started_at = models.DateTimeField(
+        verbose_name='started at', null=True, blank=True
+    )
+    sent_at = models.DateTimeField(
+        verbose_name='sent at', null=True, blank=True
+    )
+    last_error = models.TextField(verbose_name='last error', blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'],
+                name='drivers_push_status_run_at_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'Push to {self.user_id} ({self.get_status_display()})'
+
+
+class DriverLocation(models.Model):
+    """
+    Append-only history of the drivers' locations, see
+    apps.management.drivers.locations. Rows are written in batches by
+    a BufferedWriter.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        OfintaUser,
+        verbose_name='user',
+        related_name='locations',
+        on_delete=models.CASCADE,
+        db_index=False  # covered by the (user, recorded_at) index
+    )
+    # plain doubles, the same order as DriverProfile.coordinates
+    latitude = models.FloatField(verbose_name='latitude')
+    longitude = models.FloatField(verbose_name='longitude')
+    recorded_at = models.DateTimeField(verbose_name='recorded at')
+
+    class Meta:
+        # the table is partitioned by day on `recorded_at`,
+        # see apps.core.partitions and the manage_partitions command
+        indexes = [
+            models.Index(
+                fields=['user', 'recorded_at'],
+                name='drivers_loc_user_time_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} at ({self.latitude}, {self.longitude}) ' \
+               f'on {self.recorded_at}'
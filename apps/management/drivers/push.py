@@ -0,0 +1,360 @@
+# system
+import datetime
+import json
+import logging
+from collections import defaultdict
+
+# django
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.aggregates import Min
+from django.db.models.expressions import F
+from django.utils import timezone
+
+# third party
+import requests
+from push_notifications.models import GCMDevice
+
+# ofinta
+from apps.core.http import http_client, Histogram
+from apps.management.drivers.models import PushMessage, PushMessageStatus
+
+
+logger = logging.getLogger(__name__)
+
+FCM_URL = 'https://fcm.googleapis.com/fcm/send'
+# registration ids per FCM request
+FCM_MAX_RECIPIENTS = 1000
+# the device is gone, the message is dropped and the device deactivated
+FCM_DEVICE_ERRORS = frozenset(('NotRegistered', 'InvalidRegistration'))
+# temporary failures, the message is retried
+FCM_RETRY_ERRORS = frozenset((
+    'Unavailable', 'InternalServerError', 'DeviceMessageRateExceeded'
+))
+
+# seconds between enqueueing and sending of the pushes sent by this process
+delivery_latency = Histogram()
+
+
+def get_push_option(name, default):
+    return getattr(settings, 'PUSH_OUTBOX', {}).get(name, default)
+
+
+def enqueue_push(user_id, message, push_extra, order=None):
+    """
+    Store the push in the outbox. The row is part of the current
+    transaction: a rolled back change sends no push. With
+    ``PUSH_OUTBOX['EAGER']`` the outbox is dispatched right after commit.
+    :return: PushMessage instance
+    """
+    return enqueue_pushes([PushMessage(
+        user_id=user_id,
+        message=message,
+        extra=push_extra or {},
+        order=order
+    )])[0]
+
+
+def enqueue_pushes(pushes):
+    """
+    Store many pushes in the outbox with one query, see enqueue_push
+    :param pushes: unsaved PushMessage instances
+    :return: list of PushMessage instances
+    """
+    pushes = PushMessage.objects.bulk_create(pushes)
+    if pushes and get_push_option('EAGER', False):
+        transaction.on_commit(dispatch_pending)
+    return pushes
+
+
+class FCMError(Exception):
+    """
+    FCM rejected the whole request, it should not be retried
+    """
+
+
+class FCMClient:
+    """
+    FCM legacy HTTP API client sending one payload to many devices.
+    The payload format is the one of django-push-notifications, so the
+    apps see no difference.
+    """
+    def get_url(self):
+        return settings.PUSH_NOTIFICATIONS_SETTINGS.get('FCM_POST_URL', FCM_URL)
+
+    def get_api_key(self):
+        return settings.PUSH_NOTIFICATIONS_SETTINGS['FCM_API_KEY']
+
+    def send(self, registration_ids, message, data):
+        """
+        :param registration_ids: up to FCM_MAX_RECIPIENTS device tokens
+        :param message: notification body or None for data messages
+        :param data: data payload
+        :return: list of FCM results, one per registration id
+        :raise: requests.RequestException on network errors and 5xx
+            responses, FCMError if the request was rejected
+        """
+        payload = {'registration_ids': registration_ids}
+        if message is not None:
+            payload['notification'] = {'body': message}
+        if data:
+            payload['data'] = data
+
+        response = http_client.post(
+            'fcm', self.get_url(),
+            data=json.dumps(payload, cls=DjangoJSONEncoder),
+            headers={
+                'Authorization': 'key={}'.format(self.get_api_key()),
+                'Content-Type': 'application/json',
+            }
+        )
+        if response.status_code >= 500:
+            raise requests.HTTPError(
+                'FCM responded with {}'.format(response.status_code),
+                response=response
+            )
+        if response.status_code != 200:
+            raise FCMError('FCM responded with {}: {}'.format(
+                response.status_code, response.text[:200]
+            ))
+        return response.json()['results']
+
+
+fcm = FCMClient()
+
+
+def claim(batch_size):
+    """
+    Lock the due pushes and mark them as being sent, pushes locked by
+    other workers are skipped
+    :return: list of PushMessage instances
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        pushes = list(
+            PushMessage.objects.select_for_update(skip_locked=True).filter(
+                status=PushMessageStatus.PENDING,
+                run_at__lte=now
+            ).order_by('run_at', 'pk')[:batch_size]
+        )
+        if pushes:
+            PushMessage.objects.filter(pk__in=[p.pk for p in pushes]).update(
+                status=PushMessageStatus.SENDING,
+                attempts=F('attempts') + 1,
+                started_at=now
+            )
+            for push in pushes:
+                push.attempts += 1
+    return pushes
+
+
+def get_devices(user_ids):
+    """
+    :return: {user id: latest active FCM device}
+    """
+    devices = GCMDevice.objects.filter(
+        cloud_message_type='FCM',
+        user_id__in=user_ids,
+        active=True
+    ).order_by('pk')
+    return {device.user_id: device for device in devices}
+
+
+def get_order_payloads(order_ids):
+    """
+    Order part of the pushes. Payload version 2 carries the order id,
+    number, status and version only, the app fetches the rest from the API
+    when its copy is older. Version 1 carries the whole serialized order.
+    :return: {order id: order payload}
+    """
+    from apps.management.orders.models import Order
+    from apps.management.orders.snapshots import get_order_snapshots
+
+    if not order_ids:
+        return {}
+
+    orders = Order.objects.filter(pk__in=order_ids)
+    if get_push_option('PAYLOAD_VERSION', 1) == 1:
+        return get_order_snapshots(
+            dict(orders.values_list('pk', 'version'))
+        )
+
+    return {
+        order['id']: order for order in orders.values(
+            'id', 'order_number', 'status', 'version'
+        )
+    }
+
+
+def dispatch(pushes):
+    """
+    Send the claimed pushes. Pushes with the same payload go out in one
+    FCM request per FCM_MAX_RECIPIENTS devices, identical pushes to the
+    same device are sent once.
+    :return: {status: number of pushes}
+    """
+    devices = get_devices({push.user_id for push in pushes})
+    orders = get_order_payloads({
+        push.order_id for push in pushes if push.order_id
+    })
+    payload_version = get_push_option('PAYLOAD_VERSION', 1)
+
+    # payload -> registration id -> pushes
+    groups = defaultdict(lambda: defaultdict(list))
+    payloads = {}
+    no_device = []
+    for push in pushes:
+        device = devices.get(push.user_id)
+        if device is None:
+            no_device.append(push)
+            continue
+
+        data = dict(push.extra, v=payload_version)
+        if push.order_id in orders:
+            data['order'] = orders[push.order_id]
+        key = (push.message, json.dumps(
+            data, sort_keys=True, cls=DjangoJSONEncoder
+        ))
+        payloads[key] = data
+        groups[key][device.registration_id].append(push)
+
+    sent, failed, retried = [], [], []
+    errors = {}
+    inactive = set()
+    for key, recipients in groups.items():
+        message, data = key[0], payloads[key]
+        registration_ids = list(recipients)
+        for start in range(0, len(registration_ids), FCM_MAX_RECIPIENTS):
+            chunk = registration_ids[start:start + FCM_MAX_RECIPIENTS]
+            try:
+                results = fcm.send(chunk, message, data)
+            except (requests.RequestException, ValueError, KeyError) as e:
+                for registration_id in chunk:
+                    retried.extend(recipients[registration_id])
+                    for push in recipients[registration_id]:
+                        errors[push.pk] = str(e)
+                continue
+            except FCMError as e:
+                for registration_id in chunk:
+                    failed.extend(recipients[registration_id])
+                    for push in recipients[registration_id]:
+                        errors[push.pk] = str(e)
+                continue
+
+            for registration_id, result in zip(chunk, results):
+                error = result.get('error')
+                chunk_pushes = recipients[registration_id]
+                if not error:
+                    sent.extend(chunk_pushes)
+                    continue
+
+                for push in chunk_pushes:
+                    errors[push.pk] = error
+                if error in FCM_RETRY_ERRORS:
+                    retried.extend(chunk_pushes)
+                else:
+                    failed.extend(chunk_pushes)
+                    if error in FCM_DEVICE_ERRORS:
+                        inactive.add(registration_id)
+
+    if no_device:
+        logger.warning(
+            'Drivers %s have no registered and active device',
+            sorted({push.user_id for push in no_device})
+        )
+    if inactive:
+        GCMDevice.objects.filter(registration_id__in=inactive).update(
+            active=False
+        )
+
+    save_outcome(sent, failed, retried, no_device, errors)
+    return {
+        PushMessageStatus.SENT: len(sent),
+        PushMessageStatus.FAILED: len(failed),
+        PushMessageStatus.PENDING: len(retried),
+        PushMessageStatus.NO_DEVICE: len(no_device),
+    }
+
+
+def save_outcome(sent, failed, retried, no_device, errors):
+    now = timezone.now()
+    if sent:
+        PushMessage.objects.filter(pk__in=[p.pk for p in sent]).update(
+            status=PushMessageStatus.SENT,
+            sent_at=now,
+            last_error=''
+        )
+        for push in sent:
+            delivery_latency.observe((now - push.created_at).total_seconds())
+
+    if no_device:
+        PushMessage.objects.filter(pk__in=[p.pk for p in no_device]).update(
+            status=PushMessageStatus.NO_DEVICE
+        )
+
+    max_attempts = get_push_option('MAX_ATTEMPTS', 5)
+    retry_delay = get_push_option('RETRY_DELAY', 5)
+    exhausted = [push for push in retried if push.attempts >= max_attempts]
+    by_attempts = defaultdict(list)
+    for push in retried:
+        if push.attempts < max_attempts:
+            by_attempts[push.attempts].append(push.pk)
+    for attempts, pks in by_attempts.items():
+        PushMessage.objects.filter(pk__in=pks).update(
+            status=PushMessageStatus.PENDING,
+            run_at=now + datetime.timedelta(
+                seconds=retry_delay * 2 ** (attempts - 1)
+            )
+        )
+
+    by_error = defaultdict(list)
+    for push in failed + exhausted:
+        by_error[errors.get(push.pk, '')].append(push.pk)
+    for error, pks in by_error.items():
+        PushMessage.objects.filter(pk__in=pks).update(
+            status=PushMessageStatus.FAILED,
+            last_error=error
+        )
+
+
+def dispatch_pending(batch_size=None):
+    """
+    Claim and send one batch of due pushes
+    :return: number of processed pushes
+    """
+    pushes = claim(batch_size or get_push_option('BATCH_SIZE', 500))
+    if pushes:
+        dispatch(pushes)
+    return len(pushes)
+
+
+def requeue_stale():
+    """
+    Return pushes of crashed workers to the outbox
+    :return: number of requeued pushes
+    """
+    started_before = timezone.now() - datetime.timedelta(
+        seconds=get_push_option('STALE_TIMEOUT', 300)
+    )
+    return PushMessage.objects.filter(
+        status=PushMessageStatus.SENDING,
+        started_at__lt=started_before
+    ).update(status=PushMessageStatus.PENDING)
+
+
+def stats():
+    """
+    :return: outbox depth, age of the oldest due push and delivery
+        latency of the pushes sent by this process
+    """
+    now = timezone.now()
+    pending = PushMessage.objects.filter(status=PushMessageStatus.PENDING)
+    oldest = pending.filter(run_at__lte=now).aggregate(
+        oldest=Min('created_at')
+    )['oldest']
+    return {
+        'depth': pending.count(),
+        'oldest_age': (now - oldest).total_seconds() if oldest else 0,
+        'latency': delivery_latency.snapshot(),
+    }
@@ -7,7 +7,7 @@ from rest_framework.authtoken.views import ObtainAuthToken
 # ofinta
 from apps.api.v1.serializers import DriverAuthTokenSerializer
 from apps.management.drivers.views import DriversList, DriverDetails, \
-    DriverEdit, DriverStatus, DriverAdd
+    DriverEdit, DriverStatus, DriverAdd, DriverTrack
 
 
 urlpatterns = [
@@ -20,6 +20,7 @@ urlpatterns = [
         DriverStatus.as_view(),
         name='driver-status'
     ),
+    path('<int:pk>/track/', DriverTrack.as_view(), name='driver-track'),
     path(
         'login/',
         ObtainAuthToken.as_view(serializer_class=DriverAuthTokenSerializer),
@@ -1,12 +1,23 @@
+# system
+import datetime
+import math
+
 # django
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http.response import JsonResponse
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views.generic import ListView, DetailView, UpdateView, CreateView
 
 # ofinta
 from apps.management.drivers.forms import DriverStatusForm, DriverForm
 from apps.management.drivers.mixins import DriversMixin
 from apps.management.drivers.models import OfintaUser, DriverProfile
+from apps.management.drivers import push
+from apps.management.drivers.locations import get_track, track_distance
 
 
 class DriversList(LoginRequiredMixin, DriversMixin, ListView):
@@ -95,3 +106,82 @@ class DriverStatus(LoginRequiredMixin, DriversMixin, UpdateView):
     def get_success_url(self):
         driver = self.get_object()
         return reverse('management:driver-details', args=(driver.pk, ))
+
+
+class DriverTrack(LoginRequiredMixin, DriversMixin, DetailView):
+    """
+    Recorded track of the driver for the map, ``start`` and ``end`` are
+    ISO 8601 datetimes, the last 24 hours by default. The track is
+    simplified with ``tolerance`` meters, 0 returns every point. Invalid
+    parameters get 400.
+    """
+    model = OfintaUser
+
+    def get_datetime(self, name):
+        """
+        :return: aware datetime of the query parameter, None if not given
+        :raise: ValueError
+        """
+        value = self.request.GET.get(name)
+        if not value:
+            return None
+        # None for a malformed value, ValueError for a date which doesn't
+        # exist, e.g. 2024-02-30
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f'Invalid datetime {value}')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def get_range(self, start=None, end=None):
+        end = end or timezone.now()
+        start = start or end - datetime.timedelta(days=1)
+        max_days = settings.DRIVER_LOCATION['MAX_TRACK_DAYS']
+        return max(start, end - datetime.timedelta(days=max_days)), end
+
+    def get_tolerance(self):
+        """
+        :return: meters, finite and not negative
+        :raise: ValueError
+        """
+        tolerance = float(self.request.GET.get(
+            'tolerance', settings.DRIVER_LOCATION['TRACK_TOLERANCE']
+        ))
+        if not math.isfinite(tolerance) or tolerance < 0:
+            raise ValueError(f'Invalid tolerance {tolerance}')
+        return tolerance
+
+    def get(self, request, *args, **kwargs):
+        driver = self.get_object()
+        dates = {}
+        for name in ('start', 'end'):
+            try:
+                dates[name] = self.get_datetime(name)
+            except ValueError:
+                return JsonResponse({name: 'Invalid datetime'}, status=400)
+        start, end = self.get_range(**dates)
+        try:
+            tolerance = self.get_tolerance()
+        except ValueError:
+            return JsonResponse({'tolerance': 'Invalid number'}, status=400)
+
+        points = get_track(driver.pk, start, end, tolerance=tolerance)
+        return JsonResponse({
+            'start': start,
+            'end': end,
+            'distance': round(track_distance(points)),
+            'points': [
+                [point.latitude, point.longitude, point.recorded_at]
+                for point in points
+            ],
+        })
+
+
+@staff_member_required
+def push_outbox_stats(request):
+    """
+    Depth of the push outbox and delivery latency histogram of the pushes
+    sent by the current process
+    """
+    return JsonResponse(push.stats())
@@ -7,10 +7,15 @@ class OrdersConfig(AppConfig):
 
     def ready(self):
         from apps.management.warehouses.signals import generate_code
-        from django.db.models.signals import pre_save
+        from django.db.models.signals import pre_save, post_save, post_delete
         from apps.management.warehouses.models import Warehouse
-        from apps.management.orders.models import Order
+        from apps.management.orders.models import Order, OrderAssignments, \
+            Position
         from apps.management.warehouses.signals import generate_order_number
+        from apps.management.orders.signals import update_current_assignment, \
+            reset_current_assignment, update_total_amount, \
+            new_location_version, new_warehouse_version
+        from apps.shared.models import Location
 
         pre_save.connect(
             generate_code,
@@ -22,3 +27,33 @@ class OrdersConfig(AppConfig):
             sender=Order,
             dispatch_uid='order_pre_create'
         )
+        post_save.connect(
+            update_current_assignment,
+            sender=OrderAssignments,
+            dispatch_uid='order_assignment_saved'
+        )
+        post_delete.connect(
+            reset_current_assignment,
+            sender=OrderAssignments,
+            dispatch_uid='order_assignment_deleted'
+        )
+        post_save.connect(
+            update_total_amount,
+            sender=Position,
+            dispatch_uid='order_position_saved'
+        )
+        post_delete.connect(
+            update_total_amount,
+            sender=Position,
+            dispatch_uid='order_position_deleted'
+        )
+        post_save.connect(
+            new_location_version,
+            sender=Location,
+            dispatch_uid='order_location_saved'
+        )
+        post_save.connect(
+            new_warehouse_version,
+            sender=Warehouse,
+            dispatch_uid='order_warehouse_saved'
+        )
@@ -9,14 +9,16 @@ from django.utils import timezone
 
 # ofinta
 from django.contrib.gis.geos import Point
-from django.db.models.aggregates import Max
 from django.forms.models import inlineformset_factory
 from django.forms.widgets import HiddenInput
 
 from apps.core.models import OfintaUser, UserRoles
 from apps.core.utils import get_coordinates_by_address
+from apps.management.drivers.models import PushMessage
+from apps.management.drivers.push import enqueue_pushes
 from apps.management.orders.constants import OrderStatus, \
     OrderAssignmentStatus, PushStatuses, PaymentMethod
+from apps.management.orders.jobs import submit_payment
 from apps.management.orders.models import Order, OrderAssignments, Position, \
     Payment
 from apps.shared.models import Location
@@ -71,11 +73,14 @@ class PaymentLinkEditForm(forms.ModelForm):
         pay = bool(self.cleaned_data.get('pay'))
         able_to_pay = pay and order.shop.allow_prepayment
 
-        # create new payment
+        # create new payment, STK push is sent by a background job
         if order.payment_method == PaymentMethod.MPESA:
             if able_to_pay:
                 payment = Payment.objects.create(order=order)
-                payment.new_submit()
+                order.pending_transaction = True
+                order.save(update_fields=['pending_transaction'])
+                submit_payment.delay(payment_id=payment.id)
+                return order
 
         order.save()
         return order
@@ -115,11 +120,10 @@ class PaymentLinkCreateForm(forms.ModelForm):
         self.fields['shop'].initial = shop.id
         self.fields['shop'].widget = HiddenInput()
 
-        max_order_number = Order.objects.all().aggregate(
-            Max('order_number')
-        )['order_number__max']
-        
-        self.fields['order_number'].initial = max_order_number + 1 if max_order_number else 1
+        # allocated on save, rendering the form must not use up a number
+        self.fields['order_number'].required = False
+        self.fields['order_number'].help_text = \
+            'Leave empty to number the order automatically'
 
         self.fields['warehouse'].empty_label = None
         self.fields['warehouse'].queryset = shop.warehouses.all()
@@ -242,36 +246,41 @@ class DriverAssignForm(forms.ModelForm):
         self.fields['driver'].queryset = drivers_qset
 
     def save(self, commit=True):
-        # remove previous assigned assignments
+        """
+        Replace the open assignments of the order with the new one and
+        notify the previous and the new driver, with a constant number of
+        queries however many assignments the order had
+        """
         prev_assignments = self.order.assignments.filter(
             status__in=[OrderAssignmentStatus.ASSIGNED,
                         OrderAssignmentStatus.ACCEPTED]
         )
+        prev_driver_ids = set(prev_assignments.filter(
+            driver__driver_profile__isnull=False
+        ).values_list('driver_id', flat=True))
 
-        # send push notification to the previous drivers
-        for prev_assignment in prev_assignments:
-            prev_driver_profile = prev_assignment.driver.driver_profile
-            prev_driver_profile.send_push(
-                None,
-                {"status": PushStatuses.ORDER_REASSIGNED},
-                self.order
-            )
-
-        prev_assignments.delete()
+        prev_assignments.delete_in_bulk()
 
         assignment = super().save(False)
         assignment.order = self.order
         assignment.save()
 
-        # send push notification to the new driver
-        driver_profile = assignment.driver.driver_profile \
-            if hasattr(assignment.driver, 'driver_profile') else None
-        if driver_profile:
-            driver_profile.send_push(
-                None,
-                {"status": PushStatuses.ORDER_ASSIGNED},
-                self.order
+        # push notifications to the previous drivers and the new one
+        pushes = [
+            PushMessage(
+                user_id=driver_id,
+                extra={"status": PushStatuses.ORDER_REASSIGNED},
+                order=self.order
             )
+            for driver_id in sorted(prev_driver_ids)
+        ]
+        if hasattr(assignment.driver, 'driver_profile'):
+            pushes.append(PushMessage(
+                user_id=assignment.driver_id,
+                extra={"status": PushStatuses.ORDER_ASSIGNED},
+                order=self.order
+            ))
+        enqueue_pushes(pushes)
 
         self.order.status = OrderStatus.ASSIGNED
         self.order.driver = None
@@ -0,0 +1,21 @@
+# ofinta
+from apps.core.jobs import job
+from apps.management.orders.models import Payment
+
+
+@job('orders.submit_payment', max_attempts=1)
+def submit_payment(payment_id, mpesa_options=None):
+    """
+    Send STK push for the payment. The outcome is reported by
+    Order.pending_transaction and pushes to the assigned driver.
+    :param mpesa_options: MPesa settings overriding the project ones,
+        see MPesaGateway
+    """
+    payment = Payment.objects.select_related('order').filter(
+        pk=payment_id
+    ).first()
+    if payment is None:
+        # replaced by a newer payment of the order
+        return
+
+    payment.new_submit(mpesa_options)
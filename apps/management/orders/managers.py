@@ -1,12 +1,30 @@
 # django
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.aggregates import Sum
+from django.db.models.expressions import OuterRef, Subquery, F, Value
+from django.db.models.functions import Coalesce
 from django.db.models.query_utils import Q
 
 # ofinta
-from apps.management.orders.constants import OrderStatus, PaymentMethod
+from apps.management.orders.constants import OrderStatus, PaymentMethod, \
+    OrderAssignmentStatus
 from apps.mpesa_gateway.models import TransactionStatus
 
 
+def get_positions_totals():
+    """
+    :return: positions quantity and amount of the outer order
+    """
+    from apps.management.orders.models import Position
+
+    return Position.objects.filter(
+        order=OuterRef('pk')
+    ).order_by().values('order').annotate(
+        quantity=Sum('quantity'),
+        amount=Sum(F('quantity') * F('price'))
+    )
+
+
 class OrderQuerySet(models.query.QuerySet):
 
     def get_pl(self):
@@ -65,6 +83,93 @@ class OrderQuerySet(models.query.QuerySet):
     def get_canceled(self):
         return self.filter(status=OrderStatus.CANCELED)
 
+    def with_last_assignment(self, driver):
+        """
+        Annotate orders with the status of the latest assignment
+        of the driver to the order (NULL if he has never been assigned)
+        """
+        from apps.management.orders.models import OrderAssignments
+
+        last_assignment = OrderAssignments.objects.filter(
+            order=OuterRef('pk'),
+            driver=driver
+        ).order_by('-pk')
+        return self.annotate(
+            last_assignment_status=Subquery(
+                last_assignment.values('status')[:1]
+            )
+        )
+
+    def get_driver_active(self, driver):
+        """
+        Orders whose latest assignment to the driver is not rejected
+        """
+        return self.with_last_assignment(driver).filter(
+            last_assignment_status__isnull=False
+        ).exclude(
+            last_assignment_status=OrderAssignmentStatus.REJECTED
+        )
+
+    def get_driver_history(self, driver):
+        """
+        Orders whose latest assignment to the driver was accepted
+        """
+        return self.with_last_assignment(driver).filter(
+            last_assignment_status=OrderAssignmentStatus.ACCEPTED
+        )
+
+    def with_totals(self):
+        """
+        Annotate orders with the total quantity of positions
+        as ``order_quantity`` and the order amount (positions total
+        plus delivery fee) as ``order_amount``
+        """
+        positions = get_positions_totals()
+        return self.annotate(
+            order_quantity=Coalesce(
+                Subquery(positions.values('quantity')),
+                Value(0),
+                output_field=models.PositiveIntegerField()
+            ),
+            order_amount=Coalesce(
+                Subquery(positions.values('amount')),
+                Value(0),
+                output_field=models.DecimalField()
+            ) + F('delivery_fee')
+        )
+
+    def update_totals(self):
+        """
+        Recalculate the stored Order.total_amount
+        """
+        positions = get_positions_totals()
+        return self.update(
+            total_amount=Coalesce(
+                Subquery(positions.values('amount')),
+                Value(0),
+                output_field=models.DecimalField()
+            ) + F('delivery_fee'),
+            version=F('version') + 1
+        )
+
+    def new_version(self):
+        """
+        Increment Order.version, e.g. when an object rendered with the
+        orders changed
+        """
+        return self.update(version=F('version') + 1)
+
+    def for_serialization(self):
+        """
+        Load everything the API order serializer reads: warehouse with its
+        location, shipping address, positions and the order totals
+        """
+        return self.select_related(
+            'warehouse__location', 'shipping_address'
+        ).prefetch_related(
+            'positions'
+        ).with_totals()
+
 
 class OrderManager(models.Manager):
 
@@ -113,5 +218,60 @@ class OrderManager(models.Manager):
     def get_canceled(self):
         return self.get_paid().get_canceled()
 
+    def with_totals(self):
+        return self.get_queryset().with_totals()
+
+    def for_serialization(self):
+        return self.get_queryset().for_serialization()
+
     def get_queryset(self):
         return OrderQuerySet(self.model, using=self._db)
+
+
+class OrderAssignmentsQuerySet(models.query.QuerySet):
+
+    def delete_in_bulk(self):
+        """
+        Delete the assignments with a constant number of queries. No
+        post_delete signal is sent per assignment, instead the orders
+        pointing to a deleted assignment get their latest remaining one
+        with a single update, as reset_current_assignment would do
+        :return: number of deleted assignments
+        """
+        from apps.management.orders.models import Order
+
+        pks = list(self.values_list('pk', flat=True))
+        if not pks:
+            return 0
+
+        latest = self.model.objects.filter(
+            order=OuterRef('pk')
+        ).exclude(pk__in=pks).order_by('-pk')
+        with transaction.atomic(using=self.db):
+            Order.objects.filter(current_assignment__in=pks).update(
+                current_assignment=Subquery(latest.values('pk')[:1]),
+                current_driver=Subquery(latest.values('driver')[:1]),
+                current_assignment_status=Subquery(
+                    latest.values('status')[:1]
+                )
+            )
+            # the orders don't reference the assignments anymore, nothing
+            # is left to collect. Plain SQL: a queryset delete would load
+            # the rows to send post_delete, and disconnecting the signal
+            # would affect the other threads
+            connection = connections[self.db]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'DELETE FROM {} WHERE {} = ANY(%s)'.format(
+                        connection.ops.quote_name(self.model._meta.db_table),
+                        connection.ops.quote_name(self.model._meta.pk.column)
+                    ),
+                    [pks]
+                )
+                return cursor.rowcount
+
+
+class OrderAssignmentsManager(models.Manager):
+
+    def get_queryset(self):
+        return OrderAssignmentsQuerySet(self.model, using=self._db)
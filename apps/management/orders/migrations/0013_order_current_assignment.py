@@ -0,0 +1,47 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.expressions import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def fill_current_assignment(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderAssignments = apps.get_model('orders', 'OrderAssignments')
+
+    latest = OrderAssignments.objects.filter(
+        order=OuterRef('pk')
+    ).order_by('-pk')
+    Order.objects.update(
+        current_assignment=Subquery(latest.values('pk')[:1]),
+        current_driver=Subquery(latest.values('driver')[:1]),
+        current_assignment_status=Subquery(latest.values('status')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0012_auto_20181016_0720'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='current_assignment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='orders.orderassignments', verbose_name='current assignment'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='current_assignment_status',
+            field=models.PositiveIntegerField(blank=True, choices=[(1, 'Assigned'), (2, 'Accepted'), (3, 'Rejected')], null=True, verbose_name='current assignment status'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='current_driver',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='current assignment driver'),
+        ),
+        migrations.RunPython(fill_current_assignment, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:05
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models.aggregates import Sum
+from django.db.models.expressions import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_total_amount(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    Position = apps.get_model('orders', 'Position')
+
+    positions_amount = Position.objects.filter(
+        order=OuterRef('pk')
+    ).order_by().values('order').annotate(
+        amount=Sum(F('quantity') * F('price'))
+    ).values('amount')
+    Order.objects.update(
+        total_amount=Coalesce(
+            Subquery(positions_amount),
+            Value(0),
+            output_field=models.DecimalField()
+        ) + F('delivery_fee')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_order_current_assignment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=Decimal('0'), max_digits=12, verbose_name='total amount'),
+        ),
+        migrations.RunPython(fill_total_amount, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_order_total_amount'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                'CREATE SEQUENCE IF NOT EXISTS orders_order_number_seq',
+                "SELECT setval('orders_order_number_seq', "
+                "COALESCE((SELECT MAX(order_number) FROM orders_order), 0) + 1, "
+                "false)",
+            ],
+            reverse_sql='DROP SEQUENCE IF EXISTS orders_order_number_seq',
+        ),
+    ]
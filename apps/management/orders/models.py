@@ -12,19 +12,24 @@ from django.contrib.sites.models import Site
 from django.core.mail import send_mail
 from django.core.validators import MinValueValidator
 from django.utils import timezone
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models.aggregates import Sum
+from django.db.models.expressions import F
 from django.urls import reverse
 
 # ofinta
+from apps.core.http import http_client
 from apps.core.mixins import ModelDiffMixin
 from apps.core.models import OfintaUser
 from apps.management.orders.constants import OrderStatus, PaymentMethod, \
     OrderAssignmentStatus, PaymentStatus, PushStatuses
-from apps.management.orders.managers import OrderManager
+from apps.management.orders.managers import OrderManager, \
+    OrderAssignmentsManager
 from apps.management.shops.models import Shop
 from apps.management.warehouses.models import Warehouse
 from apps.mpesa_gateway.gateway import MPesaGateway
 from apps.mpesa_gateway.models import MPesaTransaction, TransactionStatus
+from apps.mpesa_gateway.utils import notify_transaction_status
 from apps.shared.models import Location
 
 
@@ -82,6 +87,13 @@ class Order(models.Model, ModelDiffMixin):
         verbose_name='delivery fee',
         default=Decimal(0), decimal_places=2, max_digits=9
     )
+    # positions total plus delivery fee, maintained by the Position
+    # post_save/post_delete signals
+    total_amount = models.DecimalField(
+        verbose_name='total amount',
+        default=Decimal(0), decimal_places=2, max_digits=12,
+        db_index=True
+    )
     buyer_name = models.CharField(verbose_name='buyer name', max_length=128)
     buyer_phone = models.CharField(
         verbose_name='buyer phone',
@@ -122,6 +134,38 @@ class Order(models.Model, ModelDiffMixin):
         max_length=2000,
         blank=True
     )
+    # bumped on every change of the serialized order, keys the cached
+    # order snapshots, see apps.management.orders.snapshots
+    version = models.PositiveIntegerField(verbose_name='version', default=1)
+
+    # latest assignment of the order, maintained by the
+    # OrderAssignments post_save/post_delete signals
+    current_assignment = models.ForeignKey(
+        'OrderAssignments',
+        verbose_name='current assignment',
+        related_name='+',
+        null=True, blank=True,
+        on_delete=models.SET_NULL
+    )
+    current_driver = models.ForeignKey(
+        OfintaUser,
+        verbose_name='current assignment driver',
+        related_name='+',
+        null=True, blank=True,
+        on_delete=models.SET_NULL
+    )
+    current_assignment_status = models.PositiveIntegerField(
+        verbose_name='current assignment status',
+        choices=OrderAssignmentStatus.CHOICES,
+        null=True, blank=True
+    )
+
+    # fields written with queryset updates only, Order.save() never
+    # overwrites them with possibly stale values
+    DENORMALIZED_FIELDS = (
+        'current_assignment', 'current_driver', 'current_assignment_status',
+        'total_amount'
+    )
 
     objects = OrderManager()
 
@@ -193,10 +237,18 @@ class Order(models.Model, ModelDiffMixin):
                and self.status == OrderStatus.DELIVERED
 
     def save(self, *args, **kwargs):
-        driver = self.assigned_driver
-        super(Order, self).save(*args, **kwargs)
-
         diff_status = self.diff.get('status', [None, None])
+        # the driver to notify about the cancellation
+        driver = None
+        if diff_status[1] == OrderStatus.CANCELED:
+            driver = self.assigned_driver
+
+        if self._state.adding:
+            self.total_amount = self.delivery_fee
+            super(Order, self).save(*args, **kwargs)
+        else:
+            self.save_new_version(*args, **kwargs)
+
         if diff_status == (
                 OrderStatus.ASSIGNED,
                 OrderStatus.CANCELED
@@ -213,20 +265,84 @@ class Order(models.Model, ModelDiffMixin):
                 driver=driver
             )
 
+    def save_new_version(self, *args, **kwargs):
+        """
+        Update the order with the next version. The version is incremented
+        in the database before the order is written, so a stale in-memory
+        version is never written back and the post_save receivers get the
+        new one.
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not update_fields:
+            # nothing to write, Django skips the save
+            return super(Order, self).save(*args, **kwargs)
+
+        if update_fields is None:
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DENORMALIZED_FIELDS
+            ]
+        update_fields = [name for name in update_fields if name != 'version']
+        update_totals = 'delivery_fee' in update_fields \
+            and 'delivery_fee' in self.diff
+        if update_totals and 'total_amount' not in update_fields:
+            update_fields.append('total_amount')
+
+        using = kwargs.get('using') or router.db_for_write(
+            Order, instance=self
+        )
+        with transaction.atomic(using=using, savepoint=False):
+            version = self.increment_version(using)
+            if version is not None:
+                self.version = version
+            if update_totals:
+                amount = self.positions.aggregate(
+                    amount=Sum(F('quantity') * F('price'))
+                )['amount']
+                self.total_amount = (amount or 0) + Decimal(
+                    self.delivery_fee
+                )
+            if update_fields:
+                kwargs['update_fields'] = update_fields
+                super(Order, self).save(*args, **kwargs)
+
+    def increment_version(self, using):
+        """
+        Increment the version with UPDATE ... RETURNING, the row stays
+        locked until the end of the transaction
+        :return: new version, None if the order doesn't exist
+        """
+        connection = connections[using]
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE {table} SET {version} = {version} + 1 '
+                'WHERE {pk} = %s RETURNING {version}'.format(
+                    table=quote_name(self._meta.db_table),
+                    version=quote_name(
+                        self._meta.get_field('version').column
+                    ),
+                    pk=quote_name(self._meta.pk.column)
+                ),
+                [self.pk]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
     @property
     def assigned_driver(self):
 
         if self.driver:
             return self.driver
 
-        assignment = self.assignments.last()
-        if not assignment:
+        if not self.current_assignment_id:
             return
 
-        if assignment.status == OrderAssignmentStatus.REJECTED:
+        if self.current_assignment_status == OrderAssignmentStatus.REJECTED:
             return
 
-        return assignment.driver
+        return self.current_driver
 
     def paid_via_mpesa(self):
         if not hasattr(self, 'payment'):
@@ -237,9 +353,17 @@ class Order(models.Model, ModelDiffMixin):
         return txn.status == TransactionStatus.SUCCESS
 
     def total_quantity(self):
+        # annotated by Order.objects.with_totals()
+        if getattr(self, 'order_quantity', None) is not None:
+            return self.order_quantity
+
         return sum([position.quantity for position in self.positions.all()])
 
     def total_price(self):
+        # annotated by Order.objects.with_totals()
+        if getattr(self, 'order_amount', None) is not None:
+            return self.order_amount
+
         return sum([
             position.quantity * position.price
             for position in self.positions.all()
@@ -284,18 +408,29 @@ class Order(models.Model, ModelDiffMixin):
         }
         logger.warning('Refund request: {}'.format(data))
         headers = {'content-type': 'application/json'}
-        resp = requests.post(
-            settings.API_REFUND_URL,
-            data=json.dumps(data),
-            headers=headers,
-            auth=(settings.SHOP_ID, settings.SHOP_KEY)
-        )
-        return resp.json()
+        try:
+            resp = http_client.post(
+                'begateway-refund',
+                settings.API_REFUND_URL,
+                data=json.dumps(data),
+                headers=headers,
+                auth=(settings.SHOP_ID, settings.SHOP_KEY)
+            )
+            return resp.json()
+        except (requests.RequestException, ValueError) as e:
+            response = {
+                'status': 'failed',
+                'message': str(e),
+                'transaction': {'refund': {'status': 'failed'}}
+            }
+            logger.warning('Refund response: {}'.format(response))
+            return response
 
-    def generate_verification_code(self):
+    def generate_verification_code(self, commit=True):
         verification_code = random.randint(10000, 99999)
         self.verification_code = verification_code
-        self.save()
+        if commit:
+            self.save()
         return verification_code
 
     def send_verification_code_by_email(self):
@@ -412,6 +547,8 @@ class OrderAssignments(models.Model):
         default=OrderAssignmentStatus.ASSIGNED
     )
 
+    objects = OrderAssignmentsManager()
+
     def __str__(self):
         return f'Order {self.order.order_number} assignment to ' \
                f'{self.driver}. Status: {self.status_verbose}'
@@ -477,11 +614,12 @@ class Payment(models.Model):
     def status_verbose(self):
         return dict(PaymentStatus.CHOICES).get(self.status)
 
-    def new_submit(self):
+    def new_submit(self, mpesa_options=None):
         """
-        Submit payment
+        Submit payment, runs as the orders.submit_payment job
+        :param mpesa_options: MPesa settings overriding the project ones
         """
-        gw = MPesaGateway()
+        gw = MPesaGateway(mpesa_options)
         phone_number = self.order.get_phone_number(with_plus=False)
         result = gw.payment(
             self,
@@ -491,19 +629,24 @@ class Payment(models.Model):
         )
         success = result['success']
         transaction = result.get('transaction')
-        if success:
-            self.order.pending_transaction = True
+        if not success:
+            self.order.pending_transaction = False
             self.order.save()
 
-            self.transaction = transaction
-            self.save()
-        else:
+            notify_transaction_status(
+                self.order.pk,
+                transaction.status_verbose if transaction
+                else dict(TransactionStatus.CHOICES)[TransactionStatus.FAILED]
+            )
+
             self.order.send_push_to_assigned_driver(
                 message=None,
                 push_extra={
                     "status": PushStatuses.ORDER_PAY_FAILED,
-                    "code": transaction.response_code,
-                    "description": transaction.response_description
+                    "code": getattr(transaction, 'response_code', None),
+                    "description": getattr(
+                        transaction, 'response_description', None
+                    )
                 },
             )
 
@@ -0,0 +1,168 @@
+# system
+import os
+import threading
+from collections import deque
+
+# django
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.aggregates import Max
+from django.db.utils import ProgrammingError
+
+
+ORDER_NUMBER_SEQUENCE = 'orders_order_number_seq'
+
+
+class NumberingScheme:
+    GLOBAL = 'global'
+    SHOP = 'shop'
+    CHOICES = (
+        (GLOBAL, 'One sequence of order numbers for all shops'),
+        (SHOP, 'Order numbers prefixed with the shop id, per shop sequence'),
+    )
+
+
+class OrderNumberAllocator:
+    """
+    Hands out order numbers from database sequences.
+
+    ``nextval`` never blocks concurrent transactions and never hands out the
+    same value twice, so numbers don't collide whatever the number of
+    processes. Every process reserves ``block_size`` values per round trip
+    and serves them from memory; values of a block which weren't used
+    before the process exited are lost, numbers have gaps but stay unique.
+
+    With the ``shop`` scheme an order number is
+    ``shop.id * shop_multiplier + <next value of the shop sequence>``.
+    """
+    def __init__(self, scheme=NumberingScheme.GLOBAL, block_size=1,
+                 shop_multiplier=10 ** 6):
+        self.scheme = scheme
+        self.block_size = block_size
+        self.shop_multiplier = shop_multiplier
+
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._pid = os.getpid()
+
+    def sequence_name(self, shop=None):
+        if self.scheme == NumberingScheme.SHOP:
+            return f'{ORDER_NUMBER_SEQUENCE}_shop_{shop.id}'
+        return ORDER_NUMBER_SEQUENCE
+
+    def allocate(self, shop=None):
+        """
+        :param shop: shop of the order, required by the ``shop`` scheme
+        :return: order number
+        """
+        if self.scheme == NumberingScheme.SHOP and shop is None:
+            raise ValueError('Shop is required by the shop numbering scheme')
+
+        name = self.sequence_name(shop)
+        with self._lock:
+            # blocks reserved by the parent must not be reused after fork
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._blocks = {}
+
+            block = self._blocks.get(name)
+            if not block:
+                block = self._blocks[name] = deque(self._reserve(name, shop))
+            number = block.popleft()
+
+        if self.scheme == NumberingScheme.SHOP:
+            return shop.id * self.shop_multiplier + number
+        return number
+
+    def advance(self, order_number, shop=None):
+        """
+        Move the sequence past an order number which was given explicitly,
+        so the allocator doesn't hand it out later. Values this process
+        has already reserved up to that number are dropped; blocks of the
+        other processes are not, keep ``block_size`` at 1 if order numbers
+        are often given explicitly.
+        :param order_number: order number given explicitly
+        :param shop: shop of the order
+        """
+        value = order_number
+        if self.scheme == NumberingScheme.SHOP:
+            if shop is None:
+                return
+            value = order_number - shop.id * self.shop_multiplier
+            if not 0 < value < self.shop_multiplier:
+                # out of the shop range, can't collide with the sequence
+                return
+
+        name = self.sequence_name(shop)
+        with self._lock:
+            block = self._blocks.get(name)
+            if block:
+                self._blocks[name] = deque(
+                    number for number in block if number > value
+                )
+
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT setval(%s, GREATEST(last_value, %s)) '
+                        'FROM {}'.format(connection.ops.quote_name(name)),
+                        [name, value]
+                    )
+        except ProgrammingError:
+            # a per shop sequence which doesn't exist yet starts after
+            # the numbers the shop already has when it's created
+            if self.scheme != NumberingScheme.SHOP:
+                raise
+
+    def _reserve(self, name, shop=None):
+        try:
+            with transaction.atomic():
+                return self._nextval(name)
+        except ProgrammingError:
+            # per shop sequences are created on the first order of the shop
+            if self.scheme != NumberingScheme.SHOP:
+                raise
+
+        self._create_shop_sequence(name, shop)
+        return self._nextval(name)
+
+    def _nextval(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(%s) FROM generate_series(1, %s)',
+                [name, self.block_size]
+            )
+            return sorted(row[0] for row in cursor.fetchall())
+
+    def _create_shop_sequence(self, name, shop):
+        from apps.management.orders.models import Order
+
+        # continue after the numbers the shop already has in its range
+        lower = shop.id * self.shop_multiplier
+        last_number = Order.objects.filter(
+            order_number__gt=lower,
+            order_number__lt=lower + self.shop_multiplier
+        ).aggregate(Max('order_number'))['order_number__max']
+        start = last_number - lower + 1 if last_number else 1
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE SEQUENCE IF NOT EXISTS {} START WITH {:d} '
+                'MAXVALUE {:d}'.format(
+                    connection.ops.quote_name(name), start,
+                    self.shop_multiplier - 1
+                )
+            )
+
+
+def get_allocator():
+    options = getattr(settings, 'ORDER_NUMBERING', {})
+    return OrderNumberAllocator(
+        scheme=options.get('SCHEME', NumberingScheme.GLOBAL),
+        block_size=options.get('BLOCK_SIZE', 1),
+        shop_multiplier=options.get('SHOP_MULTIPLIER', 10 ** 6),
+    )
+
+
+order_numbers = get_allocator()
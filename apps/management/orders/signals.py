@@ -0,0 +1,89 @@
+# django
+from django.db import transaction
+from django.db.models.query_utils import Q
+
+# ofinta
+from apps.management.orders.models import Order, OrderAssignments
+
+
+def sync_current_assignment(orders, assignment, values):
+    """
+    Write the denormalized current assignment to the orders queryset and
+    to the order instance loaded together with the assignment, if any
+    """
+    updated = orders.update(**values)
+    if updated and OrderAssignments.order.is_cached(assignment):
+        for field, value in values.items():
+            setattr(assignment.order, field, value)
+
+
+def update_current_assignment(sender, instance=None, created=False, **kwargs):
+    """
+    Keep Order.current_* fields in sync on OrderAssignments save
+    """
+    if created:
+        # the newest assignment becomes the current one
+        orders = Order.objects.filter(
+            Q(current_assignment__isnull=True) |
+            Q(current_assignment__lt=instance.pk),
+            pk=instance.order_id
+        )
+    else:
+        orders = Order.objects.filter(
+            pk=instance.order_id,
+            current_assignment=instance.pk
+        )
+
+    sync_current_assignment(orders, instance, {
+        'current_assignment_id': instance.pk,
+        'current_driver_id': instance.driver_id,
+        'current_assignment_status': instance.status,
+    })
+
+
+def reset_current_assignment(sender, instance=None, **kwargs):
+    """
+    Point Order.current_* fields to the latest remaining assignment
+    on OrderAssignments delete
+    """
+    with transaction.atomic():
+        latest = OrderAssignments.objects.filter(
+            order_id=instance.order_id
+        ).order_by('-pk').values('pk', 'driver_id', 'status').first() or {}
+
+        orders = Order.objects.filter(pk=instance.order_id)
+        sync_current_assignment(orders, instance, {
+            'current_assignment_id': latest.get('pk'),
+            'current_driver_id': latest.get('driver_id'),
+            'current_assignment_status': latest.get('status'),
+        })
+
+
+def update_total_amount(sender, instance=None, **kwargs):
+    """
+    Recalculate Order.total_amount on Position save/delete
+    """
+    Order.objects.filter(pk=instance.order_id).update_totals()
+
+
+def new_location_version(sender, instance=None, created=False, **kwargs):
+    """
+    New version of the orders rendering the location on its change, as
+    their shipping address or the location of their warehouse
+    """
+    if created:
+        return
+
+    Order.objects.filter(
+        Q(shipping_address=instance.pk) | Q(warehouse__location=instance.pk)
+    ).new_version()
+
+
+def new_warehouse_version(sender, instance=None, created=False, **kwargs):
+    """
+    New version of the orders of the warehouse on its change
+    """
+    if created:
+        return
+
+    Order.objects.filter(warehouse=instance.pk).new_version()
@@ -0,0 +1,68 @@
+# django
+from django.conf import settings
+from django.core.cache import cache
+
+
+def get_snapshot_key(order_id, version):
+    return f'order-snapshot:{order_id}:{version}'
+
+
+def get_order_snapshots(versions, queryset=None):
+    """
+    Serialized orders, as the API renders them, cached by order id and
+    version. The version is incremented by Order.save, by the position
+    totals and by the changes of the shipping address, the warehouse and
+    its location (orders signals). Writes bypassing these, e.g. a
+    queryset update of a location, leave the snapshot stale until
+    ORDER_SNAPSHOTS['TIMEOUT'].
+    :param versions: {order id: version}
+    :param queryset: Order queryset the missing snapshots are loaded from
+    :return: {order id: serialized order}
+    """
+    from apps.api.v1.serializers import OrderSerializer
+    from apps.management.orders.models import Order
+
+    keys = {
+        order_id: get_snapshot_key(order_id, version)
+        for order_id, version in versions.items()
+    }
+    cached = cache.get_many(keys.values())
+    snapshots = {
+        order_id: cached[key] for order_id, key in keys.items()
+        if key in cached
+    }
+
+    missing = [order_id for order_id in keys if order_id not in snapshots]
+    if not missing:
+        return snapshots
+
+    if queryset is None:
+        queryset = Order.objects.all()
+    orders = queryset.filter(pk__in=missing).for_serialization()
+    serializer = OrderSerializer()
+    rendered = {}
+    for order in orders:
+        snapshots[order.pk] = serializer.to_representation(order)
+        rendered[get_snapshot_key(order.pk, order.version)] = \
+            snapshots[order.pk]
+    cache.set_many(rendered, timeout=settings.ORDER_SNAPSHOTS['TIMEOUT'])
+    return snapshots
+
+
+def filter_snapshot(snapshot, fields=None, omit=None):
+    """
+    Apply the ``?fields=`` and ``?omit=`` query parameters to a snapshot,
+    as DynamicFieldsMixin does for a rendered order
+    :param fields: comma separated names of the fields to keep
+    :param omit: comma separated names of the fields to drop
+    :return: serialized order
+    """
+    if fields is None:
+        allowed = set(snapshot)
+    else:
+        allowed = set(filter(None, fields.split(',')))
+    omitted = set(filter(None, (omit or '').split(',')))
+    return {
+        name: value for name, value in snapshot.items()
+        if name in allowed and name not in omitted
+    }
@@ -32,7 +32,9 @@ class OrdersList(ManagerTestMixin, OrdersMixin, ListView):
     def get_queryset(self):
         user = self.request.user
         shop = user.shop
-        return shop.get_orders().get_open()
+        return shop.get_orders().get_open().select_related(
+            'shipping_address'
+        ).with_totals()
 
     def filter_queryset(self, queryset):
         search_form = OrderSearchForm(self.request.GET)
@@ -86,7 +88,7 @@ class OrdersHistory(ManagerTestMixin, OrdersMixin, ListView):
     def get_queryset(self):
         user = self.request.user
         shop = user.shop
-        return shop.get_orders().get_recent()
+        return shop.get_orders().get_recent().with_totals()
 
 
 class OrderDetails(ManagerTestMixin, OrdersMixin, DetailView):
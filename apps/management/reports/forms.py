@@ -6,8 +6,14 @@ class ReportsFilterForm(forms.Form):
 
     start_date = forms.DateField(label='Date range start', required=False)
     end_date = forms.DateField(label='Date range end', required=False)
+    min_amount = forms.DecimalField(
+        label='Minimal amount', required=False, min_value=0
+    )
+    max_amount = forms.DecimalField(
+        label='Maximal amount', required=False, min_value=0
+    )
 
     class Meta:
         fields = (
-            'start_date', 'end_date'
+            'start_date', 'end_date', 'min_amount', 'max_amount'
         )
@@ -1,4 +1,5 @@
 # django
+from django.db.models.aggregates import Sum
 from django.views.generic import ListView
 
 # ofinta
@@ -25,12 +26,20 @@ class Reports(ManagerTestMixin, OrdersMixin, ListView):
             cd = search_form.cleaned_data
             start_date = cd['start_date']
             end_date = cd['end_date']
+            min_amount = cd['min_amount']
+            max_amount = cd['max_amount']
             if start_date:
                 queryset = queryset.filter(created_at__gte=start_date)
 
             if end_date:
                 queryset = queryset.filter(created_at__lte=end_date)
 
+            if min_amount is not None:
+                queryset = queryset.filter(total_amount__gte=min_amount)
+
+            if max_amount is not None:
+                queryset = queryset.filter(total_amount__lte=max_amount)
+
         return queryset
 
     def get_context_data(self, **kwargs):
@@ -38,6 +47,9 @@ class Reports(ManagerTestMixin, OrdersMixin, ListView):
         orders = context['orders']
         orders = self.filter_queryset(orders)
         context['orders'] = orders
+        context['total_amount'] = orders.aggregate(
+            total=Sum('total_amount')
+        )['total'] or 0
 
         form = ReportsFilterForm(self.request.GET or None)
         form.is_valid()
@@ -1,7 +1,5 @@
 # ofinta
-from django.db.models.aggregates import Max
-
-from apps.management.orders.models import Order
+from apps.management.orders.numbering import order_numbers
 
 
 def generate_code(sender, instance=None, **kwargs):
@@ -14,10 +12,10 @@ def generate_code(sender, instance=None, **kwargs):
 
 def generate_order_number(sender, instance=None, **kwargs):
     """
-    Generate warehouse code on create
+    Allocate order number on create if it was not given, otherwise move
+    the sequence past the given one
     """
-    max_order_number = Order.objects.all().aggregate(
-        Max('order_number')
-    )['order_number__max']
     if not instance.order_number:
-        instance.order_number = max_order_number + 1
+        instance.order_number = order_numbers.allocate(instance.shop)
+    elif instance._state.adding:
+        order_numbers.advance(instance.order_number, instance.shop)
@@ -1,6 +1,15 @@
 from django.contrib import admin
 
-from apps.mpesa_gateway.models import MPesaTransaction
+from apps.mpesa_gateway.models import MPesaTransaction, \
+    MPesaTransactionPayload
 
 
-admin.site.register(MPesaTransaction)
+class MPesaTransactionPayloadInline(admin.StackedInline):
+    model = MPesaTransactionPayload
+    readonly_fields = ('response_data', 'callback_data')
+    can_delete = False
+
+
+@admin.register(MPesaTransaction)
+class MPesaTransactionAdmin(admin.ModelAdmin):
+    inlines = (MPesaTransactionPayloadInline, )
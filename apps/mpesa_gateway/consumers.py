@@ -0,0 +1,41 @@
+# third party
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+# ofinta
+from apps.mpesa_gateway.utils import get_transaction_status, \
+    transaction_status_group
+
+
+class TransactionStatusConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Sends {"status": <verbose status>} of the order payment transaction:
+    the current one on connect and then every change reported by
+    notify_transaction_status
+    """
+
+    async def connect(self):
+        self.order_id = self.scope['url_route']['kwargs']['order_id']
+        self.group_name = transaction_status_group(self.order_id)
+
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+        await self.accept()
+
+        # the status might have changed before we joined the group
+        status = await database_sync_to_async(get_transaction_status)(
+            self.order_id
+        )
+        if status:
+            await self.send_json({'status': status})
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(
+            self.group_name,
+            self.channel_name
+        )
+
+    async def transaction_status(self, event):
+        await self.send_json({'status': event['status']})
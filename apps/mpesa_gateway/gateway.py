@@ -3,15 +3,20 @@ import json
 import logging
 import base64
 import requests
-from requests.auth import HTTPBasicAuth
 
 # django
 from django.conf import settings
 from django.utils import timezone
 
+# third party
+import httpx
+from asgiref.sync import sync_to_async
+
 # ofinta
+from apps.core.http import http_client, async_http_client, CircuitOpenError
 from apps.mpesa_gateway.models import ResponseCode, MPesaTransaction, \
     TransactionType, TransactionStatus
+from apps.mpesa_gateway.tokens import get_access_tokens
 from apps.mpesa_gateway.utils import process_success_webhook
 
 logger = logging.getLogger(__name__)
@@ -20,39 +25,29 @@ logger = logging.getLogger(__name__)
 class MPesaGateway:
     content_type = 'application/json'
 
-    def get_access_token(self):
-        access_token_url = '{}?grant_type=client_credentials'.format(
-            settings.MPESA_OAUTH2TOKEN_URL
+    def __init__(self, options=None):
+        """
+        :param options: MPesa settings overriding the project ones, e.g.
+            the urls of a Daraja simulator and MPESA_TEST_MODE
+        """
+        self.options = options or {}
+        self.access_tokens = get_access_tokens(
+            self.options.get('MPESA_OAUTH2TOKEN_URL')
         )
-        ck = settings.MPESA_CONSUMER_KEY
-        cs = settings.MPESA_CONSUMER_SECRET
 
-        if settings.MPESA_TEST_MODE:
+    def get_setting(self, name):
+        return self.options.get(name, getattr(settings, name))
+
+    def get_access_token(self):
+        if self.get_setting('MPESA_TEST_MODE'):
             return {'access_token': 'token'}
 
-        response = requests.get(
-            access_token_url, auth=HTTPBasicAuth(ck, cs), verify=False
-        )
-        return response.json()
+        return {'access_token': self.access_tokens.get()}
 
-    def payment(self, payment, amount, phone_number, description=''):
+    def get_payment_data(self, amount, phone_number, description=''):
         """
-        :param payment: Payment instance
-        :param amount: amount of the payment
-        :param phone_number: buyer phone number
-        :param description: payment description
-        :return: make a payment
+        :return: STK push request body
         """
-        api_url = settings.MPESA_STK_PUSH_URL
-
-        # generate headers
-        access_token = self.get_access_token().get('access_token')
-        if not access_token:
-            print('Failed to get access token')
-            return {'success': False}
-
-        headers = {"Authorization": "Bearer {}".format(access_token)}
-
         # generate password
         now = timezone.now()
         timestamp = now.strftime('%Y%m%d%H%M%S')
@@ -65,7 +60,7 @@ class MPesaGateway:
             bytes(password_decoded, 'utf-8')
         ).decode('ascii')
 
-        payment_data = {
+        return {
             "BusinessShortCode": settings.MPESA_BUSINESS_SHORT_CODE,
             "Password": password_encoded,
             "Timestamp": timestamp,
@@ -74,26 +69,73 @@ class MPesaGateway:
             "PartyA": phone_number,
             "PartyB": settings.MPESA_BUSINESS_SHORT_CODE,
             "PhoneNumber": phone_number,
-            "CallBackURL": settings.MPESA_RESULT_URL,
+            "CallBackURL": self.get_setting('MPESA_RESULT_URL'),
             "AccountReference": settings.MPESA_ACCOUNT_REFERENCE,
             "TransactionDesc": description
         }
 
-        if settings.MPESA_TEST_MODE:
-            response_text = json.dumps(settings.MPESA_TEST_RESPONSE_200_JSON)
-            response_status_code = settings.MPESA_TEST_RESPONSE_STATUS_CODE
-            if response_status_code == 200:
-                response_json = settings.MPESA_TEST_RESPONSE_200_JSON
-            elif response_status_code == 400:
-                response_json = settings.MPESA_TEST_RESPONSE_400_JSON
+    def get_test_response(self):
+        """
+        :return: (status code, text, json) of the STK push in test mode
+        """
+        response_text = json.dumps(settings.MPESA_TEST_RESPONSE_200_JSON)
+        response_status_code = settings.MPESA_TEST_RESPONSE_STATUS_CODE
+        response_json = {}
+        if response_status_code == 200:
+            response_json = settings.MPESA_TEST_RESPONSE_200_JSON
+        elif response_status_code == 400:
+            response_json = settings.MPESA_TEST_RESPONSE_400_JSON
+        return response_status_code, response_text, response_json
+
+    def payment(self, payment, amount, phone_number, description=''):
+        """
+        :param payment: Payment instance
+        :param amount: amount of the payment
+        :param phone_number: buyer phone number
+        :param description: payment description
+        :return: make a payment
+        """
+        api_url = self.get_setting('MPESA_STK_PUSH_URL')
+
+        # generate headers
+        access_token = self.get_access_token().get('access_token')
+        if not access_token:
+            print('Failed to get access token')
+            return {'success': False}
+
+        headers = {"Authorization": "Bearer {}".format(access_token)}
+        payment_data = self.get_payment_data(amount, phone_number, description)
+
+        if self.get_setting('MPESA_TEST_MODE'):
+            response_status_code, response_text, response_json = \
+                self.get_test_response()
         else:
-            response = requests.post(
-                api_url, json=payment_data, headers=headers, verify=False
-            )
-            response_text = response.text
-            response_status_code = response.status_code
-            response_json = response.json()
+            try:
+                response = http_client.post(
+                    'mpesa-stk-push', api_url,
+                    json=payment_data, headers=headers, verify=False
+                )
+                response_text = response.text
+                response_status_code = response.status_code
+                if response_status_code == 401:
+                    self.access_tokens.invalidate()
+                response_json = response.json()
+            except (requests.RequestException, ValueError) as e:
+                response_text = str(e)
+                response_status_code = None
+                response_json = {}
+
+        return self.save_payment(
+            payment, amount, phone_number, description,
+            response_status_code, response_text, response_json
+        )
 
+    def save_payment(self, payment, amount, phone_number, description,
+                     response_status_code, response_text, response_json):
+        """
+        Store the transaction of the STK push and its outcome
+        :return: {'transaction': MPesaTransaction, 'success': bool}
+        """
         txn = MPesaTransaction.objects.create(
             status=TransactionStatus.NEW,
             transaction_type=TransactionType.PAYMENT,
@@ -120,7 +162,7 @@ class MPesaGateway:
             txn.save()
 
             if response_code == ResponseCode.SUCCESS:
-                if settings.MPESA_TEST_MODE:
+                if self.get_setting('MPESA_TEST_MODE'):
                     process_success_webhook({})
 
                 return {'transaction': txn, 'success': True}
@@ -144,23 +186,12 @@ class MPesaGateway:
 
         return {'transaction': txn, 'success': False}
 
-    def refund(self, transaction):
+    def get_refund_data(self, transaction):
         """
-        :param transaction: MPesaTransaction instance
-        :return: Send money back to the buyer
+        :return: transaction reversal request body
         """
-        api_url = settings.MPESA_STK_REVERSAL_URL
-
-        # generate headers
-        access_token = self.get_access_token().get('access_token')
-        if not access_token:
-            print('Failed to get access token')
-            return
-
-        headers = {"Authorization": "Bearer %s" % access_token}
-
         description = 'Refund'
-        refund_data = {
+        return {
             "Initiator": transaction.party_b,
             "SecurityCredential": settings.MPESA_SECURITY_CREDENTIAL,
             "CommandID": "TransactionReversal",
@@ -168,40 +199,182 @@ class MPesaGateway:
             "Amount": str(int(transaction.amount)),
             "ReceiverParty": transaction.party_a,
             "RecieverIdentifierType": "4",
-            "ResultURL": settings.MPESA_RESULT_URL,
-            "QueueTimeOutURL": settings.MPESA_TIMEOUT_URL,
+            "ResultURL": self.get_setting('MPESA_RESULT_URL'),
+            "QueueTimeOutURL": self.get_setting('MPESA_TIMEOUT_URL'),
             "Remarks": description,
             "Occasion": ""
         }
-        response = requests.post(
-            api_url, json=refund_data, headers=headers, verify=False
-        )
-        if response.status_code == 200:
-            response_json = response.json()
-            response_code = response_json['ResponseCode']
-            if response_code not in dict(ResponseCode.CHOICES).keys():
-                response_code = '999'
 
-            MPesaTransaction.objects.create(
-                response_code=response_code,
-                transaction_type=TransactionType.REVERSAL,
-                amount=transaction.amount,
-                party_a=settings.MPESA_BUSINESS_SHORT_CODE,
-                party_b=transaction.phone_number,
-                phone_number=transaction.phone_number,
-                description='Refund of transaction {}'.format(transaction.id),
-                response_description=response_json['ResponseDescription'],
-            )
+    def refund(self, transaction):
+        """
+        :param transaction: MPesaTransaction instance
+        :return: Send money back to the buyer
+        """
+        # generate headers
+        access_token = self.get_access_token().get('access_token')
+        if not access_token:
+            print('Failed to get access token')
+            return
 
-            if response_code == ResponseCode.SUCCESS:
-                return {'success': True}
+        try:
+            response = self.request_refund(transaction, access_token)
+        except requests.RequestException as e:
+            logger.warning('Failed to make a refund: {}'.format(e))
+            return {'success': False}
 
-        else:
+        return self.save_refund(transaction, response)
+
+    def request_refund(self, transaction, access_token):
+        """
+        Send the reversal request, doesn't touch the database
+        :return: requests.Response
+        :raise: requests.RequestException
+        """
+        headers = {"Authorization": "Bearer %s" % access_token}
+        return http_client.post(
+            'mpesa-reversal', self.get_setting('MPESA_STK_REVERSAL_URL'),
+            json=self.get_refund_data(transaction),
+            headers=headers, verify=False
+        )
+
+    def get_reversal(self, transaction, response):
+        """
+        :param transaction: refunded MPesaTransaction instance
+        :param response: response of the reversal request, requests or
+            httpx one
+        :return: unsaved reversal MPesaTransaction, None if the request
+            was rejected
+        """
+        if response.status_code != 200:
+            if response.status_code == 401:
+                self.access_tokens.invalidate()
             logger.warning(
-                'Failed to make a payment. '
+                'Failed to make a refund. '
                 'Status code: {}. Response: {}.'.format(
                     response.status_code, response.text
                 )
             )
+            return
+
+        response_json = response.json()
+        response_code = response_json['ResponseCode']
+        if response_code not in dict(ResponseCode.CHOICES).keys():
+            response_code = '999'
+
+        reversal = self.new_reversal(transaction)
+        reversal.response_code = response_code
+        reversal.response_description = response_json['ResponseDescription']
+        reversal.response_data = response.text
+        return reversal
+
+    def new_reversal(self, transaction):
+        """
+        :param transaction: refunded MPesaTransaction instance
+        :return: unsaved reversal MPesaTransaction without a response
+        """
+        return MPesaTransaction(
+            transaction_type=TransactionType.REVERSAL,
+            amount=transaction.amount,
+            party_a=settings.MPESA_BUSINESS_SHORT_CODE,
+            party_b=transaction.phone_number,
+            phone_number=transaction.phone_number,
+            description='Refund of transaction {}'.format(transaction.id),
+            parent=transaction,
+        )
+
+    def save_refund(self, transaction, response):
+        """
+        :param transaction: refunded MPesaTransaction instance
+        :param response: response of the reversal request, requests or
+            httpx one
+        :return: {'success': bool}
+        """
+        reversal = self.get_reversal(transaction, response)
+        if reversal is None:
+            return {'success': False}
+
+        reversal.save()
+        return {'success': reversal.response_code == ResponseCode.SUCCESS}
+
+
+class AsyncMPesaGateway(MPesaGateway):
+    """
+    MPesaGateway for asyncio code (consumers, async views): the same
+    methods are coroutines. The API calls go through the pooled httpx
+    client, so many pushes can wait for Daraja at once without holding a
+    thread each; only the database writes run in the sync thread.
+    """
+
+    async def get_access_token(self):
+        if self.get_setting('MPESA_TEST_MODE'):
+            return {'access_token': 'token'}
+
+        return {'access_token': await self.access_tokens.aget()}
+
+    async def payment(self, payment, amount, phone_number, description=''):
+        """
+        :param payment: Payment instance
+        :param amount: amount of the payment
+        :param phone_number: buyer phone number
+        :param description: payment description
+        :return: make a payment
+        """
+        api_url = self.get_setting('MPESA_STK_PUSH_URL')
+
+        access_token = (await self.get_access_token()).get('access_token')
+        if not access_token:
+            logger.warning('Failed to get access token')
+            return {'success': False}
+
+        headers = {"Authorization": "Bearer {}".format(access_token)}
+        payment_data = self.get_payment_data(amount, phone_number, description)
+
+        if self.get_setting('MPESA_TEST_MODE'):
+            response_status_code, response_text, response_json = \
+                self.get_test_response()
+        else:
+            try:
+                response = await async_http_client.post(
+                    'mpesa-stk-push', api_url,
+                    json=payment_data, headers=headers, verify=False
+                )
+                response_text = response.text
+                response_status_code = response.status_code
+                if response_status_code == 401:
+                    await self.access_tokens.ainvalidate()
+                response_json = response.json()
+            except (httpx.HTTPError, CircuitOpenError, ValueError) as e:
+                response_text = str(e)
+                response_status_code = None
+                response_json = {}
+
+        return await sync_to_async(self.save_payment)(
+            payment, amount, phone_number, description,
+            response_status_code, response_text, response_json
+        )
+
+    async def refund(self, transaction):
+        """
+        :param transaction: MPesaTransaction instance
+        :return: Send money back to the buyer
+        """
+        api_url = self.get_setting('MPESA_STK_REVERSAL_URL')
+
+        access_token = (await self.get_access_token()).get('access_token')
+        if not access_token:
+            logger.warning('Failed to get access token')
+            return
+
+        headers = {"Authorization": "Bearer %s" % access_token}
+
+        try:
+            response = await async_http_client.post(
+                'mpesa-reversal', api_url,
+                json=self.get_refund_data(transaction),
+                headers=headers, verify=False
+            )
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            logger.warning('Failed to make a refund: {}'.format(e))
+            return {'success': False}
 
-        return {'success': False}
+        return await sync_to_async(self.save_refund)(transaction, response)
@@ -0,0 +1,61 @@
+# django
+from django.conf import settings
+
+# ofinta
+from apps.core.jobs import job
+from apps.management.orders.constants import PushStatuses
+
+
+@job('mpesa.payment_succeeded')
+def payment_succeeded(order_id, paid_to_driver):
+    """
+    Notify the driver about the payment he ran, otherwise send the
+    verification code generated by the callback to the buyer
+    """
+    from apps.management.orders.models import Order
+
+    order = Order.objects.get(pk=order_id)
+    if paid_to_driver:
+        order.send_push_to_assigned_driver(
+            message=None,
+            push_extra={"status": PushStatuses.ORDER_PAY_SUCCEED}
+        )
+        return
+
+    if not settings.MPESA_TEST_MODE:
+        order.send_verification_code_by_email()
+        order.send_verification_code_by_sms()
+
+
+@job('mpesa.payment_failed')
+def payment_failed(order_id, code, description):
+    from apps.management.orders.models import Order
+
+    order = Order.objects.get(pk=order_id)
+    order.send_push_to_assigned_driver(
+        message=None,
+        push_extra={
+            "status": PushStatuses.ORDER_PAY_FAILED,
+            "code": code,
+            "description": description
+        },
+    )
+
+
+@job('mpesa.payments_expired')
+def payments_expired(order_ids):
+    from apps.management.orders.models import Order
+
+    orders = Order.objects.filter(pk__in=order_ids).for_serialization(
+    ).select_related(
+        'driver__driver_profile', 'current_driver__driver_profile'
+    )
+    for order in orders:
+        order.send_push_to_assigned_driver(
+            message=None,
+            push_extra={
+                "status": PushStatuses.ORDER_PAY_FAILED,
+                "code": None,
+                "description": 'Transaction expired'
+            },
+        )
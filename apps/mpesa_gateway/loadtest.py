@@ -0,0 +1,305 @@
+# system
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# django
+from django.db import close_old_connections, connection, transaction
+from django.db.models.query_utils import Q
+
+# ofinta
+from apps.core.jobs import run_pending
+from apps.core.models import Job
+from apps.management.orders.constants import PaymentMethod
+from apps.management.orders.jobs import submit_payment
+from apps.management.orders.models import Order, Payment
+from apps.mpesa_gateway.models import MPesaTransaction, TransactionStatus
+from apps.mpesa_gateway.utils import process_success_webhook
+from apps.shared.models import Location
+
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, p):
+    """
+    Nearest rank percentile
+    :param values: sorted values
+    :param p: percentile, 0-100
+    """
+    if not values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(values)))
+    return values[rank - 1]
+
+
+def deliver_in_process(url, payload):
+    """
+    Simulator delivery which processes the callback in the current process
+    instead of posting it to /mpesa-result/
+    """
+    try:
+        process_success_webhook(payload)
+    finally:
+        connection.close()
+
+
+class LoadTestReport:
+    """
+    Outcomes and latencies (seconds) of the load test orders
+    """
+    STAGES = ('order', 'stk_push', 'callback', 'end_to_end')
+
+    def __init__(self):
+        self.latencies = {stage: [] for stage in self.STAGES}
+        self.statuses = {}
+        self.timeouts = 0
+        self.errors = 0
+        self.elapsed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        return sum(self.statuses.values()) + self.timeouts + self.errors
+
+    @property
+    def completed(self):
+        return sum(self.statuses.values())
+
+    @property
+    def throughput(self):
+        return self.completed / self.elapsed if self.elapsed else 0
+
+    def add(self, status=None, timed_out=False, error=False, **latencies):
+        with self._lock:
+            if error:
+                self.errors += 1
+            elif timed_out:
+                self.timeouts += 1
+            else:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+            for stage, latency in latencies.items():
+                self.latencies[stage].append(latency)
+
+    def summary(self):
+        latencies = {}
+        for stage, values in self.latencies.items():
+            values = sorted(values)
+            latencies[stage] = {
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+            }
+        return {
+            'orders': self.count,
+            'completed': self.completed,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'statuses': {
+                dict(TransactionStatus.CHOICES)[status]: count
+                for status, count in self.statuses.items()
+            },
+            'elapsed': self.elapsed,
+            'throughput': self.throughput,
+            'latency': latencies,
+        }
+
+
+class PaymentLoadTest:
+    """
+    Drives orders through the M-Pesa payment flow against a DarajaSimulator:
+    the order and its payment are stored as OrderSerializer.create does
+    (the shipping address is not geocoded), the STK push is sent by the
+    submit_payment job taken from the queue and the order is done once the
+    callback settled its transaction. The created rows are deleted at the
+    end unless ``keep`` is set.
+
+    The jobs are run by ``job_workers`` threads of this process, with
+    ``job_workers=0`` they are left to the ``run_jobs`` workers. With
+    ``base_url`` the simulator posts the callbacks to
+    ``<base_url>/mpesa-result/`` of a running server using the same
+    database, otherwise they are processed in this process.
+    """
+    def __init__(self, shop, simulator, orders=100, concurrency=10,
+                 base_url=None, timeout=30, poll_interval=0.05,
+                 job_workers=None, keep=False):
+        self.shop = shop
+        self.simulator = simulator
+        self.orders = orders
+        self.concurrency = concurrency
+        self.base_url = base_url
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.job_workers = concurrency if job_workers is None else job_workers
+        self.keep = keep
+        self.order_ids = []
+
+    def get_mpesa_options(self):
+        """
+        :return: MPesa settings of the submit_payment jobs
+        """
+        options = dict(self.simulator.urls, MPESA_TEST_MODE=False)
+        if self.base_url:
+            options['MPESA_RESULT_URL'] = \
+                self.base_url.rstrip('/') + '/mpesa-result/'
+        return options
+
+    def run(self):
+        """
+        :return: LoadTestReport instance
+        """
+        if not self.base_url:
+            self.simulator.deliver = deliver_in_process
+
+        report = LoadTestReport()
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=self.run_jobs, args=(stop, ))
+            for _ in range(self.job_workers)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for _ in range(self.orders):
+                    executor.submit(self.run_order, report)
+            report.elapsed = time.monotonic() - started
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+            if not self.keep:
+                self.cleanup()
+        return report
+
+    def run_jobs(self, stop):
+        """
+        Job worker, like the run_jobs command limited to submit_payment
+        """
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                if not run_pending(names=[submit_payment.job_name]):
+                    stop.wait(self.poll_interval)
+        except Exception:
+            logger.exception('Load test job worker failed')
+        finally:
+            connection.close()
+
+    def cleanup(self):
+        """
+        Delete the orders of the load test with their locations, payments,
+        transactions and jobs
+        """
+        orders = Order.objects.filter(pk__in=self.order_ids)
+        payments = Payment.objects.filter(order__in=orders)
+        payment_ids = list(payments.values_list('pk', flat=True))
+        transaction_ids = list(payments.filter(
+            transaction__isnull=False
+        ).values_list('transaction', flat=True))
+        location_ids = list(orders.values_list('shipping_address', flat=True))
+        with transaction.atomic():
+            Job.objects.filter(
+                Q(payload__payment_id__in=payment_ids) |
+                Q(payload__order_id__in=self.order_ids)
+            ).delete()
+            MPesaTransaction.objects.filter(pk__in=transaction_ids).delete()
+            # cascades to the orders and their payments
+            Location.objects.filter(pk__in=location_ids).delete()
+        self.order_ids = []
+
+    def run_order(self, report):
+        close_old_connections()
+        try:
+            self._run_order(report)
+        except Exception:
+            logger.exception('Load test order failed')
+            report.add(error=True)
+        finally:
+            connection.close()
+
+    def _run_order(self, report):
+        started = time.monotonic()
+        order = Order.objects.create(
+            shop=self.shop,
+            warehouse=self.shop.warehouses.first(),
+            shipping_address=Location.objects.create(address='Load test'),
+            buyer_name='Load test',
+            buyer_phone='254708374149',
+            delivery_fee=1,
+            payment_method=PaymentMethod.MPESA,
+        )
+        self.order_ids.append(order.pk)
+        payment = Payment.objects.create(order=order)
+        order.pending_transaction = True
+        order.save(update_fields=['pending_transaction'])
+        submit_payment.delay(
+            payment_id=payment.pk, mpesa_options=self.get_mpesa_options()
+        )
+        created = time.monotonic()
+
+        latencies = {'order': created - started}
+        deadline = created + self.timeout
+        transaction_id = pushed = None
+        while True:
+            if transaction_id is None:
+                transaction_id, pending = Payment.objects.filter(
+                    pk=payment.pk
+                ).values_list(
+                    'transaction', 'order__pending_transaction'
+                ).get()
+                if transaction_id is not None:
+                    pushed = time.monotonic()
+                    latencies['stk_push'] = pushed - created
+                elif not pending:
+                    # failed without a response of the simulator
+                    report.add(status=TransactionStatus.FAILED, **latencies)
+                    return
+
+            if transaction_id is not None:
+                status, callback_processed_at = \
+                    MPesaTransaction.objects.filter(
+                        pk=transaction_id
+                    ).values_list('status', 'callback_processed_at').get()
+                now = time.monotonic()
+                if status != TransactionStatus.NEW:
+                    if callback_processed_at:
+                        latencies.update(
+                            callback=now - pushed, end_to_end=now - started
+                        )
+                    # otherwise the push itself failed
+                    report.add(status=status, **latencies)
+                    return
+
+            if time.monotonic() > deadline:
+                report.add(timed_out=True, **latencies)
+                return
+            time.sleep(self.poll_interval)
+
+
+def format_report(summary):
+    """
+    :param summary: LoadTestReport.summary()
+    :return: lines of text
+    """
+    lines = [
+        '{orders} orders: {completed} completed, {timeouts} timed out, '
+        '{errors} errors in {elapsed:.2f}s'.format(**summary),
+        'throughput: {:.2f} orders/s'.format(summary['throughput']),
+        'statuses: {}'.format(', '.join(
+            f'{status} {count}'
+            for status, count in sorted(summary['statuses'].items())
+        ) or '-'),
+        'latency, ms          p50        p95        p99',
+    ]
+    for stage, values in summary['latency'].items():
+        lines.append('{:<12}'.format(stage) + ''.join(
+            '{:>11}'.format(
+                '-' if values[p] is None else '{:.1f}'.format(values[p] * 1000)
+            )
+            for p in ('p50', 'p95', 'p99')
+        ))
+    return lines
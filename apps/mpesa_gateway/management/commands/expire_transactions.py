@@ -0,0 +1,41 @@
+# system
+import time
+
+# django
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+# ofinta
+from apps.mpesa_gateway.utils import expire_overdue_transactions
+
+
+class Command(BaseCommand):
+    help = 'Expire M-Pesa payments which got no callback in time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Expire overdue transactions and exit, e.g. from cron'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--interval', type=float, default=10,
+            help='Seconds between sweeps'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+
+            total = 0
+            while True:
+                expired = expire_overdue_transactions(options['batch_size'])
+                total += expired
+                if expired < options['batch_size']:
+                    break
+            if total:
+                self.stdout.write(f'Expired {total} transactions')
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,80 @@
+# django
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+# ofinta
+from apps.management.shops.models import Shop
+from apps.mpesa_gateway.loadtest import PaymentLoadTest, format_report
+from apps.mpesa_gateway.simulator import DarajaSimulator
+
+
+class Command(BaseCommand):
+    help = 'Load test the M-Pesa payment flow against the Daraja simulator'
+
+    def add_arguments(self, parser):
+        parser.add_argument('shop', type=int, help='Shop id of the orders')
+        parser.add_argument('--orders', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument(
+            '--base-url',
+            help='Running server which receives the callbacks, e.g. '
+                 'http://127.0.0.1:8000. By default the callbacks are '
+                 'processed by this command.'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=30,
+            help='Seconds to wait for the callback of a payment'
+        )
+        parser.add_argument(
+            '--job-workers', type=int,
+            help='Threads running the submit_payment jobs, 0 leaves them '
+                 'to the run_jobs workers. Defaults to --concurrency.'
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep the created orders, payments and transactions'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Run with DEBUG off, e.g. against a staging database'
+        )
+        parser.add_argument('--latency', type=float, default=0.2)
+        parser.add_argument('--jitter', type=float, default=0.1)
+        parser.add_argument('--error-rate', type=float, default=0)
+        parser.add_argument('--cancel-rate', type=float, default=0)
+        parser.add_argument('--callback-delay', type=float, default=1)
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError(
+                'The load test writes orders to the database, run it with '
+                'DEBUG on or pass --force'
+            )
+
+        shop = Shop.objects.filter(pk=options['shop']).first()
+        if shop is None:
+            raise CommandError(f'Shop {options["shop"]} does not exist')
+
+        simulator = DarajaSimulator(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            cancel_rate=options['cancel_rate'],
+            callback_delay=options['callback_delay'],
+        )
+        with simulator:
+            report = PaymentLoadTest(
+                shop, simulator,
+                orders=options['orders'],
+                concurrency=options['concurrency'],
+                base_url=options['base_url'],
+                timeout=options['timeout'],
+                job_workers=options['job_workers'],
+                keep=options['keep'],
+            ).run()
+
+        for line in format_report(report.summary()):
+            self.stdout.write(line)
+        self.stdout.write('simulator: ' + ', '.join(
+            f'{name} {count}' for name, count in simulator.stats.items()
+        ))
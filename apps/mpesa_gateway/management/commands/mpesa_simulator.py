@@ -0,0 +1,68 @@
+# system
+import time
+
+# django
+from django.core.management import BaseCommand
+
+# ofinta
+from apps.mpesa_gateway.simulator import DarajaSimulator
+
+
+class Command(BaseCommand):
+    help = 'Run a local Daraja API simulator'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8090)
+        parser.add_argument(
+            '--latency', type=float, default=0.2,
+            help='Seconds every API call takes'
+        )
+        parser.add_argument(
+            '--jitter', type=float, default=0.1,
+            help='Up to this many seconds are added to the latency'
+        )
+        parser.add_argument(
+            '--error-rate', type=float, default=0,
+            help='Share of API calls failing with 503'
+        )
+        parser.add_argument(
+            '--cancel-rate', type=float, default=0,
+            help='Share of payments cancelled by the buyer'
+        )
+        parser.add_argument(
+            '--callback-delay', type=float, default=2,
+            help='Seconds between the STK push and its callback'
+        )
+        parser.add_argument(
+            '--callback-url',
+            help='Send callbacks here instead of the CallBackURL of the push'
+        )
+
+    def handle(self, *args, **options):
+        simulator = DarajaSimulator(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            cancel_rate=options['cancel_rate'],
+            callback_delay=options['callback_delay'],
+            callback_url=options['callback_url'],
+        )
+        with simulator:
+            self.stdout.write(f'Daraja simulator is running on {simulator.url}')
+            self.stdout.write('Point the gateway to it with:')
+            self.stdout.write('MPESA_TEST_MODE = False')
+            for name, url in simulator.urls.items():
+                self.stdout.write(f"{name} = '{url}'")
+
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+
+        self.stdout.write(', '.join(
+            f'{name}: {count}' for name, count in simulator.stats.items()
+        ))
@@ -0,0 +1,59 @@
+# django
+from django.core.management import BaseCommand
+
+# ofinta
+from apps.management.orders.models import Order
+from apps.mpesa_gateway.refunds import refund_orders
+
+
+class Command(BaseCommand):
+    help = 'Refund M-Pesa payments of canceled orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warehouse', type=int, help='Warehouse id')
+        parser.add_argument('--shop', type=int, help='Shop id')
+        parser.add_argument(
+            '--order', type=int, action='append', dest='orders',
+            help='Order number, can be repeated'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Concurrent reversal requests'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=10,
+            help='Reversal requests per second'
+        )
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only count the refundable orders'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Order.objects.all()
+        if options['warehouse']:
+            queryset = queryset.filter(warehouse_id=options['warehouse'])
+        if options['shop']:
+            queryset = queryset.filter(shop_id=options['shop'])
+        if options['orders']:
+            queryset = queryset.filter(order_number__in=options['orders'])
+
+        report = refund_orders(
+            queryset,
+            workers=options['workers'],
+            rate=options['rate'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run']
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f'{report.selected} orders to refund')
+            return
+
+        self.stdout.write(
+            f'Refunded {report.refunded} of {report.selected} orders, '
+            f'{report.amount} in total, in {report.elapsed:.1f}s'
+        )
+        for order_number, reason in report.failures:
+            self.stderr.write(f'Order {order_number}: {reason}')
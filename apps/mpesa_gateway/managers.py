@@ -0,0 +1,20 @@
+# django
+from django.db import models
+
+
+class MPesaTransactionManager(models.Manager):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Also store the payloads set on the transactions
+        """
+        from apps.mpesa_gateway.models import MPesaTransactionPayload
+
+        objs = super().bulk_create(objs, *args, **kwargs)
+        payloads = [
+            MPesaTransactionPayload(transaction=obj, **obj.pop_payload())
+            for obj in objs if obj.has_pending_payload
+        ]
+        if payloads:
+            MPesaTransactionPayload.objects.bulk_create(payloads)
+        return objs
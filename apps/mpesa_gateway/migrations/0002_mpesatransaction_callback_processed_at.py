@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:10
+
+from django.db import migrations, models
+from django.db.models.expressions import F
+
+
+def fill_callback_processed_at(apps, schema_editor):
+    MPesaTransaction = apps.get_model('mpesa_gateway', 'MPesaTransaction')
+    MPesaTransaction.objects.exclude(callback_data='').update(
+        callback_processed_at=F('created_at')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mpesa_gateway', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mpesatransaction',
+            name='callback_processed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='callback processed at'),
+        ),
+        migrations.RunPython(
+            fill_callback_processed_at, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='mpesatransaction',
+            index=models.Index(fields=['checkout_request_id', 'merchant_request_id'], name='mpesa_txn_request_ids_idx'),
+        ),
+    ]
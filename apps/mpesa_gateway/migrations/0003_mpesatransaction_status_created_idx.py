@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mpesa_gateway', '0002_mpesatransaction_callback_processed_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mpesatransaction',
+            index=models.Index(fields=['status', 'created_at'], name='mpesa_txn_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:10
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_parent(apps, schema_editor):
+    # reversals were only linked by their "Refund of transaction <id>"
+    # description, parsed here rather than cast in SQL where the cast
+    # could be evaluated before the regex filter
+    MPesaTransaction = apps.get_model('mpesa_gateway', 'MPesaTransaction')
+    pattern = re.compile(r'^Refund of transaction (\d+)$')
+    parents = {}
+    reversals = MPesaTransaction.objects.filter(
+        transaction_type=1,  # TransactionType.REVERSAL
+        description__startswith='Refund of transaction '
+    ).values_list('pk', 'description')
+    for pk, description in reversals.iterator():
+        match = pattern.match(description)
+        if match:
+            parents[pk] = int(match.group(1))
+
+    existing = set()
+    parent_pks = list(set(parents.values()))
+    for i in range(0, len(parent_pks), 1000):
+        existing.update(MPesaTransaction.objects.filter(
+            pk__in=parent_pks[i:i + 1000]
+        ).values_list('pk', flat=True))
+
+    MPesaTransaction.objects.bulk_update(
+        [
+            MPesaTransaction(pk=pk, parent_id=parent_pk)
+            for pk, parent_pk in parents.items()
+            if parent_pk in existing
+        ],
+        ['parent'],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mpesa_gateway', '0003_mpesatransaction_status_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mpesatransaction',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reversals', to='mpesa_gateway.mpesatransaction', verbose_name='refunded transaction'),
+        ),
+        migrations.RunPython(fill_parent, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:00
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+from django.db.models.expressions import OuterRef, Subquery
+
+
+BATCH_SIZE = 1000
+
+
+def copy_payloads(apps, schema_editor):
+    # every batch is committed on its own, the transactions table is not
+    # locked for the whole copy
+    MPesaTransaction = apps.get_model('mpesa_gateway', 'MPesaTransaction')
+    MPesaTransactionPayload = apps.get_model(
+        'mpesa_gateway', 'MPesaTransactionPayload'
+    )
+    last_pk = 0
+    while True:
+        rows = list(
+            MPesaTransaction.objects.filter(
+                pk__gt=last_pk
+            ).order_by('pk').values_list(
+                'pk', 'response_data', 'callback_data'
+            )[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+
+        with transaction.atomic():
+            MPesaTransactionPayload.objects.bulk_create(
+                [
+                    MPesaTransactionPayload(
+                        transaction_id=pk,
+                        response_data=response_data,
+                        callback_data=callback_data
+                    )
+                    for pk, response_data, callback_data in rows
+                    if response_data or callback_data
+                ],
+                ignore_conflicts=True
+            )
+        last_pk = rows[-1][0]
+
+
+def restore_payloads(apps, schema_editor):
+    MPesaTransaction = apps.get_model('mpesa_gateway', 'MPesaTransaction')
+    MPesaTransactionPayload = apps.get_model(
+        'mpesa_gateway', 'MPesaTransactionPayload'
+    )
+    last_pk = 0
+    while True:
+        pks = list(
+            MPesaTransactionPayload.objects.filter(
+                pk__gt=last_pk
+            ).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not pks:
+            break
+
+        payloads = MPesaTransactionPayload.objects.filter(
+            pk=OuterRef('pk')
+        )
+        with transaction.atomic():
+            MPesaTransaction.objects.filter(pk__in=pks).update(
+                response_data=Subquery(payloads.values('response_data')),
+                callback_data=Subquery(payloads.values('callback_data'))
+            )
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('mpesa_gateway', '0004_mpesatransaction_parent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MPesaTransactionPayload',
+            fields=[
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload', serialize=False, to='mpesa_gateway.mpesatransaction', verbose_name='transaction')),
+                ('response_data', models.TextField(blank=True, verbose_name='response data')),
+                ('callback_data', models.TextField(blank=True, verbose_name='callback data')),
+            ],
+        ),
+        migrations.RunPython(copy_payloads, restore_payloads),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mpesa_gateway', '0005_mpesatransactionpayload'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='mpesatransaction',
+            name='callback_data',
+        ),
+        migrations.RemoveField(
+            model_name='mpesatransaction',
+            name='response_data',
+        ),
+    ]
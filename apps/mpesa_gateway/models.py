@@ -3,6 +3,9 @@ from django.db import models
 from django.utils import timezone
 from django.conf import settings
 
+# ofinta
+from apps.mpesa_gateway.managers import MPesaTransactionManager
+
 
 class ResponseCode:
     """
@@ -159,20 +162,110 @@ class MPesaTransaction(models.Model):
         verbose_name='customer message',
         blank=True
     )
-    response_data = models.TextField(
-        verbose_name='response data',
-        blank=True
+    # reversals point to the refunded payment transaction
+    parent = models.ForeignKey(
+        'self',
+        verbose_name='refunded transaction',
+        related_name='reversals',
+        null=True, blank=True,
+        on_delete=models.SET_NULL
     )
-    callback_data = models.TextField(
-        verbose_name='callback data',
-        blank=True
+    # set once by the first processed callback, duplicates are ignored
+    callback_processed_at = models.DateTimeField(
+        verbose_name='callback processed at',
+        null=True, blank=True
     )
 
+    objects = MPesaTransactionManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['checkout_request_id', 'merchant_request_id'],
+                name='mpesa_txn_request_ids_idx'
+            ),
+            models.Index(
+                fields=['status', 'created_at'],
+                name='mpesa_txn_status_created_idx'
+            ),
+        ]
+
     def __str__(self):
         return 'Transaction from {} to {} on {}'.format(
             self.party_a, self.party_b, self.amount
         )
 
+    def __init__(self, *args, **kwargs):
+        # payloads set since the last save, the payload properties may be
+        # passed as keyword arguments so it's set before Model.__init__
+        self._pending_payload = {}
+        super().__init__(*args, **kwargs)
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        self.save_payload(created=adding)
+
+    @property
+    def response_data(self):
+        return self.get_payload_field('response_data')
+
+    @response_data.setter
+    def response_data(self, value):
+        self.set_payload_field('response_data', value)
+
+    @property
+    def callback_data(self):
+        return self.get_payload_field('callback_data')
+
+    @callback_data.setter
+    def callback_data(self, value):
+        self.set_payload_field('callback_data', value)
+
+    @property
+    def has_pending_payload(self):
+        return bool(self._pending_payload)
+
+    def get_payload_field(self, name):
+        """
+        Raw payloads are stored in MPesaTransactionPayload and loaded on
+        first access
+        """
+        if name in self._pending_payload:
+            return self._pending_payload[name]
+        try:
+            return getattr(self.payload, name)
+        except MPesaTransactionPayload.DoesNotExist:
+            return ''
+
+    def set_payload_field(self, name, value):
+        # stored by save() or save_payload()
+        self._pending_payload[name] = value
+
+    def pop_payload(self):
+        pending, self._pending_payload = self._pending_payload, {}
+        return pending
+
+    def save_payload(self, created=False):
+        """
+        Store the payloads set since the last save
+        :param created: the transaction has just been created, so it has
+            no payload row yet
+        """
+        pending = self.pop_payload()
+        if not pending:
+            return
+
+        if created:
+            payload = MPesaTransactionPayload.objects.create(
+                transaction=self, **pending
+            )
+        else:
+            payload, _ = MPesaTransactionPayload.objects.update_or_create(
+                transaction=self, defaults=pending
+            )
+        self.payload = payload
+
     def refund(self):
         """
         :return: refund payment
@@ -249,5 +342,31 @@ class MPesaTransaction(models.Model):
         ).total_seconds()
         if self.status == TransactionStatus.NEW and \
                 seconds_after_created > settings.MPESA_REQUEST_TIMEOUT:
-            self.status = TransactionStatus.FAILED
-            self.save()
\ No newline at end of file
+            # same outcome as expire_overdue_transactions
+            self.status = TransactionStatus.EXPIRED
+            self.save()
+
+
+class MPesaTransactionPayload(models.Model):
+    """
+    Raw gateway payloads of a transaction, kept out of the transaction
+    table so lookups and updates of transactions don't carry them
+    """
+    transaction = models.OneToOneField(
+        MPesaTransaction,
+        verbose_name='transaction',
+        related_name='payload',
+        primary_key=True,
+        on_delete=models.CASCADE
+    )
+    response_data = models.TextField(
+        verbose_name='response data',
+        blank=True
+    )
+    callback_data = models.TextField(
+        verbose_name='callback data',
+        blank=True
+    )
+
+    def __str__(self):
+        return 'Payload of transaction {}'.format(self.transaction_id)
@@ -0,0 +1,205 @@
+# system
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+
+# django
+from django.db.models.expressions import Exists, OuterRef
+
+# third party
+import requests
+
+# ofinta
+from apps.core.http import RateLimiter, CircuitOpenError
+from apps.management.orders.constants import OrderStatus
+from apps.mpesa_gateway.gateway import MPesaGateway
+from apps.mpesa_gateway.models import MPesaTransaction, TransactionStatus, \
+    TransactionType, ResponseCode, MPesaTransactionPayload
+
+
+logger = logging.getLogger(__name__)
+
+
+def refundable_orders(queryset=None):
+    """
+    Canceled orders paid via M-Pesa which weren't refunded yet and have
+    no reversal in flight, with their payment transactions
+    :param queryset: Order queryset to narrow the selection
+    :return: Order queryset
+    """
+    from apps.management.orders.models import Order
+
+    if queryset is None:
+        queryset = Order.objects.all()
+
+    # a reversal without a response code may have reached M-Pesa, it's
+    # not sent again until someone checks it
+    refunded = MPesaTransaction.objects.filter(
+        parent=OuterRef('payment__transaction'),
+        transaction_type=TransactionType.REVERSAL,
+        response_code__in=(ResponseCode.SUCCESS, '')
+    )
+    return queryset.filter(
+        status=OrderStatus.CANCELED,
+        payment__transaction__transaction_type=TransactionType.PAYMENT,
+        payment__transaction__status=TransactionStatus.SUCCESS
+    ).exclude(
+        Exists(refunded)
+    ).select_related('payment__transaction').order_by('pk')
+
+
+class RefundReport:
+    """
+    Outcome of a bulk refund
+    """
+    def __init__(self):
+        self.selected = 0
+        self.refunded = 0
+        self.amount = Decimal(0)
+        self.failures = []
+        self.elapsed = 0
+
+    @property
+    def failed(self):
+        return len(self.failures)
+
+    def as_dict(self):
+        return {
+            'selected': self.selected,
+            'refunded': self.refunded,
+            'failed': self.failed,
+            'amount': self.amount,
+            'failures': self.failures,
+            'elapsed': round(self.elapsed, 3),
+        }
+
+
+def refund_orders(queryset=None, workers=8, rate=10, batch_size=100,
+                  dry_run=False):
+    """
+    Reverse the M-Pesa payments of the refundable orders.
+
+    The orders are selected with one query. A reversal transaction without
+    a response code is stored for every order before any request is sent,
+    so a reversal whose outcome is unknown (e.g. the request timed out
+    after it was delivered) is never sent twice. Reversal requests are
+    sent by a pool of ``workers`` threads, at most ``rate`` requests per
+    second across the pool. Workers don't touch the database: the calling
+    thread stores the responses with ``bulk_update``, ``batch_size`` rows
+    at once. Reversals which certainly were not sent or were rejected get
+    the unknown response code and are retried by the next run.
+    :param queryset: Order queryset to narrow the selection
+    :param workers: number of concurrent requests
+    :param rate: requests per second
+    :param batch_size: reversals stored per query
+    :param dry_run: only select the orders
+    :return: RefundReport instance
+    """
+    started = time.monotonic()
+    report = RefundReport()
+    gw = MPesaGateway()
+
+    orders = list(refundable_orders(queryset))
+    report.selected = len(orders)
+    if dry_run or not orders:
+        report.elapsed = time.monotonic() - started
+        return report
+
+    access_token = gw.get_access_token().get('access_token')
+    if not access_token:
+        report.failures = [
+            (order.order_number, 'Failed to get access token')
+            for order in orders
+        ]
+        report.elapsed = time.monotonic() - started
+        return report
+
+    reversals = {
+        order.pk: reversal for order, reversal in zip(
+            orders, MPesaTransaction.objects.bulk_create(
+                [gw.new_reversal(order.payment.transaction)
+                 for order in orders],
+                batch_size=batch_size
+            )
+        )
+    }
+
+    limiter = RateLimiter(rate, burst=workers)
+
+    def request_refund(txn):
+        limiter.acquire()
+        response = gw.request_refund(txn, access_token)
+        return gw.get_reversal(txn, response)
+
+    answered = []
+
+    def store(batch):
+        MPesaTransaction.objects.bulk_update(
+            batch, ['response_code', 'response_description']
+        )
+        payloads = [
+            MPesaTransactionPayload(
+                transaction=reversal, **reversal.pop_payload()
+            )
+            for reversal in batch if reversal.has_pending_payload
+        ]
+        if payloads:
+            MPesaTransactionPayload.objects.bulk_create(payloads)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    request_refund, order.payment.transaction
+                ): order
+                for order in orders
+            }
+            for future in as_completed(futures):
+                order = futures[future]
+                reversal = reversals[order.pk]
+                try:
+                    response = future.result()
+                except (CircuitOpenError, requests.ConnectTimeout) as e:
+                    # not sent, retried by the next run
+                    reversal.response_code = ResponseCode.UNKNOWN
+                    reversal.response_description = str(e)
+                    reason = str(e)
+                except (requests.RequestException, ValueError,
+                        KeyError) as e:
+                    # may have been delivered, the response code stays
+                    # empty so the order is not selected again
+                    logger.warning(
+                        'Failed to refund order %s: %s', order.order_number, e
+                    )
+                    reversal.response_description = str(e)
+                    reason = f'Outcome unknown: {e}'
+                else:
+                    if response is None:
+                        reversal.response_code = ResponseCode.UNKNOWN
+                        reversal.response_description = \
+                            'Reversal request rejected'
+                    else:
+                        reversal.response_code = response.response_code
+                        reversal.response_description = \
+                            response.response_description
+                        reversal.response_data = response.response_data
+                    reason = reversal.response_description
+
+                answered.append(reversal)
+                if reversal.response_code == ResponseCode.SUCCESS:
+                    report.refunded += 1
+                    report.amount += reversal.amount
+                else:
+                    report.failures.append((order.order_number, reason))
+
+                if len(answered) >= batch_size:
+                    batch, answered = answered, []
+                    store(batch)
+    finally:
+        # the responses received so far are stored even if the loop fails
+        if answered:
+            store(answered)
+
+    report.elapsed = time.monotonic() - started
+    return report
@@ -0,0 +1,267 @@
+# system
+import heapq
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# third party
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+
+SUCCESS_RESULT = (0, 'The service request is processed successfully.')
+CANCEL_RESULT = (1032, '[STK_CB - ]Request cancelled by user')
+
+
+def post_callback(url, payload):
+    response = requests.post(url, json=payload, timeout=10)
+    response.raise_for_status()
+
+
+class DarajaSimulator:
+    """
+    Local stand-in for the Daraja API: answers OAuth, STK push and
+    reversal requests on the sandbox paths and sends the STK push result
+    callbacks ``callback_delay`` seconds after the push.
+
+    Every answer takes ``latency`` plus up to ``jitter`` seconds,
+    ``error_rate`` of the API calls fail with 503 and ``cancel_rate`` of the
+    payments are cancelled by the "buyer". Callbacks go to the CallBackURL
+    of the push unless ``callback_url`` is given, ``deliver(url, payload)``
+    replaces the HTTP delivery.
+
+        with DarajaSimulator(latency=0.2, callback_delay=1) as daraja:
+            settings.MPESA_STK_PUSH_URL = daraja.urls['MPESA_STK_PUSH_URL']
+    """
+    OAUTH_PATH = '/oauth/v1/generate'
+    STK_PUSH_PATH = '/mpesa/stkpush/v1/processrequest'
+    REVERSAL_PATH = '/mpesa/reversal/v1/request'
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, jitter=0,
+                 error_rate=0, cancel_rate=0, callback_delay=0,
+                 callback_url=None, deliver=post_callback,
+                 callback_workers=8, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.cancel_rate = cancel_rate
+        self.callback_delay = callback_delay
+        self.callback_url = callback_url
+        self.deliver = deliver
+
+        self.stats = {
+            'oauth': 0,
+            'stk_push': 0,
+            'reversal': 0,
+            'errors': 0,
+            'callbacks_sent': 0,
+            'callbacks_failed': 0,
+        }
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._scheduled = []
+        self._sequence = itertools.count()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=callback_workers)
+
+        self.server = ThreadingHTTPServer((host, port), self._get_handler())
+        self.server.daemon_threads = True
+        self._threads = [
+            threading.Thread(target=self.server.serve_forever, daemon=True),
+            threading.Thread(target=self._run_scheduler, daemon=True),
+        ]
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    @property
+    def urls(self):
+        """
+        :return: settings pointing the gateway to the simulator
+        """
+        return {
+            'MPESA_OAUTH2TOKEN_URL': self.url + self.OAUTH_PATH,
+            'MPESA_STK_PUSH_URL': self.url + self.STK_PUSH_PATH,
+            'MPESA_STK_REVERSAL_URL': self.url + self.REVERSAL_PATH,
+        }
+
+    @property
+    def pending_callbacks(self):
+        with self._condition:
+            return len(self._scheduled)
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self.server.shutdown()
+        self.server.server_close()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def handle(self, method, path, body):
+        """
+        :return: (status code, response json)
+        """
+        path = path.split('?')[0]
+        if path == self.OAUTH_PATH and method == 'GET':
+            name = 'oauth'
+        elif path == self.STK_PUSH_PATH and method == 'POST':
+            name = 'stk_push'
+        elif path == self.REVERSAL_PATH and method == 'POST':
+            name = 'reversal'
+        else:
+            return 404, {'errorMessage': 'Not found'}
+
+        self._count(name)
+        delay = self.latency + self._uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if self._uniform(0, 1) < self.error_rate:
+            self._count('errors')
+            return 503, {
+                'requestId': uuid.uuid4().hex,
+                'errorCode': '503.001.1001',
+                'errorMessage': 'Service is currently unavailable'
+            }
+
+        if name == 'oauth':
+            return 200, {
+                'access_token': uuid.uuid4().hex,
+                'expires_in': '3599'
+            }
+        if name == 'stk_push':
+            return 200, self.stk_push(body)
+        return 200, {
+            'ConversationID': f'AG_{uuid.uuid4().hex}',
+            'OriginatorConversationID': uuid.uuid4().hex,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Accept the service request successfully.'
+        }
+
+    def stk_push(self, body):
+        merchant_request_id = f'{next(self._sequence)}-{uuid.uuid4().hex[:8]}'
+        checkout_request_id = f'ws_CO_{uuid.uuid4().hex}'
+
+        result_code, result_desc = SUCCESS_RESULT
+        if self._uniform(0, 1) < self.cancel_rate:
+            result_code, result_desc = CANCEL_RESULT
+
+        callback = {
+            'MerchantRequestID': merchant_request_id,
+            'CheckoutRequestID': checkout_request_id,
+            'ResultCode': result_code,
+            'ResultDesc': result_desc,
+        }
+        if result_code == 0:
+            callback['CallbackMetadata'] = {'Item': [
+                {'Name': 'Amount', 'Value': body.get('Amount')},
+                {'Name': 'MpesaReceiptNumber',
+                 'Value': uuid.uuid4().hex[:10].upper()},
+                {'Name': 'PhoneNumber', 'Value': body.get('PhoneNumber')},
+            ]}
+        self._schedule(
+            time.monotonic() + self.callback_delay,
+            self.callback_url or body.get('CallBackURL'),
+            {'Body': {'stkCallback': callback}}
+        )
+
+        return {
+            'MerchantRequestID': merchant_request_id,
+            'CheckoutRequestID': checkout_request_id,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing'
+        }
+
+    def _schedule(self, due, url, payload):
+        with self._condition:
+            heapq.heappush(
+                self._scheduled, (due, next(self._sequence), url, payload)
+            )
+            self._condition.notify()
+
+    def _run_scheduler(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._scheduled:
+                        wait = self._scheduled[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self._condition.wait(wait)
+                if self._stopped:
+                    return
+                _, _, url, payload = heapq.heappop(self._scheduled)
+            self._executor.submit(self._send_callback, url, payload)
+
+    def _send_callback(self, url, payload):
+        try:
+            self.deliver(url, payload)
+        except Exception as e:
+            logger.warning('Failed to deliver callback to %s: %s', url, e)
+            self._count('callbacks_failed')
+        else:
+            self._count('callbacks_sent')
+
+    def _get_handler(self):
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or '{}')
+                except ValueError:
+                    body = {}
+
+                status, response = simulator.handle(
+                    self.command, self.path, body
+                )
+                content = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_POST = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _uniform(self, a, b):
+        with self._lock:
+            return self._random.uniform(a, b)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
@@ -0,0 +1,181 @@
+# system
+import logging
+import threading
+import time
+
+# django
+from django.conf import settings
+
+# third party
+import requests
+from asgiref.sync import sync_to_async
+from requests.auth import HTTPBasicAuth
+
+# ofinta
+from apps.core.http import http_client
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenStore:
+    """
+    Process-wide store of the MPesa OAuth access token.
+
+    The token is reused until ``refresh_margin`` seconds before it expires.
+    Only one thread refreshes it at a time: while a refresh is running other
+    threads keep using the current token if it is still valid, or wait for
+    the refresh otherwise.
+
+    ``url``, ``consumer_key`` and ``consumer_secret`` default to the MPesa
+    settings, read on every refresh.
+    """
+    def __init__(self, url=None, consumer_key=None, consumer_secret=None,
+                 refresh_margin=None, clock=time.monotonic):
+        self.url = url
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.failures = 0
+
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+        }
+
+    def get(self):
+        """
+        :return: access token or None if it could not be obtained
+        """
+        token, expires_at = self._token, self._expires_at
+        now = self.clock()
+        if self._is_fresh(token, expires_at, now):
+            self._count('hits')
+            return token
+
+        if token and now < expires_at:
+            # expires soon: refresh unless someone is already refreshing
+            if not self._lock.acquire(blocking=False):
+                self._count('hits')
+                return token
+        else:
+            self._lock.acquire()
+
+        try:
+            # refreshed while we were waiting for the lock
+            if self._is_fresh(self._token, self._expires_at, self.clock()):
+                self._count('hits')
+                return self._token
+
+            self._count('misses')
+            return self._refresh() or (token if now < expires_at else None)
+        finally:
+            self._lock.release()
+
+    async def aget(self):
+        """
+        ``get`` for asyncio code: a fresh token is returned right away,
+        a refresh runs in a worker thread not to block the event loop
+        :return: access token or None if it could not be obtained
+        """
+        token, expires_at = self._token, self._expires_at
+        if self._is_fresh(token, expires_at, self.clock()):
+            self._count('hits')
+            return token
+        return await sync_to_async(self.get, thread_sensitive=False)()
+
+    def invalidate(self):
+        """
+        Forget the token, e.g. when the API rejected it
+        """
+        with self._lock:
+            self._token = None
+            self._expires_at = 0
+
+    async def ainvalidate(self):
+        """
+        ``invalidate`` for asyncio code, it doesn't wait for a running
+        refresh: that one replaces the rejected token anyway
+        """
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._token = None
+            self._expires_at = 0
+        finally:
+            self._lock.release()
+
+    def _refresh(self):
+        self._count('refreshes')
+        started = self.clock()
+        try:
+            response = http_client.get(
+                'mpesa-oauth',
+                self._get_url(),
+                params={'grant_type': 'client_credentials'},
+                auth=HTTPBasicAuth(
+                    self.consumer_key or settings.MPESA_CONSUMER_KEY,
+                    self.consumer_secret or settings.MPESA_CONSUMER_SECRET
+                ),
+                verify=False
+            )
+            response.raise_for_status()
+            data = response.json()
+            token = data['access_token']
+            expires_in = int(data.get('expires_in', 0))
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logger.warning('Failed to get MPesa access token: %s', e)
+            self._count('failures')
+            return
+
+        self._token = token
+        self._expires_at = started + expires_in
+        return token
+
+    def _is_fresh(self, token, expires_at, now):
+        return bool(token) and now < expires_at - self._get_refresh_margin()
+
+    def _get_url(self):
+        return self.url or settings.MPESA_OAUTH2TOKEN_URL
+
+    def _get_refresh_margin(self):
+        if self.refresh_margin is not None:
+            return self.refresh_margin
+        return settings.MPESA_TOKEN_REFRESH_MARGIN
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+access_tokens = TokenStore()
+
+# stores of the OAuth urls other than the MPESA_OAUTH2TOKEN_URL setting
+url_access_tokens = {}
+
+
+def get_access_tokens(url=None):
+    """
+    :param url: OAuth url, None for the settings one
+    :return: TokenStore of the url, shared by the whole process
+    """
+    if not url:
+        return access_tokens
+    store = url_access_tokens.get(url)
+    if store is None:
+        store = url_access_tokens.setdefault(url, TokenStore(url=url))
+    return store
@@ -1,24 +1,85 @@
 # system
+import datetime
 import json
 import logging
 
 # django
 from django.conf import settings
+from django.db import transaction
+from django.db.models.expressions import F
 from django.utils import timezone
 
+# third party
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
 # ofinta
-from apps.management.orders.constants import PushStatuses, OrderStatus
-from apps.mpesa_gateway.models import MPesaTransaction
+from apps.management.orders.constants import OrderStatus
+from apps.mpesa_gateway.models import MPesaTransaction, TransactionStatus, \
+    TransactionType
 
 
 logger = logging.getLogger(__name__)
 
 
+def transaction_status_group(order_id):
+    return f'transaction_status_{order_id}'
+
+
+def get_transaction_status(order_id):
+    """
+    :param order_id: order id
+    :return: verbose status of the latest transaction of the order payment,
+        None if there is no transaction
+    """
+    row = MPesaTransaction.objects.filter(
+        payment__order_id=order_id
+    ).order_by('-pk').values_list('status', 'created_at').first()
+    if row is None:
+        return
+
+    status, created_at = row
+    # not swept yet
+    overdue = timezone.now() - datetime.timedelta(
+        seconds=settings.MPESA_REQUEST_TIMEOUT
+    )
+    if status == TransactionStatus.NEW and created_at < overdue:
+        status = TransactionStatus.EXPIRED
+    return dict(TransactionStatus.CHOICES)[status]
+
+
+def notify_transaction_status(order_id, status):
+    """
+    Send the verbose transaction status to browsers watching the order
+    (see TransactionStatusConsumer) once the current transaction commits
+    """
+    def send():
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(
+                transaction_status_group(order_id),
+                {'type': 'transaction.status', 'status': status}
+            )
+        except Exception as e:
+            logger.warning(
+                'Failed to notify about order {} transaction: {}'.format(
+                    order_id, e
+                )
+            )
+
+    transaction.on_commit(send)
+
+
 def process_success_webhook(request_json):
     """
-    Process mpesa webhook
+    Process mpesa webhook. The first callback of a transaction claims it,
+    repeated deliveries are acknowledged without processing. Notifications
+    of the buyer and the driver are sent by background jobs.
     """
     from apps.management.orders.models import Payment
+    from apps.mpesa_gateway.jobs import payment_succeeded, payment_failed
 
     response_json_body = request_json.get('Body', {})
     response_json_callback = response_json_body.get('stkCallback', {})
@@ -30,9 +91,9 @@ def process_success_webhook(request_json):
     checkout_request_id = response_json_callback.get('CheckoutRequestID', '')
 
     mpesa_transaction = MPesaTransaction.objects.filter(
-        merchant_request_id=merchant_request_id,
-        checkout_request_id=checkout_request_id
-    ).last()
+        checkout_request_id=checkout_request_id,
+        merchant_request_id=merchant_request_id
+    ).order_by('-pk').first()
 
     if not mpesa_transaction:
         logger.warning(
@@ -47,53 +108,152 @@ def process_success_webhook(request_json):
 
     result_code = response_json_callback.get('ResultCode')
     result_desc = response_json_callback.get('ResultDesc', '')
+    callback_data = json.dumps(request_json)
+    now = timezone.now()
 
-    mpesa_transaction.result_code = result_code
-    mpesa_transaction.result_desc = result_desc
-    mpesa_transaction.callback_data = json.dumps(request_json)
-    mpesa_transaction.save()
-
-    payment = Payment.objects.get(transaction=mpesa_transaction)
-    payment.processed_at = timezone.now()
-    payment.save()
-    order = payment.order
+    with transaction.atomic():
+        claimed = MPesaTransaction.objects.filter(
+            pk=mpesa_transaction.pk,
+            callback_processed_at__isnull=True
+        ).update(
+            callback_processed_at=now,
+            result_code=result_code,
+            result_desc=result_desc
+        )
+        if not claimed:
+            logger.info(
+                'Duplicate callback for checkout_request_id={}'.format(
+                    checkout_request_id
+                )
+            )
+            return {'success': True, 'duplicate': True}, 200
 
-    if not order.pending_transaction:
-        return {'success': False}, 400
+        mpesa_transaction.callback_processed_at = now
+        mpesa_transaction.result_code = result_code
+        mpesa_transaction.result_desc = result_desc
+        mpesa_transaction.callback_data = callback_data
+        mpesa_transaction.save_payload()
 
-    order.pending_transaction = False
-    order.save()
+        payment = Payment.objects.select_related('order').get(
+            transaction=mpesa_transaction
+        )
+        Payment.objects.filter(pk=payment.pk).update(processed_at=now)
+        order = payment.order
 
-    if mpesa_transaction.success:
+        if not order.pending_transaction:
+            expired = mpesa_transaction.status == TransactionStatus.EXPIRED
+            if not (expired and mpesa_transaction.success):
+                return {'success': False}, 400
 
-        mpesa_transaction.set_success(payment)
-        order.set_paid()
+            # the buyer paid after the transaction was expired, the money
+            # is taken so the payment can't be ignored
+            logger.warning(
+                'Success callback for expired transaction '
+                'checkout_request_id={} of order {}'.format(
+                    checkout_request_id, order.pk
+                )
+            )
+            if order.status == OrderStatus.CANCELED or order.is_paid:
+                # refund_orders picks up canceled orders, a second payment
+                # of a paid order has to be refunded by hand
+                mpesa_transaction.set_success(payment)
+                logger.error(
+                    'Order {} is {}, the late payment has to be '
+                    'refunded'.format(
+                        order.pk,
+                        'canceled' if order.status == OrderStatus.CANCELED
+                        else 'paid already'
+                    )
+                )
+                notify_transaction_status(
+                    order.pk, mpesa_transaction.status_verbose
+                )
+                return {'success': True}, 200
 
-        if order.payment_ran_by_driver:
+        order.pending_transaction = False
 
-            order.set_completed()
+        if mpesa_transaction.success:
+            mpesa_transaction.set_success(payment)
+            order.is_paid = True
+            paid_to_driver = order.payment_ran_by_driver
+            if paid_to_driver:
+                order.set_completed(commit=False)
+                order.save()
+                response_json = {'success': True}
+            else:
+                response_json = {
+                    'verification_code': order.generate_verification_code(
+                        commit=False
+                    )
+                }
+                order.save()
 
-            order.send_push_to_assigned_driver(
-                message=None,
-                push_extra={"status": PushStatuses.ORDER_PAY_SUCCEED}
+            payment_succeeded.delay(
+                order_id=order.pk, paid_to_driver=paid_to_driver
+            )
+            notify_transaction_status(
+                order.pk, mpesa_transaction.status_verbose
             )
-            return {'success': True}, 200
-        else:
-            # generate and send verification code
-            verification_code = order.generate_verification_code()
-            if not settings.MPESA_TEST_MODE:
-                order.send_verification_code_by_email()
-                order.send_verification_code_by_sms()
-            return {'verification_code': verification_code}, 200
-    else:
+            return response_json, 200
+
+        order.save()
         mpesa_transaction.update_status()
-        order.send_push_to_assigned_driver(
-            message=None,
-            push_extra={
-                "status": PushStatuses.ORDER_PAY_FAILED,
-                "code": mpesa_transaction.result_code,
-                "description": mpesa_transaction.result_desc
-            },
+        notify_transaction_status(order.pk, mpesa_transaction.status_verbose)
+        payment_failed.delay(
+            order_id=order.pk,
+            code=mpesa_transaction.result_code,
+            description=mpesa_transaction.result_desc
         )
 
     return {}, 400
+
+
+def expire_overdue_transactions(batch_size=500):
+    """
+    Expire payment transactions which got no callback within
+    MPESA_REQUEST_TIMEOUT, clear pending_transaction of their orders and
+    notify the drivers with one background job per batch
+    :return: number of expired transactions
+    """
+    from apps.management.orders.models import Order
+    from apps.mpesa_gateway.jobs import payments_expired
+
+    deadline = timezone.now() - datetime.timedelta(
+        seconds=settings.MPESA_REQUEST_TIMEOUT
+    )
+    with transaction.atomic():
+        transaction_ids = list(
+            MPesaTransaction.objects.select_for_update(
+                skip_locked=True
+            ).filter(
+                status=TransactionStatus.NEW,
+                created_at__lt=deadline,
+                transaction_type=TransactionType.PAYMENT
+            ).values_list('pk', flat=True)[:batch_size]
+        )
+        if not transaction_ids:
+            return 0
+
+        MPesaTransaction.objects.filter(pk__in=transaction_ids).update(
+            status=TransactionStatus.EXPIRED
+        )
+
+        orders = list(Order.objects.filter(
+            payment__transaction__in=transaction_ids
+        ).values_list('pk', 'pending_transaction'))
+
+        expired_status = dict(TransactionStatus.CHOICES)[
+            TransactionStatus.EXPIRED
+        ]
+        for order_id, _ in orders:
+            notify_transaction_status(order_id, expired_status)
+
+        order_ids = [order_id for order_id, pending in orders if pending]
+        if order_ids:
+            Order.objects.filter(pk__in=order_ids).update(
+                pending_transaction=False,
+                version=F('version') + 1
+            )
+            payments_expired.delay(order_ids=order_ids)
+
+    return len(transaction_ids)
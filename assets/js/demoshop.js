@@ -1,5 +1,5 @@
 $(document).ready(function () {
-  var paymentTimer;
+  var paymentWatcher;
   var webhookUrl = '/mpesa-result/';
 
   var $demoUserForm = $('#demoshop-user-form');
@@ -52,20 +52,12 @@ $(document).ready(function () {
     return requestData;
   }
 
-  function getTransaction(orderId) {
-    var url = 'transaction/' + orderId + '/status/';
-    $.get(url, function(data) {
-      var txnStatus = data.status;
-
-      if (txnStatus !== 'New') {
-        if (txnStatus === 'Success') {
-          alert('Verification code sent by sms and on your email');
-        } else {
-          alert('Failed to process transaction. Transaction status: ' + txnStatus);
-        }
-        clearInterval(paymentTimer);
-      }
-    });
+  function onTransactionStatus(txnStatus) {
+    if (txnStatus === 'Success') {
+      alert('Verification code sent by sms and on your email');
+    } else {
+      alert('Failed to process transaction. Transaction status: ' + txnStatus);
+    }
   }
 
   function processResponseType(responseType, orderId) {
@@ -93,7 +85,9 @@ $(document).ready(function () {
       ResultDesc = 'Some error message';
     } else if (responseType === 'wo_imititation') {
       setStatus('Waiting for response from mpesa');
-      paymentTimer = setInterval(function() {getTransaction(orderId)}, 5000);
+      paymentWatcher = watchTransactionStatus(
+        orderId, 'transaction/' + orderId + '/status/', onTransactionStatus
+      );
     }
     requestFromMpesa['Body']['stkCallback']['ResultCode'] = ResultCode;
     requestFromMpesa['Body']['stkCallback']['ResultDesc'] = ResultDesc;
@@ -112,7 +106,9 @@ $(document).ready(function () {
 
   $demoUserForm.on('submit', function () {
     clearStatus();
-    clearInterval(paymentTimer);
+    if (paymentWatcher) {
+      paymentWatcher.stop();
+    }
     var responseType = $('#response-type').val();
     var requestData = prepareRequestData($(this));
     var paymentMethod = requestData.payment_method;
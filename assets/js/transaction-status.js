@@ -0,0 +1,50 @@
+/*
+ * Calls onStatus once with the final status of the order payment
+ * transaction. The status is pushed over a websocket, polling pollUrl
+ * is the fallback when websockets are not available.
+ */
+function watchTransactionStatus(orderId, pollUrl, onStatus) {
+  var finished = false, pollTimer = null, socket = null;
+
+  function stop() {
+    finished = true;
+    clearInterval(pollTimer);
+    if (socket) {
+      socket.close();
+    }
+  }
+
+  function handle(status) {
+    if (finished || !status || status === 'New') {
+      return;
+    }
+    stop();
+    onStatus(status);
+  }
+
+  function poll() {
+    if (finished || pollTimer) {
+      return;
+    }
+    pollTimer = setInterval(function () {
+      $.get(pollUrl, function (data) {
+        handle(data.status);
+      });
+    }, 5000);
+  }
+
+  if (window.WebSocket) {
+    var scheme = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+    socket = new WebSocket(
+      scheme + window.location.host + '/ws/transaction/' + orderId + '/status/'
+    );
+    socket.onmessage = function (event) {
+      handle(JSON.parse(event.data).status);
+    };
+    socket.onclose = poll;
+  } else {
+    poll();
+  }
+
+  return {stop: stop};
+}
@@ -1,14 +1,19 @@
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
-from django.urls import re_path
+from django.urls import path, re_path
 
 from apps.management.chat.consumers import ChatConsumer
+from apps.mpesa_gateway.consumers import TransactionStatusConsumer
 
 
 application = ProtocolTypeRouter({
     'websocket': AuthMiddlewareStack(
         URLRouter([
-            re_path(r'^chat/$', ChatConsumer),
+            re_path(r'^chat/$', ChatConsumer.as_asgi()),
+            path(
+                'ws/transaction/<int:order_id>/status/',
+                TransactionStatusConsumer.as_asgi()
+            ),
         ])
     ),
 })
@@ -333,6 +333,30 @@ CHANNEL_LAYERS = {
 # DRIVERS
 # =========================================
 DRIVER_UPDATE_TIMEOUT = 300  # seconds
+# location pings, see apps.management.drivers.locations
+DRIVER_LOCATION = {
+    # meters a driver has to move for a ping to be stored
+    'MIN_DISTANCE': 10,
+    # seconds between stored pings of a driver who doesn't move,
+    # less than DRIVER_UPDATE_TIMEOUT
+    'MIN_INTERVAL': 60,
+    # points of an offline buffered batch
+    'MAX_POINTS': 500,
+    # meters, Douglas-Peucker tolerance of the tracks shown on the map
+    'TRACK_TOLERANCE': 5,
+    # days of history a single track request may cover
+    'MAX_TRACK_DAYS': 7,
+}
+
+# location history rows are queued in memory and written with
+# bulk_create from a background thread
+DRIVER_LOCATION_WRITER = {
+    'ASYNC': True,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 2,  # seconds
+    'MAX_QUEUE_SIZE': 50000,
+    'OVERFLOW': 'drop',  # or 'block'
+}
 
 # =========================================
 # MPESA
@@ -343,6 +367,7 @@ API_PAYMENT_URL = 'https://api-staging.begateway.com/beyag/transactions/payment'
 API_REFUND_URL = 'https://api-staging.begateway.com//beyag/transactions/refund'
 DEFAULT_HTTP_PROTOCOL = 'http'
 MPESA_REQUEST_TIMEOUT = 60
+MPESA_TOKEN_REFRESH_MARGIN = 60  # seconds before expiry to refresh the token
 
 MPESA_OAUTH2TOKEN_URL = 'https://sandbox.safaricom.co.ke/oauth/v1/generate'
 MPESA_STK_PUSH_URL = 'https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest'
@@ -438,6 +463,127 @@ PUSH_NOTIFICATIONS_SETTINGS = {
 # REQUESTS LOGGING
 # =========================================
 REQUEST_IGNORE_PATHS = ('admin/', 'media/')
+REQUEST_IGNORE_CACHE_SIZE = 1024  # paths
+REVERSE_DNS_TIMEOUT = 0.1  # seconds a Request.hostname call may wait
+
+# per-route logging policies, paths are regexes without the leading slash,
+# the first policy matching path and method wins
+REQUEST_LOG_POLICIES = (
+    {
+        'path': r'^api/(v1/)?driver/location/$',
+        'methods': ('PATCH', ),
+        'sample_rate': 0.01,
+        'log_body': False,
+        'log_response': False,
+    },
+    {
+        'path': r'^api/(v1/)?driver/locations/$',
+        'methods': ('POST', ),
+        'sample_rate': 0.01,
+        'log_body': False,
+        'log_response': False,
+    },
+    {
+        'path': r'^mpesa-(result|timeout)/$',
+        'sample_rate': 1,
+        'log_body': True,
+        'log_response': True,
+        'max_size': 10000,
+    },
+)
+REQUEST_LOG_DEFAULT_POLICY = {
+    'sample_rate': 1,
+    'log_body': True,
+    'log_response': True,
+    'max_size': 3000,  # bytes
+}
+
+# =========================================
+# PARTITIONED TABLES
+# =========================================
+# run `manage.py manage_partitions` daily (cron) to create upcoming
+# partitions and archive expired ones as gzipped JSON lines
+PARTITIONED_MODELS = {
+    'core.Request': {
+        'field': 'time',
+        'retention_days': 30,
+        'premake_days': 7,
+        'archive': True,
+    },
+    'drivers.DriverLocation': {
+        'field': 'recorded_at',
+        'retention_days': 90,
+        'premake_days': 7,
+        'archive': True,
+    },
+}
+PARTITIONS_ARCHIVE_DIR = os.path.join(BASE_DIR, 'archive')
+
+# request rows are queued in memory and written with bulk_create
+# from a background thread
+REQUEST_LOG_WRITER = {
+    'ASYNC': True,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 2,  # seconds
+    'MAX_QUEUE_SIZE': 10000,
+    'OVERFLOW': 'drop',  # or 'block'
+    'BLOCK_TIMEOUT': 0.5,  # seconds, only for 'block'
+}
+
+# outbound HTTP calls share one pooled session, endpoints are named by
+# the callers; TIMEOUT is (connect, read) seconds, RETRIES apply to
+# idempotent calls only
+OUTBOUND_HTTP = {
+    'POOL_SIZE': 10,
+    # connections per event loop of the asyncio client
+    'ASYNC_POOL_SIZE': 100,
+    'ENDPOINTS': {
+        'mpesa-oauth': {'TIMEOUT': (3.05, 10), 'RETRIES': 2},
+        'mpesa-stk-push': {'TIMEOUT': (3.05, MPESA_REQUEST_TIMEOUT)},
+        'mpesa-reversal': {'TIMEOUT': (3.05, MPESA_REQUEST_TIMEOUT)},
+        'begateway-refund': {'TIMEOUT': (3.05, 30)},
+        'fcm': {'TIMEOUT': (3.05, 10)},
+    },
+}
+
+# background jobs are stored in the core.Job table and run by the
+# run_jobs command; EAGER runs them right away in the calling thread
+JOBS = {
+    'EAGER': False,
+    'BATCH_SIZE': 10,
+    'POLL_INTERVAL': 1,  # seconds
+    'RETRY_DELAY': 30,  # seconds, doubled on every attempt
+    'STALE_TIMEOUT': 600,  # seconds a running job may take
+}
+
+# pushes to the drivers are stored in the drivers.PushMessage outbox and
+# sent in batches by the send_pushes command; EAGER sends them right after
+# the commit of the transaction which queued them
+PUSH_OUTBOX = {
+    'EAGER': False,
+    'BATCH_SIZE': 500,
+    'POLL_INTERVAL': 0.5,  # seconds
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 5,  # seconds, doubled on every attempt
+    'STALE_TIMEOUT': 300,  # seconds a batch may take
+    # 1: the whole serialized order; 2: order id, number, status and
+    # version only, the app fetches the order from the API. Switch to 2
+    # once the released driver apps read it
+    'PAYLOAD_VERSION': 1,
+}
+
+# serialized orders cached by order id and version
+ORDER_SNAPSHOTS = {
+    'TIMEOUT': 60 * 60,  # seconds
+}
+
+# order numbers are allocated from database sequences, every process
+# reserves BLOCK_SIZE numbers at once
+ORDER_NUMBERING = {
+    'SCHEME': 'global',  # or 'shop': shop id * SHOP_MULTIPLIER + number
+    'BLOCK_SIZE': 1,
+    'SHOP_MULTIPLIER': 10 ** 6,
+}
 
 
 try:
@@ -7,6 +7,8 @@ from django.conf.urls.static import static
 from django.views.generic.base import TemplateView
 
 # ofinta
+from apps.core.views import outbound_http_stats
+from apps.management.drivers.views import push_outbox_stats
 from apps.management.orders.views import PaymentLinksList, PaymentLinkDetails, \
     PaymentLinkEdit, PaymentLinkStep1, PaymentLinkStep2, PaymentLinkCancel
 from ofinta.views import OfintaLoginView, DashboardView, \
@@ -83,6 +85,16 @@ urlpatterns = [
         name='get_transaction_status'
     ),
     path('api-token-auth/', obtain_auth_token, name='api-auth'),
+    path(
+        'stats/outbound-http/',
+        outbound_http_stats,
+        name='outbound-http-stats'
+    ),
+    path(
+        'stats/push-outbox/',
+        push_outbox_stats,
+        name='push-outbox-stats'
+    ),
 
     re_path(r'^select2/', include('django_select2.urls')),
     re_path(r'^upload/', include('django_file_form.urls')),
@@ -20,9 +20,10 @@ from rest_framework.views import APIView
 # ofinta
 from apps.core.models import UserRoles
 from apps.management.orders.constants import OrderStatus, PushStatuses
-from apps.management.orders.models import Payment, Order
+from apps.management.orders.models import Payment
 from apps.mpesa_gateway.models import MPesaTransaction
-from apps.mpesa_gateway.utils import process_success_webhook
+from apps.mpesa_gateway.utils import process_success_webhook, \
+    get_transaction_status as get_transaction_status_verbose
 
 from .forms import LoginForm
 
@@ -75,11 +76,13 @@ def mpesa_timeout(request):
 
 
 def get_transaction_status(request, order_id):
-    order = Order.objects.get(id=order_id)
-    payment = order.payment
-    txn = payment.transaction
-    txn.check_timeout()
-    return JsonResponse({'status': txn.status_verbose})
+    """
+    Polling fallback of TransactionStatusConsumer
+    """
+    status = get_transaction_status_verbose(order_id)
+    if status is None:
+        return JsonResponse({'status': None}, status=404)
+    return JsonResponse({'status': status})
 
 
 class ObtainAuthToken(APIView):
@@ -457,12 +457,14 @@ class TestDriversEndpoint:
 
         json_data = json.dumps({})
         response = client.post(url, data=json_data, **headers)
-        assert response.status_code == status.HTTP_200_OK
+        assert response.status_code == status.HTTP_202_ACCEPTED
         assert response.json() == {
-            'message': 'Paid request sent successfully'
+            'message': 'Paid request queued',
+            'pending_transaction': True
         }
         self.active_order_1_1.refresh_from_db()
         assert self.active_order_1_1.verification_required is False
+        assert self.active_order_1_1.pending_transaction is True
 
         assert Payment.new_submit.called is True
 
@@ -1009,3 +1011,61 @@ class TestChatEndpoint:
         assert response.status_code == status.HTTP_200_OK
         assert response.json() == 'Message sent'
 
+
+class TestOrdersQueryCount:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self):
+        self.shop = ShopFactory()
+        self.driver = DriverProfileFactory().user
+        self.driver.shop = self.shop
+        self.driver.save()
+
+        self.headers = {
+            'HTTP_AUTHORIZATION': 'Token {}'.format(self.driver.auth_token.key),
+            'content_type': 'application/json'
+        }
+
+    def create_orders(self, count):
+        for i in range(count):
+            order = OrderFactory(
+                shop=self.shop,
+                status=OrderStatus.ASSIGNED,
+                payment_method=PaymentMethod.CASH
+            )
+            order.positions.create(
+                item_id=f'item-{i}', name='item', quantity=2, price=10
+            )
+            order.positions.create(
+                item_id=f'item-{i}-1', name='item', quantity=1, price=5
+            )
+            OrderAssignments.objects.create(driver=self.driver, order=order)
+
+    def get_active(self, client):
+        url = reverse('api:v1:driver-orders-active')
+        response = client.get(url, **self.headers)
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+
+    def test_list_query_count(self, client, django_assert_num_queries,
+                              django_assert_max_num_queries):
+        """
+        Query count of a page doesn't depend on the number of orders
+        """
+        self.create_orders(2)
+        with django_assert_max_num_queries(20) as captured:
+            data = self.get_active(client)
+        assert len(data['results']) == 2
+
+        self.create_orders(20)
+        with django_assert_num_queries(len(captured)):
+            data = self.get_active(client)
+        assert len(data['results']) == 22
+
+        for order_data in data['results']:
+            order = Order.objects.get(pk=order_data['id'])
+            assert order_data['total_amount'] == str(order.total_price())
+            assert len(order_data['positions']) == 2
+            assert order_data['warehouse_location']['code'] == \
+                order.warehouse.code
@@ -23,3 +23,38 @@ def owner(django_db_blocker):
     user.set_password('password')
     user.save()
     return user
+
+
+@pytest.fixture(autouse=True)
+def sync_request_log_writer(monkeypatch):
+    """
+    Background writer threads can't see the test transaction
+    """
+    from apps.core.middleware import request_log_writer
+    monkeypatch.setattr(request_log_writer, 'asynchronous', False)
+
+
+@pytest.fixture(autouse=True)
+def sync_location_writer(monkeypatch):
+    """
+    Write the driver location history right away
+    """
+    from apps.management.drivers.locations import location_writer
+    monkeypatch.setattr(location_writer, 'asynchronous', False)
+
+
+@pytest.fixture(autouse=True)
+def eager_jobs(settings):
+    """
+    Run background jobs right away, tests don't start workers
+    """
+    settings.JOBS = dict(settings.JOBS, EAGER=True)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Cached order snapshots outlive the test transaction
+    """
+    from django.core.cache import cache
+    cache.clear()
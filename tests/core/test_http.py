@@ -0,0 +1,220 @@
+# third party
+import httpx
+import pytest
+import requests
+from asgiref.sync import async_to_sync
+
+# ofinta
+from apps.core.http import HttpClient, AsyncHttpClient, CircuitBreaker, \
+    CircuitState, CircuitOpenError, Histogram, RateLimiter
+from tests.mpesa_gateway.stubs import StubServer
+
+
+class TestHttpClient:
+
+    @pytest.fixture
+    def server(self):
+        with StubServer({'ok': True}) as server:
+            yield server
+
+    @pytest.fixture
+    def client(self):
+        return HttpClient(endpoints={
+            'daraja': {
+                'TIMEOUT': (1, 1),
+                'RETRIES': 2,
+                'BACKOFF': 0.01,
+                'FAILURE_THRESHOLD': 3,
+                'RESET_TIMEOUT': 60,
+            }
+        })
+
+    def test_connection_is_reused(self, server, client):
+        session = client.session
+        for _ in range(3):
+            assert client.get('daraja', server.url).json() == {'ok': True}
+        assert client.session is session
+        assert len(server.requests) == 3
+
+        stats = client.stats()['daraja']
+        assert stats['state'] == CircuitState.CLOSED
+        assert stats['latency']['count'] == 3
+        assert stats['latency']['buckets']['+Inf'] == 3
+
+    def test_idempotent_call_is_retried(self, server, client):
+        server.enqueue(503)
+        server.enqueue(502)
+        response = client.get('daraja', server.url)
+        assert response.status_code == 200
+        assert len(server.requests) == 3
+
+    def test_post_is_not_retried(self, server, client):
+        server.enqueue(503)
+        response = client.post('daraja', server.url, json={})
+        assert response.status_code == 503
+        assert len(server.requests) == 1
+
+    def test_retries_are_bounded(self, server, client):
+        server.status = 504
+        response = client.get('daraja', server.url)
+        assert response.status_code == 504
+        assert len(server.requests) == 3
+
+    def test_timeout(self, server, client):
+        server.delay = 0.3
+        client.get_endpoint('daraja').retries = 0
+        with pytest.raises(requests.Timeout):
+            client.get('daraja', server.url, timeout=0.1)
+
+    def test_circuit_opens(self, server, client):
+        server.status = 500
+        for _ in range(3):
+            client.post('daraja', server.url)
+
+        with pytest.raises(CircuitOpenError):
+            client.post('daraja', server.url)
+        assert len(server.requests) == 3
+        assert client.stats()['daraja']['errors'] == 3
+
+    def test_failed_trial_reopens_circuit(self, client):
+        breaker = client.get_endpoint('daraja').breaker
+        breaker.state = CircuitState.OPEN
+        breaker.opened_at = breaker.clock() - 60
+
+        with pytest.raises(requests.exceptions.MissingSchema):
+            client.get('daraja', 'not a url')
+
+        assert breaker.state == CircuitState.OPEN
+
+
+class TestAsyncHttpClient:
+
+    @pytest.fixture
+    def server(self):
+        with StubServer({'ok': True}) as server:
+            yield server
+
+    @pytest.fixture
+    def sync_client(self):
+        return HttpClient(endpoints={
+            'daraja': {
+                'TIMEOUT': (1, 1),
+                'RETRIES': 2,
+                'BACKOFF': 0.01,
+                'FAILURE_THRESHOLD': 3,
+            }
+        })
+
+    @pytest.fixture
+    def client(self, sync_client):
+        return AsyncHttpClient(sync_client=sync_client)
+
+    def run(self, client, coroutine):
+        async def run():
+            try:
+                return await coroutine
+            finally:
+                await client.aclose()
+        return async_to_sync(run)()
+
+    def test_idempotent_call_is_retried(self, server, client):
+        server.enqueue(503)
+        response = self.run(client, client.get('daraja', server.url))
+        assert response.json() == {'ok': True}
+        assert len(server.requests) == 2
+
+    def test_timeout(self, server, client):
+        server.delay = 0.3
+        client.get_endpoint('daraja').retries = 0
+        with pytest.raises(httpx.TimeoutException):
+            self.run(client, client.get('daraja', server.url, timeout=0.1))
+
+    def test_circuit_is_shared_with_sync_client(self, server, client,
+                                                sync_client):
+        server.status = 500
+        for _ in range(3):
+            self.run(client, client.post('daraja', server.url))
+
+        with pytest.raises(CircuitOpenError):
+            sync_client.post('daraja', server.url)
+        assert len(server.requests) == 3
+        assert sync_client.stats()['daraja']['errors'] == 3
+
+
+class TestRateLimiter:
+
+    def test_acquire(self):
+        now, waits = [0], []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        limiter = RateLimiter(
+            rate=10, burst=2, clock=lambda: now[0], sleep=sleep
+        )
+        # the burst goes through, then one call per 0.1 second
+        assert [limiter.acquire() for _ in range(4)] == [
+            0, 0, pytest.approx(0.1), pytest.approx(0.1)
+        ]
+
+        now[0] += 1
+        assert limiter.acquire() == 0
+        assert waits == [pytest.approx(0.1), pytest.approx(0.1)]
+
+
+class TestCircuitBreaker:
+
+    def test_half_open(self):
+        now = [0]
+        breaker = CircuitBreaker(
+            failure_threshold=2, reset_timeout=10, clock=lambda: now[0]
+        )
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        assert breaker.state == CircuitState.OPEN
+
+        now[0] = 10
+        breaker.before_call()
+        assert breaker.state == CircuitState.HALF_OPEN
+
+        # a single trial call at a time
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_failure()
+        assert breaker.state == CircuitState.OPEN
+
+        now[0] = 20
+        breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == CircuitState.CLOSED
+
+    def test_release(self):
+        now = [0]
+        breaker = CircuitBreaker(
+            failure_threshold=1, reset_timeout=10, clock=lambda: now[0]
+        )
+        breaker.record_failure()
+        now[0] = 10
+        breaker.before_call()
+
+        breaker.release()
+
+        assert breaker.state == CircuitState.OPEN
+        assert breaker.failures == 1
+        # the next call is a trial again
+        breaker.before_call()
+        assert breaker.state == CircuitState.HALF_OPEN
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot['buckets'] == {'0.1': 2, '1': 3, '+Inf': 4}
+    assert snapshot['count'] == 4
+    assert snapshot['sum'] == pytest.approx(2.65)
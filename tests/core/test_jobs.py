@@ -0,0 +1,108 @@
+# third party
+import pytest
+
+# ofinta
+from apps.core import jobs
+from apps.core.models import Job, JobStatus
+
+
+calls = []
+
+
+@jobs.job('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@jobs.job('tests.record_once', max_attempts=1)
+def record_once(value):
+    calls.append(value)
+
+
+@jobs.job('tests.fail', max_attempts=2)
+def fail():
+    raise ValueError('failed')
+
+
+class TestJobs:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self, settings):
+        settings.JOBS = dict(settings.JOBS, EAGER=False, RETRY_DELAY=0)
+        calls.clear()
+
+    def test_enqueue(self):
+        job = record.delay(value=1)
+        assert job.status == JobStatus.PENDING
+        assert calls == []
+
+        assert jobs.run_pending() == 1
+        assert calls == [1]
+
+        job.refresh_from_db()
+        assert job.status == JobStatus.DONE
+        assert job.attempts == 1
+        assert jobs.run_pending() == 0
+
+    def test_unknown_job(self):
+        with pytest.raises(KeyError):
+            jobs.enqueue('tests.unknown')
+
+    def test_retry_and_fail(self):
+        job = fail.delay()
+
+        jobs.run_pending()
+        job.refresh_from_db()
+        assert job.status == JobStatus.PENDING
+        assert 'ValueError' in job.last_error
+
+        jobs.run_pending()
+        job.refresh_from_db()
+        assert job.status == JobStatus.FAILED
+        assert job.attempts == 2
+
+    def test_claim_batch(self):
+        for value in range(5):
+            record.delay(value=value)
+
+        claimed = jobs.claim(3)
+        assert len(claimed) == 3
+        assert Job.objects.filter(status=JobStatus.RUNNING).count() == 3
+        assert len(jobs.claim(10)) == 2
+
+    def test_run_pending_names(self):
+        record.delay(value=1)
+        fail.delay()
+
+        assert jobs.run_pending(names=['tests.record']) == 1
+        assert calls == [1]
+        assert Job.objects.get(name='tests.fail').status == JobStatus.PENDING
+
+    def test_requeue_stale(self, settings):
+        record.delay(value=1)
+        jobs.claim(1)
+
+        settings.JOBS = dict(settings.JOBS, STALE_TIMEOUT=-1)
+        assert jobs.requeue_stale() == 1
+        assert jobs.run_pending() == 1
+        assert calls == [1]
+
+    def test_stale_job_without_attempts_left(self, settings):
+        job = record_once.delay(value=1)
+        jobs.claim(1)
+
+        settings.JOBS = dict(settings.JOBS, STALE_TIMEOUT=-1)
+        assert jobs.requeue_stale() == 0
+        assert jobs.run_pending() == 0
+        assert calls == []
+
+        job.refresh_from_db()
+        assert job.status == JobStatus.FAILED
+        assert job.finished_at is not None
+
+    def test_eager(self, settings):
+        settings.JOBS = dict(settings.JOBS, EAGER=True)
+        job = record.delay(value=2)
+        assert calls == [2]
+        assert job.status == JobStatus.DONE
@@ -0,0 +1,126 @@
+# system
+import datetime
+import gzip
+import json
+
+# django
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+# third party
+import pytest
+
+# ofinta
+from apps.core.models import Request
+from apps.core.partitions import PartitionManager, create_partition, \
+    get_partitions, partition_name, default_partition_name, day_bounds
+
+
+TABLE = Request._meta.db_table
+
+
+def count_rows(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT COUNT(*) FROM {}'.format(connection.ops.quote_name(table))
+        )
+        return cursor.fetchone()[0]
+
+
+def create_request(path, day):
+    start, _ = day_bounds(day)
+    return Request.objects.create(
+        method='GET', path=path, ip='127.0.0.1',
+        time=start + datetime.timedelta(hours=12)
+    )
+
+
+class TestPartitions:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self, tmp_path):
+        self.today = timezone.now().date()
+        self.archive_dir = str(tmp_path)
+
+    def get_manager(self, **kwargs):
+        options = dict(
+            retention_days=30, premake_days=2, archive_dir=self.archive_dir
+        )
+        options.update(kwargs)
+        return PartitionManager(Request, 'time', **options)
+
+    def test_create_upcoming(self):
+        manager = self.get_manager()
+
+        created = manager.create_upcoming()
+
+        days = [self.today + datetime.timedelta(days=i) for i in range(3)]
+        assert created == [partition_name(TABLE, day) for day in days]
+        partitions = get_partitions(TABLE)
+        for day in days:
+            assert partitions[day] == partition_name(TABLE, day)
+        # already there
+        assert manager.create_upcoming() == []
+
+    def test_rows_move_out_of_default_partition(self):
+        day = self.today + datetime.timedelta(days=20)
+        create_request('/later/', day)
+        default = default_partition_name(TABLE)
+        assert count_rows(default) == 1
+
+        name = create_partition(TABLE, 'time', day)
+
+        assert count_rows(default) == 0
+        assert count_rows(name) == 1
+        assert Request.objects.filter(path='/later/').count() == 1
+
+    def test_drop_expired(self):
+        day = self.today - datetime.timedelta(days=40)
+        name = create_partition(TABLE, 'time', day)
+        create_request('/expired/', day)
+        # older than the retention period but without a partition
+        create_request('/leftover/', self.today - datetime.timedelta(days=50))
+        create_request('/recent/', self.today)
+
+        dropped = self.get_manager().drop_expired()
+
+        assert dropped == [(name, 1), (default_partition_name(TABLE), 1)]
+        assert day not in get_partitions(TABLE)
+        assert list(Request.objects.values_list('path', flat=True)) == [
+            '/recent/'
+        ]
+
+        path = self.get_manager().archive_path('{:%Y%m%d}'.format(day))
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            rows = [json.loads(line) for line in archive]
+        assert [row['path'] for row in rows] == ['/expired/']
+
+    def test_drop_expired_without_archive(self):
+        day = self.today - datetime.timedelta(days=40)
+        name = create_partition(TABLE, 'time', day)
+        create_request('/expired/', day)
+
+        dropped = self.get_manager(archive=False).drop_expired()
+
+        assert dropped == [(name, 0)]
+        assert not Request.objects.exists()
+
+    def test_command(self, settings):
+        settings.PARTITIONED_MODELS = {
+            'core.Request': {'field': 'time', 'retention_days': 30,
+                             'premake_days': 1},
+        }
+        day = self.today - datetime.timedelta(days=40)
+        create_partition(TABLE, 'time', day)
+
+        call_command(
+            'manage_partitions', models=['core.Request'], no_archive=True,
+            archive_dir=self.archive_dir
+        )
+
+        partitions = get_partitions(TABLE)
+        assert self.today in partitions
+        assert self.today + datetime.timedelta(days=1) in partitions
+        assert day not in partitions
@@ -0,0 +1,91 @@
+# system
+import json
+
+# django
+from django.http import JsonResponse
+from django.test import RequestFactory
+
+# ofinta
+from apps.core.models import Request
+from apps.core.policies import RequestLogPolicies, RequestLogPolicy
+
+
+POLICIES = (
+    {
+        'path': r'^api/(v1/)?driver/location/$',
+        'methods': ('PATCH', ),
+        'sample_rate': 0,
+        'log_body': False,
+        'log_response': False,
+    },
+    {
+        'path': r'^mpesa-result/$',
+        'max_size': 10,
+    },
+)
+
+
+class TestRequestLogPolicies:
+
+    def test_resolve(self):
+        policies = RequestLogPolicies(POLICIES, default={'sample_rate': 1})
+
+        location = policies.resolve('api/v1/driver/location/', 'patch')
+        assert location is policies.policies[0]
+        assert location.sample() is False
+
+        # other methods fall back to the default policy
+        assert policies.resolve(
+            'api/v1/driver/location/', 'GET'
+        ) is policies.default
+        assert policies.resolve('mpesa-result/', 'POST').max_size == 10
+        assert policies.resolve('dashboard/', 'GET').sample() is True
+
+    def test_sample_rate(self, mocker):
+        policy = RequestLogPolicy(sample_rate=0.25)
+        mocker.patch('random.random', return_value=0.2)
+        assert policy.sample() is True
+        mocker.patch('random.random', return_value=0.3)
+        assert policy.sample() is False
+
+
+class TestFromHttpRequest:
+
+    def make_request(self, path):
+        data = json.dumps({'latitude': 1.5, 'longitude': 2.5})
+        request = RequestFactory().patch(
+            path, data, content_type='application/json'
+        )
+        request._body_to_log = request.body
+        return request
+
+    def test_without_body(self):
+        policy = RequestLogPolicy(log_body=False, log_response=False)
+        request = self.make_request('/api/v1/driver/location/')
+        response = JsonResponse({'latitude': 1.5, 'longitude': 2.5})
+
+        r = Request()
+        r.from_http_request(request, response, commit=False, policy=policy)
+        assert r.data is None
+        assert r.response_content is None
+        assert r.method == 'PATCH'
+        assert r.response == 200
+
+    def test_max_size(self):
+        policy = RequestLogPolicy(max_size=5)
+        request = self.make_request('/mpesa-result/')
+        response = JsonResponse({'success': True})
+
+        r = Request()
+        r.from_http_request(request, response, commit=False, policy=policy)
+        assert r.data == '{"lat\n...\n'
+        assert r.response_content == '{"suc\n...\n'
+
+    def test_default(self):
+        request = self.make_request('/mpesa-result/')
+        response = JsonResponse({'success': True})
+
+        r = Request()
+        r.from_http_request(request, response, commit=False)
+        assert json.loads(r.data) == {'latitude': 1.5, 'longitude': 2.5}
+        assert json.loads(r.response_content) == {'success': True}
@@ -0,0 +1,29 @@
+# ofinta
+from apps.core.router import patterns, PathMatcher
+
+
+IGNORE_PATHS = ('admin/', 'media/', r'^static/')
+
+
+class TestPathMatcher:
+
+    def test_same_result_as_patterns(self):
+        matcher = PathMatcher(*IGNORE_PATHS)
+        ignore = patterns(False, *IGNORE_PATHS)
+        for path in ('admin/core/request/', 'media/photos/1.png',
+                     'static/css/base.css', 'assets/static/base.css',
+                     'api/v1/driver/location/', ''):
+            assert matcher.match(path) == bool(ignore.resolve(path))
+
+    def test_cached(self):
+        matcher = PathMatcher(*IGNORE_PATHS, cache_size=2)
+        for i in range(3):
+            matcher.match('api/v1/driver/location/')
+
+        info = matcher.match.cache_info()
+        assert info.hits == 2
+        assert info.misses == 1
+        assert info.maxsize == 2
+
+    def test_no_regexes(self):
+        assert PathMatcher().match('admin/') is False
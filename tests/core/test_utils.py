@@ -0,0 +1,55 @@
+# system
+import time
+
+# ofinta
+from apps.core.utils import HostnameResolver, resolve_browser
+
+
+CHROME = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+          '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+
+class TestResolveBrowser:
+
+    def test_cached(self):
+        resolve_browser.cache_clear()
+        assert resolve_browser(CHROME)[0] == 'Google Chrome'
+        assert resolve_browser(CHROME)[0] == 'Google Chrome'
+        assert resolve_browser.cache_info().hits == 1
+
+
+class TestHostnameResolver:
+
+    def test_cached(self, mocker):
+        lookup = mocker.patch(
+            'socket.gethostbyaddr', return_value=('host.example.com', [], [])
+        )
+        resolver = HostnameResolver(timeout=1)
+        for i in range(3):
+            assert resolver.resolve('10.0.0.1') == 'host.example.com'
+        assert lookup.call_count == 1
+
+    def test_failure_returns_ip(self, mocker):
+        mocker.patch('socket.gethostbyaddr', side_effect=OSError)
+        resolver = HostnameResolver(timeout=1)
+        assert resolver.resolve('10.0.0.2') == '10.0.0.2'
+
+    def test_timeout(self, mocker):
+        def slow_lookup(ip):
+            time.sleep(0.2)
+            return 'slow.example.com', [], []
+
+        mocker.patch('socket.gethostbyaddr', side_effect=slow_lookup)
+        resolver = HostnameResolver(timeout=0.01)
+        assert resolver.resolve('10.0.0.3') == '10.0.0.3'
+
+        # the lookup finishes in the background and is cached
+        time.sleep(0.3)
+        assert resolver.resolve('10.0.0.3') == 'slow.example.com'
+
+    def test_cache_size(self, mocker):
+        mocker.patch('socket.gethostbyaddr', side_effect=OSError)
+        resolver = HostnameResolver(cache_size=2, timeout=1)
+        for ip in ('10.0.0.4', '10.0.0.5', '10.0.0.6'):
+            resolver.resolve(ip)
+        assert list(resolver.cache) == ['10.0.0.5', '10.0.0.6']
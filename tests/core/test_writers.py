@@ -0,0 +1,57 @@
+# third party
+import pytest
+
+# ofinta
+from apps.core.models import Request
+from apps.core.writers import BufferedWriter, OverflowPolicy
+
+
+def make_request(path):
+    return Request(method='GET', path=path, ip='127.0.0.1')
+
+
+class TestBufferedWriter:
+    pytestmark = pytest.mark.django_db
+
+    def test_sync_write(self):
+        writer = BufferedWriter(Request, asynchronous=False)
+        assert writer.put(make_request('/sync/')) is True
+
+        assert Request.objects.filter(path='/sync/').count() == 1
+        assert writer.stats['flushed'] == 1
+        assert writer.stats['enqueued'] == 0
+
+    def test_flush_in_batches(self):
+        writer = BufferedWriter(Request, batch_size=3)
+        # fill the queue directly, the background thread is not started
+        for i in range(7):
+            writer.queue.put_nowait(make_request(f'/batch/{i}/'))
+
+        assert writer.flush() == 7
+        assert Request.objects.filter(path__startswith='/batch/').count() == 7
+        assert writer.stats['flushed'] == 7
+        assert writer.stats['queued'] == 0
+
+    def test_drop_when_full(self, mocker):
+        mocker.patch.object(BufferedWriter, 'start')
+        writer = BufferedWriter(
+            Request, max_queue_size=2, overflow=OverflowPolicy.DROP
+        )
+        results = [writer.put(make_request(f'/drop/{i}/')) for i in range(5)]
+
+        assert results == [True, True, False, False, False]
+        assert writer.stats['enqueued'] == 2
+        assert writer.stats['dropped'] == 3
+
+        writer.flush()
+        assert Request.objects.filter(path__startswith='/drop/').count() == 2
+
+    def test_block_when_full(self, mocker):
+        mocker.patch.object(BufferedWriter, 'start')
+        writer = BufferedWriter(
+            Request, max_queue_size=1, overflow=OverflowPolicy.BLOCK,
+            block_timeout=0.01
+        )
+        assert writer.put(make_request('/block/1/')) is True
+        assert writer.put(make_request('/block/2/')) is False
+        assert writer.stats['dropped'] == 1
@@ -0,0 +1,285 @@
+# system
+import datetime
+import json
+
+# django
+from django.urls import reverse
+from django.utils import timezone
+
+# third party
+import pytest
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from apps.management.dashboard.tests.factories import DriverProfileFactory, \
+    ShopFactory, UserFactory
+from apps.management.drivers.locations import distance, \
+    parse_location_points, record_locations, LocationPoint, simplify, \
+    get_track, track_distance
+from apps.management.drivers.models import DriverLocation, DriverProfile
+
+
+class TestParseLocationPoints:
+
+    def test_single_point(self):
+        now = timezone.now()
+
+        points = parse_location_points(
+            {'latitude': '1.5', 'longitude': 36.8}, now=now
+        )
+
+        assert points == [LocationPoint(1.5, 36.8, now)]
+
+    def test_batch_is_sorted(self):
+        now = timezone.now()
+
+        points = parse_location_points({'points': [
+            {'latitude': 1, 'longitude': 2,
+             'timestamp': '2026-01-01T10:00:05Z'},
+            {'latitude': 3, 'longitude': 4, 'timestamp': 1767261600},
+        ]}, now=now)
+
+        assert [point.latitude for point in points] == [3, 1]
+        assert points[0].recorded_at == datetime.datetime(
+            2026, 1, 1, 10, tzinfo=datetime.timezone.utc
+        )
+
+    def test_future_timestamp_is_clamped(self):
+        now = timezone.now()
+
+        points = parse_location_points({
+            'latitude': 1, 'longitude': 2,
+            'timestamp': (now + datetime.timedelta(hours=1)).isoformat()
+        }, now=now)
+
+        assert points[0].recorded_at == now
+
+    @pytest.mark.parametrize('data', [
+        {'latitude': 1},
+        {'latitude': 'north', 'longitude': 2},
+        {'latitude': 91, 'longitude': 2},
+        {'latitude': 1, 'longitude': 2, 'timestamp': 'yesterday'},
+        {'latitude': 1, 'longitude': 2, 'timestamp': 1e300},
+        {'latitude': 1, 'longitude': 2, 'timestamp': float('nan')},
+        {'points': []},
+        {'points': [1, 2]},
+        [],
+    ])
+    def test_invalid(self, data):
+        with pytest.raises(ValueError):
+            parse_location_points(data)
+
+    def test_too_many_points(self, settings):
+        settings.DRIVER_LOCATION = dict(settings.DRIVER_LOCATION, MAX_POINTS=2)
+
+        with pytest.raises(ValueError):
+            parse_location_points({
+                'points': [{'latitude': 1, 'longitude': 2}] * 3
+            })
+
+    def test_distance(self):
+        # one degree of latitude
+        assert 111000 < distance((0, 0), (1, 0)) < 111400
+        assert distance((-4.06, 39.66), (-4.06, 39.66)) == 0
+
+
+class TestRecordLocations:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self):
+        self.profile = DriverProfileFactory()
+
+    def point(self, latitude, longitude, seconds_ago=0):
+        return LocationPoint(
+            latitude, longitude,
+            timezone.now() - datetime.timedelta(seconds=seconds_ago)
+        )
+
+    def test_latest_point_is_stored(self, django_assert_num_queries):
+        # the two history rows are written right away in the tests,
+        # then the profile is updated with one query
+        with django_assert_num_queries(3):
+            assert record_locations(self.profile.user_id, [
+                self.point(1, 1, seconds_ago=10),
+                self.point(2, 2),
+            ]) is True
+
+        self.profile.refresh_from_db()
+        assert (self.profile.coordinates.x, self.profile.coordinates.y) == \
+            (2, 2)
+
+    def test_standing_driver_is_deduplicated(self, django_assert_num_queries):
+        record_locations(self.profile.user_id, [self.point(1, 1)])
+
+        with django_assert_num_queries(0):
+            assert record_locations(
+                self.profile.user_id, [self.point(1.00001, 1)]
+            ) is False
+
+        # moved ~110 meters
+        assert record_locations(
+            self.profile.user_id, [self.point(1.001, 1)]
+        ) is True
+
+    def test_old_points_are_ignored(self):
+        record_locations(self.profile.user_id, [self.point(1, 1)])
+
+        assert record_locations(
+            self.profile.user_id, [self.point(5, 5, seconds_ago=3600)]
+        ) is False
+        self.profile.refresh_from_db()
+        assert self.profile.coordinates.x == 1
+
+    def test_offline_batch_keeps_driver_active(self, settings):
+        settings.DRIVER_UPDATE_TIMEOUT = 60
+        assert record_locations(self.profile.user_id, [
+            self.point(1, 1, seconds_ago=3600),
+            self.point(2, 2, seconds_ago=3000),
+        ]) is True
+
+        self.profile.refresh_from_db()
+        assert self.profile.location_recorded_at < \
+            timezone.now() - datetime.timedelta(seconds=2900)
+        assert DriverProfile.objects.get_active().filter(
+            pk=self.profile.pk
+        ).exists()
+
+    def test_not_a_driver(self, client):
+        user = UserFactory()
+        with pytest.raises(DriverProfile.DoesNotExist):
+            record_locations(user.pk, [self.point(1, 1)])
+        assert not DriverLocation.objects.filter(user_id=user.pk).exists()
+
+        token, _ = Token.objects.get_or_create(user=user)
+        response = client.post(
+            reverse('api:v1:driver-locations'),
+            data=json.dumps({'latitude': 1, 'longitude': 2}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'Token {token.key}'
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_endpoint(self, client):
+        token, _ = Token.objects.get_or_create(user=self.profile.user)
+        headers = {
+            'HTTP_AUTHORIZATION': f'Token {token.key}',
+            'content_type': 'application/json'
+        }
+        url = reverse('api:v1:driver-locations')
+
+        response = client.post(url, data=json.dumps({'points': [
+            {'latitude': 1, 'longitude': 2},
+            {'latitude': 3, 'longitude': 4},
+        ]}), **headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {'received': 2, 'stored': True}
+
+        response = client.post(
+            url, data=json.dumps({'latitude': 1000, 'longitude': 2}), **headers
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestLocationHistory:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self):
+        self.profile = DriverProfileFactory()
+        self.now = timezone.now()
+
+    def point(self, latitude, longitude, minutes_ago=0):
+        return LocationPoint(
+            latitude, longitude,
+            self.now - datetime.timedelta(minutes=minutes_ago)
+        )
+
+    def test_points_are_recorded(self):
+        record_locations(self.profile.user_id, [
+            self.point(-4.06, 39.66, minutes_ago=3),
+            # standing still
+            self.point(-4.06, 39.66, minutes_ago=2),
+            self.point(-4.05, 39.66, minutes_ago=1),
+        ])
+
+        assert list(DriverLocation.objects.order_by('recorded_at').values_list(
+            'latitude', 'longitude'
+        )) == [(-4.06, 39.66), (-4.05, 39.66)]
+
+    def test_track(self):
+        record_locations(self.profile.user_id, [
+            self.point(-4.06, 39.66, minutes_ago=60 * 30),
+            self.point(-4.05, 39.66, minutes_ago=2),
+            self.point(-4.04, 39.66, minutes_ago=1),
+        ])
+
+        track = get_track(
+            self.profile.user_id,
+            self.now - datetime.timedelta(hours=1),
+            self.now + datetime.timedelta(seconds=1)
+        )
+
+        assert [point.latitude for point in track] == [-4.05, -4.04]
+        assert 1100 < track_distance(track) < 1125
+
+    def test_simplify(self):
+        # a straight line with a little noise and one real turn
+        points = [(0, i * 0.0001 + (0.000001 if i % 2 else 0))
+                  for i in range(100)]
+        points.append((0.01, 0.0099))
+
+        simplified = simplify(points, tolerance=5)
+
+        assert simplified == [points[0], points[99], points[100]]
+        assert simplify(points, tolerance=0) == points
+
+    def test_simplify_long_track(self):
+        # deeper than the recursion limit
+        points = [(i * 0.001, (i % 2) * 0.001) for i in range(1100)]
+
+        assert len(simplify(points, tolerance=1)) == len(points)
+
+    def test_track_view(self, client, manager):
+        manager.shop = ShopFactory()
+        manager.save()
+        self.profile.user.shop = manager.shop
+        self.profile.user.save()
+        record_locations(self.profile.user_id, [
+            self.point(-4.06, 39.66, minutes_ago=2),
+            self.point(-4.05, 39.66, minutes_ago=1),
+        ])
+        client.login(email=manager.email, password='password')
+
+        response = client.get(reverse(
+            'management:driver-track', args=(self.profile.user_id, )
+        ))
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [point[:2] for point in data['points']] == [
+            [-4.06, 39.66], [-4.05, 39.66]
+        ]
+        assert data['distance'] == 1112
+
+    @pytest.mark.parametrize('params', [
+        {'start': '2024-02-30T00:00'},
+        {'end': 'yesterday'},
+        {'tolerance': 'nan'},
+        {'tolerance': 'inf'},
+        {'tolerance': '-1'},
+        {'tolerance': 'far'},
+    ])
+    def test_track_view_invalid_params(self, client, manager, params):
+        manager.shop = ShopFactory()
+        manager.save()
+        self.profile.user.shop = manager.shop
+        self.profile.user.save()
+        client.login(email=manager.email, password='password')
+
+        response = client.get(reverse(
+            'management:driver-track', args=(self.profile.user_id, )
+        ), params)
+
+        assert response.status_code == 400
+        assert set(response.json()) == set(params)
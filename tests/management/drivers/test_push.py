@@ -0,0 +1,217 @@
+# system
+import datetime
+
+# django
+from django.core.management import call_command
+from django.utils import timezone
+
+# third party
+import pytest
+from push_notifications.models import GCMDevice
+
+from apps.management.dashboard.tests.factories import DriverProfileFactory, \
+    OrderFactory, ShopFactory
+from apps.management.drivers import push
+from apps.management.drivers.models import PushMessage, PushMessageStatus
+from tests.mpesa_gateway.stubs import StubServer
+
+
+class TestPushOutbox:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self, settings):
+        self.settings = settings
+        self.settings.PUSH_OUTBOX = dict(
+            settings.PUSH_OUTBOX, EAGER=False, PAYLOAD_VERSION=2
+        )
+        self.shop = ShopFactory()
+
+    @pytest.fixture
+    def fcm(self, settings):
+        with StubServer() as stub:
+            settings.PUSH_NOTIFICATIONS_SETTINGS = dict(
+                settings.PUSH_NOTIFICATIONS_SETTINGS,
+                FCM_POST_URL=stub.url
+            )
+            yield stub
+
+    def create_driver(self, device=True):
+        profile = DriverProfileFactory(user__shop=self.shop)
+        if device:
+            GCMDevice.objects.create(
+                user=profile.user,
+                registration_id=f'token-{profile.user_id}',
+                cloud_message_type='FCM'
+            )
+        return profile
+
+    def results(self, *errors):
+        return {'results': [
+            {'error': error} if error else {'message_id': f'0:{i}'}
+            for i, error in enumerate(errors)
+        ]}
+
+    def test_send_push_enqueues(self, fcm):
+        profile = self.create_driver()
+
+        profile.send_push('New order', {'action': 'new_order'})
+
+        message = PushMessage.objects.get()
+        assert message.user_id == profile.user_id
+        assert message.status == PushMessageStatus.PENDING
+        assert message.extra == {'action': 'new_order'}
+        assert fcm.requests == []
+
+    def test_identical_pushes_are_coalesced(self, fcm):
+        profiles = [self.create_driver() for _ in range(3)]
+        for profile in profiles:
+            profile.send_push('Shop closed', {'action': 'closed'})
+        fcm.enqueue(200, self.results(None, None, None))
+
+        assert push.dispatch_pending() == 3
+
+        assert len(fcm.bodies) == 1
+        assert sorted(fcm.bodies[0]['registration_ids']) == sorted(
+            f'token-{profile.user_id}' for profile in profiles
+        )
+        assert fcm.bodies[0]['data'] == {'action': 'closed', 'v': 2}
+        assert PushMessage.objects.filter(
+            status=PushMessageStatus.SENT
+        ).count() == 3
+
+    def test_duplicate_pushes_are_sent_once(self, fcm):
+        profile = self.create_driver()
+        profile.send_push('Ping', {'action': 'ping'})
+        profile.send_push('Ping', {'action': 'ping'})
+        fcm.enqueue(200, self.results(None))
+
+        push.dispatch_pending()
+
+        assert fcm.bodies[0]['registration_ids'] == [
+            f'token-{profile.user_id}'
+        ]
+        assert PushMessage.objects.filter(
+            status=PushMessageStatus.SENT
+        ).count() == 2
+
+    def test_order_snapshot(self, fcm):
+        profile = self.create_driver()
+        order = OrderFactory(shop=self.shop)
+        profile.send_push('Order assigned', {'action': 'assigned'}, order)
+        fcm.enqueue(200, self.results(None))
+
+        push.dispatch_pending()
+
+        assert fcm.bodies[0]['data'] == {
+            'action': 'assigned',
+            'v': 2,
+            'order': {
+                'id': order.pk,
+                'order_number': order.order_number,
+                'status': order.status,
+                'version': order.version,
+            },
+        }
+
+    def test_full_order_payload(self, fcm):
+        self.settings.PUSH_OUTBOX = dict(
+            self.settings.PUSH_OUTBOX, PAYLOAD_VERSION=1
+        )
+        profile = self.create_driver()
+        order = OrderFactory(shop=self.shop)
+        profile.send_push('Order assigned', {'action': 'assigned'}, order)
+        fcm.enqueue(200, self.results(None))
+
+        push.dispatch_pending()
+
+        data = fcm.bodies[0]['data']
+        assert data['v'] == 1
+        assert data['order']['id'] == order.pk
+        assert 'positions' in data['order']
+
+    def test_not_registered_device_is_deactivated(self, fcm):
+        profile = self.create_driver()
+        profile.send_push('Ping', {})
+        fcm.enqueue(200, self.results('NotRegistered'))
+
+        push.dispatch_pending()
+
+        message = PushMessage.objects.get()
+        assert message.status == PushMessageStatus.FAILED
+        assert message.last_error == 'NotRegistered'
+        assert GCMDevice.objects.get(user=profile.user).active is False
+
+    def test_server_error_is_retried(self, fcm):
+        profile = self.create_driver()
+        profile.send_push('Ping', {})
+        fcm.enqueue(503)
+
+        push.dispatch_pending()
+
+        message = PushMessage.objects.get()
+        assert message.status == PushMessageStatus.PENDING
+        assert message.attempts == 1
+        assert message.run_at > timezone.now()
+        # not due yet
+        assert push.dispatch_pending() == 0
+
+    def test_retries_are_limited(self, fcm):
+        self.settings.PUSH_OUTBOX = dict(
+            self.settings.PUSH_OUTBOX, MAX_ATTEMPTS=1
+        )
+        profile = self.create_driver()
+        profile.send_push('Ping', {})
+        fcm.enqueue(200, self.results('Unavailable'))
+
+        push.dispatch_pending()
+
+        message = PushMessage.objects.get()
+        assert message.status == PushMessageStatus.FAILED
+        assert message.last_error == 'Unavailable'
+
+    def test_no_device(self, fcm):
+        profile = self.create_driver(device=False)
+        profile.send_push('Ping', {})
+
+        push.dispatch_pending()
+
+        assert PushMessage.objects.get().status == PushMessageStatus.NO_DEVICE
+        assert fcm.requests == []
+
+    def test_stale_pushes_are_requeued(self):
+        profile = self.create_driver()
+        message = profile.send_push('Ping', {})
+        PushMessage.objects.filter(pk=message.pk).update(
+            status=PushMessageStatus.SENDING,
+            started_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+
+        assert push.requeue_stale() == 1
+        message.refresh_from_db()
+        assert message.status == PushMessageStatus.PENDING
+
+    def test_stats(self, fcm):
+        profile = self.create_driver()
+        profile.send_push('Ping', {})
+        profile.send_push('Pong', {})
+
+        assert push.stats()['depth'] == 2
+
+        fcm.enqueue(200, self.results(None))
+        fcm.enqueue(200, self.results(None))
+        count = push.delivery_latency.snapshot()['count']
+        call_command('send_pushes', once=True)
+
+        stats = push.stats()
+        assert stats['depth'] == 0
+        assert stats['oldest_age'] == 0
+        assert stats['latency']['count'] == count + 2
+
+    def test_stats_view(self, client, admin_user):
+        client.force_login(admin_user)
+
+        response = client.get('/stats/push-outbox/')
+
+        assert response.status_code == 200
+        assert response.json()['depth'] == 0
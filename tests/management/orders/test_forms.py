@@ -0,0 +1,117 @@
+# third party
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# ofinta
+from apps.management.dashboard.tests.factories import DriverProfileFactory, \
+    OrderFactory, ShopFactory
+from apps.management.drivers.models import PushMessage
+from apps.management.orders.constants import OrderAssignmentStatus, \
+    PushStatuses, PaymentMethod
+from apps.management.orders.forms import DriverAssignForm, \
+    PaymentLinkEditForm
+from apps.management.orders.models import Order, OrderAssignments, Payment
+
+
+class TestDriverAssignForm:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self):
+        self.shop = ShopFactory()
+
+    def create_driver(self):
+        return DriverProfileFactory(user__shop=self.shop).user
+
+    def create_order(self, assignments):
+        order = OrderFactory(shop=self.shop, driver=None)
+        for _ in range(assignments):
+            OrderAssignments.objects.create(
+                order=order, driver=self.create_driver()
+            )
+        return Order.objects.get(pk=order.pk)
+
+    def reassign(self, order):
+        driver = self.create_driver()
+        form = DriverAssignForm(order, data={'driver': driver.pk})
+        assert form.is_valid(), form.errors
+
+        with CaptureQueriesContext(connection) as queries:
+            assignment = form.save()
+        return assignment, len(queries)
+
+    def test_reassign(self):
+        order = self.create_order(assignments=3)
+        prev_driver_ids = set(
+            order.assignments.values_list('driver_id', flat=True)
+        )
+
+        assignment, _ = self.reassign(order)
+
+        assert list(order.assignments.all()) == [assignment]
+        order.refresh_from_db()
+        assert order.current_assignment_id == assignment.pk
+        assert order.current_driver_id == assignment.driver_id
+
+        pushes = PushMessage.objects.filter(order=order)
+        assert {
+            push.user_id for push in pushes
+            if push.extra == {'status': PushStatuses.ORDER_REASSIGNED}
+        } == prev_driver_ids
+        assert pushes.get(
+            extra={'status': PushStatuses.ORDER_ASSIGNED}
+        ).user_id == assignment.driver_id
+
+    def test_constant_queries(self):
+        _, one = self.reassign(self.create_order(assignments=1))
+        _, many = self.reassign(self.create_order(assignments=10))
+
+        assert one == many
+
+    def test_delete_in_bulk(self):
+        order = self.create_order(assignments=3)
+        first, *rest = order.assignments.order_by('pk')
+        rest[0].status = OrderAssignmentStatus.REJECTED
+        rest[0].save()
+
+        deleted = OrderAssignments.objects.filter(
+            pk__in=[assignment.pk for assignment in rest]
+        ).delete_in_bulk()
+
+        assert deleted == 2
+        order.refresh_from_db()
+        assert order.current_assignment_id == first.pk
+        assert order.current_driver_id == first.driver_id
+        assert order.current_assignment_status == first.status
+
+
+class TestPaymentLinkEditForm:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self):
+        self.shop = ShopFactory(allow_prepayment=True)
+        self.order = OrderFactory(
+            shop=self.shop, driver=None, is_payment_link=True
+        )
+
+    def test_pay(self, mocker):
+        submit_payment = mocker.patch(
+            'apps.management.orders.forms.submit_payment'
+        )
+        form = PaymentLinkEditForm(instance=self.order, data={
+            'buyer_name': 'Buyer',
+            'buyer_phone': '254700000000',
+            'buyer_email': 'buyer@example.com',
+            'payment_method': PaymentMethod.MPESA,
+            'pay': '1',
+        })
+        assert form.is_valid(), form.errors
+
+        form.save()
+
+        payment = Payment.objects.get(order=self.order)
+        submit_payment.delay.assert_called_once_with(payment_id=payment.pk)
+        self.order.refresh_from_db()
+        assert self.order.pending_transaction is True
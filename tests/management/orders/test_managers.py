@@ -0,0 +1,148 @@
+# system
+from decimal import Decimal
+
+# third party
+import pytest
+
+# ofinta
+from apps.management.dashboard.tests.factories import OrderFactory, \
+    ShopFactory, WarehouseFactory, DriverFactory
+from apps.management.orders.constants import OrderStatus, PaymentMethod, \
+    OrderAssignmentStatus
+from apps.management.orders.models import OrderAssignments, Order
+
+
+@pytest.mark.django_db
+class TestDriverOrders:
+    pytestmark = pytest.mark.django_db
+
+    ORDERS_COUNT = 200
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self):
+        self.shop = ShopFactory()
+        self.warehouse = WarehouseFactory(shop=self.shop)
+        self.driver = DriverFactory(shop=self.shop)
+        self.other_driver = DriverFactory(shop=self.shop)
+
+        self.active, self.history = set(), set()
+        assignments = []
+        for i in range(self.ORDERS_COUNT):
+            status = OrderStatus.COMPLETED if i % 2 else OrderStatus.ASSIGNED
+            order = OrderFactory(
+                shop=self.shop,
+                order_number=10000 + i,
+                status=status,
+                driver=None,
+                warehouse=self.warehouse,
+                payment_method=PaymentMethod.CASH
+            )
+
+            # the latest assignment of the driver decides, regardless of
+            # the assignments of other drivers
+            last_status = (
+                OrderAssignmentStatus.ASSIGNED,
+                OrderAssignmentStatus.ACCEPTED,
+                OrderAssignmentStatus.REJECTED
+            )[i % 3]
+            assignments.extend([
+                OrderAssignments(
+                    order=order, driver=self.driver,
+                    status=OrderAssignmentStatus.REJECTED
+                ),
+                OrderAssignments(
+                    order=order, driver=self.driver, status=last_status
+                ),
+                OrderAssignments(
+                    order=order, driver=self.other_driver,
+                    status=OrderAssignmentStatus.ACCEPTED
+                ),
+            ])
+
+            if last_status != OrderAssignmentStatus.REJECTED and \
+                    status == OrderStatus.ASSIGNED:
+                self.active.add(order.pk)
+            if last_status == OrderAssignmentStatus.ACCEPTED and \
+                    status == OrderStatus.COMPLETED:
+                self.history.add(order.pk)
+
+        OrderAssignments.objects.bulk_create(assignments)
+
+        # never assigned to the driver
+        OrderFactory(
+            shop=self.shop, order_number=9999, driver=None,
+            warehouse=self.warehouse, payment_method=PaymentMethod.CASH
+        )
+
+    def test_active(self, django_assert_num_queries):
+        queryset = self.shop.get_orders().get_driver_active(
+            self.driver
+        ).get_open()
+
+        with django_assert_num_queries(1):
+            orders = list(queryset)
+
+        assert {order.pk for order in orders} == self.active
+
+    def test_history(self, django_assert_num_queries):
+        queryset = Order.objects.get_queryset().get_driver_history(
+            self.driver
+        ).get_recent()
+
+        with django_assert_num_queries(1):
+            orders = list(queryset)
+
+        assert {order.pk for order in orders} == self.history
+
+
+class TestOrderTotals:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self):
+        self.order = OrderFactory(delivery_fee=Decimal('5.50'))
+        self.order.positions.create(
+            item_id='1', name='first', quantity=2, price=Decimal('10.25')
+        )
+        self.position = self.order.positions.create(
+            item_id='2', name='second', quantity=3, price=Decimal('1.00')
+        )
+        self.empty_order = OrderFactory(delivery_fee=Decimal('7.00'))
+
+    def test_with_totals(self, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            orders = {
+                order.pk: order
+                for order in Order.objects.with_totals()
+            }
+            order = orders[self.order.pk]
+            assert order.total_quantity() == 5
+            assert order.total_price() == Decimal('29.00')
+
+            empty_order = orders[self.empty_order.pk]
+            assert empty_order.total_quantity() == 0
+            assert empty_order.total_price() == Decimal('7.00')
+
+    def test_total_amount(self):
+        order = Order.objects.get(pk=self.order.pk)
+        assert order.total_amount == Decimal('29.00')
+        assert Order.objects.get(pk=self.empty_order.pk).total_amount == \
+            Decimal('7.00')
+
+        self.position.delete()
+        order.refresh_from_db()
+        assert order.total_amount == Decimal('26.00')
+
+        order.delivery_fee = Decimal('1.00')
+        order.save()
+        order.refresh_from_db()
+        assert order.total_amount == Decimal('21.50')
+
+    def test_stale_instance_keeps_total_amount(self):
+        # the instance was loaded before its positions changed
+        self.order.positions.filter(pk=self.position.pk).delete()
+        self.order.buyer_name = 'changed'
+        self.order.save()
+
+        assert Order.objects.get(pk=self.order.pk).total_amount == \
+            Decimal('26.00')
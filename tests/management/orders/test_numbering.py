@@ -0,0 +1,113 @@
+# system
+import threading
+
+# third party
+import pytest
+from django.db import connection
+
+# ofinta
+from apps.management.dashboard.tests.factories import ShopFactory, \
+    LocationFactory
+from apps.management.orders.models import Order
+from apps.management.orders.numbering import OrderNumberAllocator, \
+    NumberingScheme
+
+
+def run_workers(target, workers):
+    errors = []
+
+    def run():
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+class TestOrderNumberAllocator:
+    pytestmark = pytest.mark.django_db(transaction=True)
+
+    WORKERS = 8
+    PER_WORKER = 500
+
+    def test_allocate_blocks(self):
+        allocator = OrderNumberAllocator(block_size=50)
+        numbers = []
+
+        def allocate():
+            for _ in range(self.PER_WORKER):
+                numbers.append(allocator.allocate())
+
+        run_workers(allocate, self.WORKERS)
+        assert len(set(numbers)) == self.WORKERS * self.PER_WORKER
+
+    def test_parallel_orders(self):
+        shop = ShopFactory()
+
+        def create_orders():
+            for _ in range(self.PER_WORKER // 2):
+                Order.objects.create(
+                    shop=shop,
+                    shipping_address=LocationFactory(),
+                    buyer_name='buyer'
+                )
+
+        run_workers(create_orders, self.WORKERS)
+        numbers = Order.objects.values_list('order_number', flat=True)
+        assert len(set(numbers)) == self.WORKERS * self.PER_WORKER // 2
+
+    def test_given_number_is_kept(self):
+        order = Order.objects.create(
+            shop=ShopFactory(),
+            shipping_address=LocationFactory(),
+            buyer_name='buyer',
+            order_number=123
+        )
+        assert order.order_number == 123
+
+    def test_given_number_advances_sequence(self):
+        allocator = OrderNumberAllocator(block_size=10)
+        number = allocator.allocate() + 5
+        Order.objects.create(
+            shop=ShopFactory(),
+            shipping_address=LocationFactory(),
+            buyer_name='buyer',
+            order_number=number
+        )
+
+        allocator.advance(number)
+        assert allocator.allocate() > number
+
+        order = Order.objects.create(
+            shop=ShopFactory(),
+            shipping_address=LocationFactory(),
+            buyer_name='buyer'
+        )
+        assert order.order_number > number
+
+    def test_shop_scheme(self):
+        allocator = OrderNumberAllocator(
+            scheme=NumberingScheme.SHOP, block_size=10, shop_multiplier=1000
+        )
+        shop, other_shop = ShopFactory(), ShopFactory()
+        Order.objects.create(
+            shop=shop,
+            shipping_address=LocationFactory(),
+            buyer_name='buyer',
+            order_number=shop.id * 1000 + 41
+        )
+
+        assert allocator.allocate(shop) == shop.id * 1000 + 42
+        assert allocator.allocate(shop) == shop.id * 1000 + 43
+        assert allocator.allocate(other_shop) == other_shop.id * 1000 + 1
+
+        with pytest.raises(ValueError):
+            allocator.allocate()
@@ -0,0 +1,72 @@
+# third party
+import pytest
+
+# ofinta
+from apps.management.dashboard.tests.factories import OrderFactory, \
+    ShopFactory, WarehouseFactory, DriverFactory
+from apps.management.orders.constants import OrderAssignmentStatus
+from apps.management.orders.models import OrderAssignments, Order
+
+
+class TestCurrentAssignment:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self):
+        self.shop = ShopFactory()
+        self.driver = DriverFactory(shop=self.shop)
+        self.other_driver = DriverFactory(shop=self.shop)
+        self.order = OrderFactory(
+            shop=self.shop,
+            warehouse=WarehouseFactory(shop=self.shop),
+            driver=None
+        )
+
+    def assign(self, driver, status=OrderAssignmentStatus.ASSIGNED):
+        return OrderAssignments.objects.create(
+            order=self.order, driver=driver, status=status
+        )
+
+    def test_latest_assignment_is_current(self):
+        self.assign(self.driver, OrderAssignmentStatus.REJECTED)
+        assignment = self.assign(self.other_driver)
+
+        order = Order.objects.get(pk=self.order.pk)
+        assert order.current_assignment_id == assignment.pk
+        assert order.current_driver_id == self.other_driver.pk
+        assert order.assigned_driver == self.other_driver
+
+    def test_status_change_is_synced(self, django_assert_num_queries):
+        assignment = self.assign(self.driver)
+        assignment.status = OrderAssignmentStatus.REJECTED
+        assignment.save()
+
+        order = Order.objects.get(pk=self.order.pk)
+        assert order.current_assignment_status == \
+            OrderAssignmentStatus.REJECTED
+
+        with django_assert_num_queries(0):
+            assert order.assigned_driver is None
+
+    def test_delete_falls_back_to_previous(self):
+        previous = self.assign(self.driver)
+        self.assign(self.other_driver).delete()
+
+        order = Order.objects.get(pk=self.order.pk)
+        assert order.current_assignment_id == previous.pk
+        assert order.assigned_driver == self.driver
+
+    def test_order_save_keeps_current_assignment(self):
+        # the instance does not see the assignment
+        OrderAssignments.objects.create(
+            order_id=self.order.pk, driver=self.driver,
+            status=OrderAssignmentStatus.ASSIGNED
+        )
+        assert self.order.current_driver_id is None
+
+        self.order.comment = 'changed'
+        self.order.save()
+
+        order = Order.objects.get(pk=self.order.pk)
+        assert order.current_driver_id == self.driver.pk
+        assert order.comment == 'changed'
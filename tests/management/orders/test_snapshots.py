@@ -0,0 +1,165 @@
+# system
+from decimal import Decimal
+
+# third party
+import pytest
+from django.db.models.signals import post_save
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+# ofinta
+from apps.management.dashboard.tests.factories import DriverFactory, \
+    OrderFactory, ShopFactory
+from apps.management.orders.constants import OrderStatus
+from apps.management.orders.models import Order, Position
+from apps.management.orders.snapshots import get_order_snapshots
+
+
+class TestOrderSnapshots:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self):
+        self.shop = ShopFactory()
+        self.order = OrderFactory(shop=self.shop, driver=None)
+
+    def test_version_is_bumped(self):
+        assert self.order.version == 1
+
+        self.order.status = OrderStatus.ASSIGNED
+        self.order.save()
+        assert self.order.version == 2
+
+        self.order.save(update_fields=['status'])
+        self.order.refresh_from_db()
+        assert self.order.version == 3
+
+        Position.objects.create(
+            order=self.order, item_id='1', name='Position', price=10
+        )
+        self.order.refresh_from_db()
+        assert self.order.version == 4
+
+    def test_stale_instance_gets_new_version(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        Position.objects.create(
+            order=self.order, item_id='1', name='Position', price=10
+        )
+
+        stale.save(update_fields=['pending_transaction'])
+
+        assert stale.version == 3
+        assert Order.objects.get(pk=self.order.pk).version == 3
+
+    def test_post_save_gets_new_version(self, django_assert_num_queries):
+        versions = []
+
+        def receiver(instance, **kwargs):
+            versions.append(instance.version)
+
+        post_save.connect(receiver, sender=Order)
+        try:
+            # version increment and the update
+            with django_assert_num_queries(2):
+                self.order.save(update_fields=['status'])
+        finally:
+            post_save.disconnect(receiver, sender=Order)
+
+        assert versions == [2]
+
+    def test_empty_update_fields(self):
+        self.order.buyer_name = 'Changed'
+        self.order.save(update_fields=[])
+
+        order = Order.objects.get(pk=self.order.pk)
+        assert order.version == 1
+        assert order.buyer_name != 'Changed'
+
+    def test_delivery_fee_updates_total(self):
+        Position.objects.create(
+            order=self.order, item_id='1', name='Position', price=10
+        )
+        order = Order.objects.get(pk=self.order.pk)
+
+        order.delivery_fee = Decimal('5.50')
+        order.save()
+
+        assert order.total_amount == Decimal('15.50')
+        assert order.version == 3
+        assert Order.objects.get(pk=order.pk).total_amount == Decimal('15.50')
+
+    def test_snapshot_is_cached(self, django_assert_num_queries):
+        versions = {self.order.pk: self.order.version}
+        snapshot = get_order_snapshots(versions)[self.order.pk]
+        assert snapshot['id'] == self.order.pk
+
+        with django_assert_num_queries(0):
+            assert get_order_snapshots(versions)[self.order.pk] == snapshot
+
+    def test_new_version_is_rendered(self):
+        get_order_snapshots({self.order.pk: self.order.version})
+
+        self.order.status = OrderStatus.ASSIGNED
+        self.order.save()
+
+        snapshot = get_order_snapshots(
+            {self.order.pk: self.order.version}
+        )[self.order.pk]
+        assert snapshot['status'] == OrderStatus.ASSIGNED
+
+    def test_retrieve_etag(self, client):
+        driver = DriverFactory(shop=self.shop)
+        token, _ = Token.objects.get_or_create(user=driver)
+        headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+        url = reverse('api:v1:driver-order', args=(self.order.pk, ))
+
+        response = client.get(url, **headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['id'] == self.order.pk
+        etag = response['ETag']
+        assert etag == '"1"'
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag, **headers)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        Order.objects.get(pk=self.order.pk).save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag, **headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] == '"2"'
+
+    def test_retrieve_fields(self, client):
+        driver = DriverFactory(shop=self.shop)
+        token, _ = Token.objects.get_or_create(user=driver)
+        headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+        url = reverse('api:v1:driver-order', args=(self.order.pk, ))
+
+        response = client.get(url, {'fields': 'id,status'}, **headers)
+        assert response.json() == {
+            'id': self.order.pk, 'status': self.order.status
+        }
+
+        response = client.get(url, {'omit': 'positions'}, **headers)
+        assert 'positions' not in response.json()
+        assert response.json()['id'] == self.order.pk
+
+    def test_related_changes_make_new_version(self):
+        get_order_snapshots({self.order.pk: self.order.version})
+
+        location = self.order.shipping_address
+        location.address = 'New address'
+        location.save()
+        self.order.refresh_from_db()
+        assert self.order.version == 2
+        snapshot = get_order_snapshots(
+            {self.order.pk: self.order.version}
+        )[self.order.pk]
+        assert snapshot['shipping_address']['properties']['address'] == \
+            'New address'
+
+        warehouse = self.order.warehouse
+        warehouse.location.save()
+        warehouse.name = 'New name'
+        warehouse.save()
+        self.order.refresh_from_db()
+        assert self.order.version == 4
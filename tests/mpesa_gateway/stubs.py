@@ -0,0 +1,72 @@
+# system
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer:
+    """
+    Local HTTP server answering every request with ``response`` as JSON,
+    or with the responses queued by ``enqueue`` first.
+    Handled request paths are collected in ``requests``, their decoded
+    JSON bodies in ``bodies``.
+    """
+    def __init__(self, response=None, status=200, delay=0):
+        self.response = response or {}
+        self.status = status
+        self.delay = delay
+        self.requests = []
+        self.bodies = []
+        self.queue = []
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                stub.requests.append(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    stub.bodies.append(json.loads(self.rfile.read(length)))
+                except ValueError:
+                    stub.bodies.append(None)
+                if stub.delay:
+                    time.sleep(stub.delay)
+
+                status, response = stub.status, stub.response
+                if stub.queue:
+                    status, response = stub.queue.pop(0)
+
+                body = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_POST = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+
+    def enqueue(self, status, response=None):
+        self.queue.append((status, response or {}))
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}/'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
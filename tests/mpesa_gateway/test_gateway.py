@@ -1,19 +1,32 @@
 # system
+import asyncio
+import datetime
 import json
+import time
 
 # django
 from django.conf import settings
+from django.db.models.aggregates import Max
+from django.utils import timezone
 
 # third party
 import pytest
+from asgiref.sync import async_to_sync
 
 from apps.management.dashboard.tests.factories import OrderFactory, ShopFactory, \
-    DriverProfileFactory
+    DriverProfileFactory, TransactionFactory
 from apps.management.orders.constants import OrderStatus, PushStatuses
-from apps.management.orders.models import Payment
-from apps.mpesa_gateway.gateway import MPesaGateway
+from apps.management.orders.models import Order, Payment
+from apps.core.http import async_http_client
+from apps.mpesa_gateway.gateway import MPesaGateway, AsyncMPesaGateway
 from apps.mpesa_gateway.models import MPesaTransaction, TransactionStatus, \
     TransactionType
+from apps.mpesa_gateway.refunds import refundable_orders
+from apps.mpesa_gateway.tokens import access_tokens
+from apps.mpesa_gateway.utils import process_success_webhook, \
+    expire_overdue_transactions
+from apps.shared.models import Location
+from tests.mpesa_gateway.stubs import StubServer
 
 
 @pytest.mark.django_db
@@ -132,3 +145,292 @@ class TestGateway:
             self.order
         )
         assert res == {'success': True, 'transaction': txn}
+
+    def test_payment_against_daraja(self, settings):
+        """
+        Test MPesaGateway payment against a local fake Daraja server
+        """
+        daraja_response = {
+            'access_token': 'daraja-token',
+            'expires_in': '3599',
+            'MerchantRequestID': 'merchant-1',
+            'CheckoutRequestID': 'checkout-1',
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        }
+        with StubServer(daraja_response) as daraja:
+            settings.MPESA_TEST_MODE = False
+            settings.MPESA_OAUTH2TOKEN_URL = daraja.url + 'oauth/v1/generate'
+            settings.MPESA_STK_PUSH_URL = daraja.url + 'stkpush'
+            access_tokens.invalidate()
+
+            res = self.gw.payment(
+                payment=self.payment, amount=1, phone_number='1234567'
+            )
+            self.gw.payment(
+                payment=self.payment, amount=1, phone_number='1234567'
+            )
+            access_tokens.invalidate()
+
+        assert res['success'] is True
+        assert res['transaction'].checkout_request_id == 'checkout-1'
+        assert res['transaction'].status == TransactionStatus.NEW
+
+        # the token is requested once for both payments
+        assert [path.split('?')[0] for path in daraja.requests] == [
+            '/oauth/v1/generate', '/stkpush', '/stkpush'
+        ]
+
+    def test_payment_daraja_unavailable(self, settings):
+        with StubServer(status=503) as daraja:
+            settings.MPESA_TEST_MODE = False
+            settings.MPESA_OAUTH2TOKEN_URL = daraja.url
+            access_tokens.invalidate()
+
+            res = self.gw.payment(
+                payment=self.payment, amount=1, phone_number='1234567'
+            )
+
+        assert res == {'success': False}
+
+    def test_duplicate_callback(self, mocker):
+        """
+        Repeated Safaricom callbacks are acknowledged without processing
+        """
+        self.order.verification_required = False
+        self.order.status = OrderStatus.DELIVERED
+        self.order.save()
+
+        send_push_mock = mocker.patch(
+            'apps.management.drivers.models.DriverProfile.send_push'
+        )
+        self.gw.payment(
+            payment=self.payment, amount=1, phone_number='1234567'
+        )
+        txn = MPesaTransaction.objects.get()
+        assert txn.callback_processed_at is not None
+        assert send_push_mock.call_count == 1
+
+        # the order expects a new transaction, the old one is delivered again
+        self.order.refresh_from_db()
+        self.order.pending_transaction = True
+        self.order.save()
+
+        assert process_success_webhook({}) == (
+            {'success': True, 'duplicate': True}, 200
+        )
+        assert send_push_mock.call_count == 1
+        self.order.refresh_from_db()
+        assert self.order.pending_transaction is True
+
+
+class TestAsyncGateway:
+    pytestmark = pytest.mark.django_db
+
+    daraja_response = {
+        'access_token': 'daraja-token',
+        'expires_in': '3599',
+        'MerchantRequestID': 'merchant-1',
+        'CheckoutRequestID': 'checkout-1',
+        'ResponseCode': '0',
+        'ResponseDescription': 'Success. Request accepted for processing',
+        'CustomerMessage': 'Success. Request accepted for processing',
+    }
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self, manager):
+        self.order = OrderFactory(shop=ShopFactory(), order_number=1)
+
+    @pytest.fixture
+    def daraja(self, settings):
+        with StubServer(self.daraja_response, delay=0.05) as daraja:
+            settings.MPESA_TEST_MODE = False
+            settings.MPESA_OAUTH2TOKEN_URL = daraja.url + 'oauth/v1/generate'
+            settings.MPESA_STK_PUSH_URL = daraja.url + 'stkpush'
+            settings.MPESA_STK_REVERSAL_URL = daraja.url + 'reversal'
+            access_tokens.invalidate()
+            yield daraja
+            access_tokens.invalidate()
+
+    def create_payments(self, count):
+        # one order per payment, created in bulk
+        last_number = Order.objects.aggregate(
+            last_number=Max('order_number')
+        )['last_number']
+        locations = Location.objects.bulk_create(
+            Location(address=self.order.shipping_address.address)
+            for _ in range(count)
+        )
+        orders = Order.objects.bulk_create(
+            Order(
+                shop=self.order.shop,
+                warehouse=self.order.warehouse,
+                shipping_address=location,
+                buyer_name=self.order.buyer_name,
+                order_number=last_number + i
+            )
+            for i, location in enumerate(locations, start=1)
+        )
+        return Payment.objects.bulk_create(
+            Payment(order=order) for order in orders
+        )
+
+    def pay_concurrently(self, payments):
+        gw = AsyncMPesaGateway()
+
+        async def pay():
+            try:
+                return await asyncio.gather(*(
+                    gw.payment(payment, amount=1, phone_number='1234567')
+                    for payment in payments
+                ))
+            finally:
+                await async_http_client.aclose()
+
+        return async_to_sync(pay)()
+
+    def test_payment(self, daraja):
+        payment, = self.create_payments(1)
+        res, = self.pay_concurrently([payment])
+
+        assert res['success'] is True
+        assert res['transaction'].checkout_request_id == 'checkout-1'
+        payment.refresh_from_db()
+        assert payment.transaction == res['transaction']
+
+    def test_refund(self, daraja):
+        txn = TransactionFactory(amount=10, phone_number='1234567')
+
+        async def refund():
+            try:
+                return await AsyncMPesaGateway().refund(txn)
+            finally:
+                await async_http_client.aclose()
+
+        assert async_to_sync(refund)() == {'success': True}
+        assert MPesaTransaction.objects.filter(
+            transaction_type=TransactionType.REVERSAL
+        ).count() == 1
+
+    def test_concurrent_payments_throughput(self, daraja):
+        """
+        Concurrent pushes wait for Daraja together instead of one after
+        another, and share one token refresh
+        """
+        payments = self.create_payments(300)
+        started = time.monotonic()
+        results = self.pay_concurrently(payments)
+        async_rate = len(payments) / (time.monotonic() - started)
+
+        assert all(res['success'] for res in results)
+        assert MPesaTransaction.objects.filter(
+            checkout_request_id='checkout-1'
+        ).count() == 300
+        assert len([
+            path for path in daraja.requests if path.startswith('/oauth')
+        ]) == 1
+
+        gw = MPesaGateway()
+        payments = self.create_payments(20)
+        started = time.monotonic()
+        for payment in payments:
+            gw.payment(payment, amount=1, phone_number='1234567')
+        sync_rate = len(payments) / (time.monotonic() - started)
+
+        assert async_rate > 3 * sync_rate
+
+
+class TestExpireTransactions:
+    pytestmark = pytest.mark.django_db
+
+    def create_payment(self, seconds_ago, **kwargs):
+        order = OrderFactory(pending_transaction=True)
+        txn = TransactionFactory(transaction_type=TransactionType.PAYMENT)
+        MPesaTransaction.objects.filter(pk=txn.pk).update(
+            created_at=timezone.now() - datetime.timedelta(
+                seconds=seconds_ago
+            ),
+            **kwargs
+        )
+        Payment.objects.create(order=order, transaction=txn)
+        return order, txn
+
+    def test_expire_overdue(self, settings, mocker):
+        send_push_mock = mocker.patch(
+            'apps.management.orders.models.Order.send_push_to_assigned_driver'
+        )
+        timeout = settings.MPESA_REQUEST_TIMEOUT
+        overdue = [self.create_payment(timeout + 10) for _ in range(3)]
+        recent_order, recent_txn = self.create_payment(timeout - 10)
+        paid_order, paid_txn = self.create_payment(
+            timeout + 10, status=TransactionStatus.SUCCESS
+        )
+
+        assert expire_overdue_transactions(batch_size=2) == 2
+        assert expire_overdue_transactions(batch_size=2) == 1
+        assert expire_overdue_transactions(batch_size=2) == 0
+
+        for order, txn in overdue:
+            txn.refresh_from_db()
+            order.refresh_from_db()
+            assert txn.status == TransactionStatus.EXPIRED
+            assert order.pending_transaction is False
+
+        recent_txn.refresh_from_db()
+        assert recent_txn.status == TransactionStatus.NEW
+        paid_txn.refresh_from_db()
+        assert paid_txn.status == TransactionStatus.SUCCESS
+        recent_order.refresh_from_db()
+        assert recent_order.pending_transaction is True
+
+        assert send_push_mock.call_count == 3
+
+    def callback(self, txn):
+        return process_success_webhook({'Body': {'stkCallback': {
+            'MerchantRequestID': txn.merchant_request_id,
+            'CheckoutRequestID': txn.checkout_request_id,
+            'ResultCode': 0,
+            'ResultDesc': 'The service request is processed successfully.',
+        }}})
+
+    def test_late_success_callback(self, settings, mocker):
+        settings.MPESA_TEST_MODE = False
+        mocker.patch(
+            'apps.management.orders.models.Order.send_push_to_assigned_driver'
+        )
+        payment_succeeded = mocker.patch(
+            'apps.mpesa_gateway.jobs.payment_succeeded'
+        )
+        timeout = settings.MPESA_REQUEST_TIMEOUT
+        order, txn = self.create_payment(
+            timeout + 10, merchant_request_id='mr_late',
+            checkout_request_id='cr_late'
+        )
+        canceled_order, canceled_txn = self.create_payment(
+            timeout + 10, merchant_request_id='mr_canceled',
+            checkout_request_id='cr_canceled'
+        )
+        Order.objects.filter(pk=canceled_order.pk).update(
+            status=OrderStatus.CANCELED
+        )
+        assert expire_overdue_transactions() == 2
+        txn.refresh_from_db()
+        canceled_txn.refresh_from_db()
+
+        response, status = self.callback(txn)
+
+        assert status == 200
+        assert 'verification_code' in response
+        order.refresh_from_db()
+        assert order.is_paid is True
+        txn.refresh_from_db()
+        assert txn.status == TransactionStatus.SUCCESS
+        assert payment_succeeded.delay.call_count == 1
+
+        # paid after the order was canceled, left to refund_orders
+        assert self.callback(canceled_txn) == ({'success': True}, 200)
+        canceled_order.refresh_from_db()
+        assert canceled_order.is_paid is False
+        assert list(refundable_orders()) == [canceled_order]
+        assert payment_succeeded.delay.call_count == 1
@@ -0,0 +1,129 @@
+# system
+import time
+
+# django
+from django.core.management import CommandError, call_command
+
+# third party
+import pytest
+import requests
+
+from apps.core.models import Job
+from apps.management.dashboard.tests.factories import ShopFactory, \
+    WarehouseFactory
+from apps.management.orders.models import Order, Payment
+from apps.mpesa_gateway.loadtest import PaymentLoadTest, percentile, \
+    format_report
+from apps.mpesa_gateway.models import MPesaTransaction, TransactionStatus
+from apps.mpesa_gateway.simulator import DarajaSimulator
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([3], 99) == 3
+    assert percentile([], 50) is None
+
+
+class TestDarajaSimulator:
+
+    @pytest.fixture
+    def callbacks(self):
+        return []
+
+    def test_stk_push_callback(self, callbacks):
+        def deliver(url, payload):
+            callbacks.append((url, payload))
+
+        with DarajaSimulator(callback_delay=0.01, deliver=deliver) as daraja:
+            response = requests.post(
+                daraja.urls['MPESA_STK_PUSH_URL'],
+                json={
+                    'Amount': '10',
+                    'PhoneNumber': '254708374149',
+                    'CallBackURL': 'http://shop.test/mpesa-result/'
+                }
+            ).json()
+            assert response['ResponseCode'] == '0'
+
+            token = requests.get(daraja.urls['MPESA_OAUTH2TOKEN_URL']).json()
+            assert token['access_token']
+
+            while daraja.stats['callbacks_sent'] < 1:
+                time.sleep(0.01)
+
+        url, payload = callbacks[0]
+        callback = payload['Body']['stkCallback']
+        assert url == 'http://shop.test/mpesa-result/'
+        assert callback['CheckoutRequestID'] == response['CheckoutRequestID']
+        assert callback['ResultCode'] == 0
+        assert daraja.stats['stk_push'] == 1
+        assert daraja.stats['oauth'] == 1
+
+    def test_errors_and_cancels(self, callbacks):
+        def deliver(url, payload):
+            callbacks.append(payload)
+
+        with DarajaSimulator(error_rate=1, deliver=deliver) as daraja:
+            response = requests.post(daraja.urls['MPESA_STK_PUSH_URL'])
+            assert response.status_code == 503
+
+        with DarajaSimulator(cancel_rate=1, deliver=deliver) as daraja:
+            requests.post(daraja.urls['MPESA_STK_PUSH_URL'], json={})
+            while daraja.stats['callbacks_sent'] < 1:
+                time.sleep(0.01)
+
+        assert callbacks[0]['Body']['stkCallback']['ResultCode'] == 1032
+
+
+class TestPaymentLoadTest:
+    pytestmark = pytest.mark.django_db(transaction=True)
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self):
+        self.shop = ShopFactory()
+        WarehouseFactory(shop=self.shop)
+
+    def test_payment_flow(self, settings):
+        # the STK pushes go through the queue and the load test workers
+        settings.JOBS = dict(settings.JOBS, EAGER=False)
+        simulator = DarajaSimulator(latency=0.01, callback_delay=0.05)
+        with simulator:
+            report = PaymentLoadTest(
+                self.shop, simulator, orders=20, concurrency=4, timeout=10,
+                keep=True
+            ).run()
+
+        summary = report.summary()
+        assert summary['completed'] == 20
+        assert summary['statuses'] == {'Success': 20}
+        assert summary['throughput'] > 0
+        for stage in ('order', 'stk_push', 'callback', 'end_to_end'):
+            assert summary['latency'][stage]['p99'] is not None
+        assert simulator.stats['callbacks_sent'] == 20
+        assert simulator.stats['oauth'] == 1
+        assert MPesaTransaction.objects.filter(
+            status=TransactionStatus.SUCCESS
+        ).count() == 20
+        assert len(format_report(summary)) == 8
+
+    def test_cancelled_payments(self):
+        simulator = DarajaSimulator(cancel_rate=1, callback_delay=0.01)
+        with simulator:
+            report = PaymentLoadTest(
+                self.shop, simulator, orders=3, concurrency=3, timeout=10
+            ).run()
+
+        assert report.summary()['statuses'] == {'Canceled': 3}
+        # cleaned up
+        assert not Order.objects.exists()
+        assert not Payment.objects.exists()
+        assert not MPesaTransaction.objects.exists()
+        assert not Job.objects.exists()
+
+    def test_command_requires_debug(self, settings):
+        settings.DEBUG = False
+        with pytest.raises(CommandError):
+            call_command('mpesa_loadtest', self.shop.pk)
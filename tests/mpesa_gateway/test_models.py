@@ -0,0 +1,53 @@
+# third party
+import pytest
+
+from apps.management.dashboard.tests.factories import TransactionFactory
+from apps.mpesa_gateway.models import MPesaTransaction, \
+    MPesaTransactionPayload
+
+
+class TestTransactionPayload:
+    pytestmark = pytest.mark.django_db
+
+    def test_payload_is_stored_aside(self, django_assert_num_queries):
+        txn = TransactionFactory(response_data='{"ResponseCode": "0"}')
+        assert MPesaTransactionPayload.objects.get(
+            transaction=txn
+        ).response_data == '{"ResponseCode": "0"}'
+
+        with django_assert_num_queries(1):
+            txn = MPesaTransaction.objects.get(pk=txn.pk)
+        # loaded on first access only
+        with django_assert_num_queries(1):
+            assert txn.response_data == '{"ResponseCode": "0"}'
+            assert txn.callback_data == ''
+
+    def test_update_payload(self):
+        txn = TransactionFactory()
+        assert not MPesaTransactionPayload.objects.exists()
+        assert txn.callback_data == ''
+
+        txn.callback_data = '{"Body": {}}'
+        assert txn.callback_data == '{"Body": {}}'
+        txn.save()
+
+        txn = MPesaTransaction.objects.get(pk=txn.pk)
+        assert txn.callback_data == '{"Body": {}}'
+
+        txn.callback_data = '{"Body": {"stkCallback": {}}}'
+        txn.save_payload()
+        assert MPesaTransactionPayload.objects.get().callback_data == \
+            '{"Body": {"stkCallback": {}}}'
+
+    def test_bulk_create(self):
+        transactions = MPesaTransaction.objects.bulk_create([
+            TransactionFactory.build(response_data=f'response {i}')
+            for i in range(3)
+        ] + [TransactionFactory.build()])
+
+        assert sorted(MPesaTransactionPayload.objects.values_list(
+            'transaction', 'response_data'
+        )) == [
+            (txn.pk, f'response {i}')
+            for i, txn in enumerate(transactions[:3])
+        ]
@@ -0,0 +1,162 @@
+# system
+from decimal import Decimal
+
+# django
+from django.core.management import call_command
+
+# third party
+import pytest
+
+from apps.core.http import http_client
+from apps.management.dashboard.tests.factories import OrderFactory, \
+    PaymentFactory, ShopFactory, TransactionFactory
+from apps.management.orders.constants import OrderStatus
+from apps.mpesa_gateway.models import MPesaTransaction, TransactionStatus, \
+    TransactionType, ResponseCode
+from apps.mpesa_gateway.refunds import refundable_orders, refund_orders
+from tests.mpesa_gateway.stubs import StubServer
+
+
+class TestBulkRefund:
+    pytestmark = pytest.mark.django_db
+
+    reversal_response = {
+        'ResponseCode': '0',
+        'ResponseDescription': 'Accept the service request successfully.',
+        'ConversationID': 'AG_20180326_00005ca7f7c21d608166',
+        'OriginatorConversationID': '12345-67890-1',
+    }
+
+    @pytest.fixture(autouse=True)
+    def setup_test_data(self, manager):
+        self.shop = ShopFactory()
+
+    def create_order(self, status=OrderStatus.CANCELED,
+                     txn_status=TransactionStatus.SUCCESS):
+        order = OrderFactory(shop=self.shop, status=status)
+        PaymentFactory(
+            order=order,
+            transaction=TransactionFactory(amount=10, status=txn_status)
+        )
+        return order
+
+    @pytest.fixture
+    def reversal_api(self, settings):
+        with StubServer(self.reversal_response) as api:
+            settings.MPESA_STK_REVERSAL_URL = api.url + 'reversal'
+            yield api
+
+    def test_refundable_orders(self, django_assert_num_queries):
+        refundable = self.create_order()
+        self.create_order(status=OrderStatus.COMPLETED)
+        self.create_order(txn_status=TransactionStatus.FAILED)
+
+        refunded = self.create_order()
+        TransactionFactory(
+            transaction_type=TransactionType.REVERSAL,
+            response_code=ResponseCode.SUCCESS,
+            parent=refunded.payment.transaction
+        )
+        # reversals without a response may have been delivered
+        in_flight = self.create_order()
+        TransactionFactory(
+            transaction_type=TransactionType.REVERSAL,
+            response_code='',
+            parent=in_flight.payment.transaction
+        )
+        # failed reversals are retried
+        retried = self.create_order()
+        TransactionFactory(
+            transaction_type=TransactionType.REVERSAL,
+            response_code=ResponseCode.INSUFFICIENT_FUNDS,
+            parent=retried.payment.transaction
+        )
+
+        with django_assert_num_queries(1):
+            orders = list(refundable_orders())
+            transactions = [order.payment.transaction for order in orders]
+
+        assert orders == [refundable, retried]
+        assert transactions == [
+            refundable.payment.transaction, retried.payment.transaction
+        ]
+
+    def test_refund_orders(self, reversal_api, django_assert_num_queries):
+        orders = [self.create_order() for _ in range(50)]
+
+        # one select, 3 inserts of up to 20 reversals before sending, then
+        # 3 updates of the responses and inserts of their payloads
+        with django_assert_num_queries(10):
+            report = refund_orders(workers=8, rate=1000, batch_size=20)
+
+        assert report.as_dict() == {
+            'selected': 50,
+            'refunded': 50,
+            'failed': 0,
+            'amount': Decimal(500),
+            'failures': [],
+            'elapsed': report.as_dict()['elapsed'],
+        }
+        assert len(reversal_api.requests) == 50
+
+        reversals = MPesaTransaction.objects.filter(
+            transaction_type=TransactionType.REVERSAL
+        )
+        assert sorted(reversals.values_list('parent', flat=True)) == sorted(
+            order.payment.transaction_id for order in orders
+        )
+
+        # refunded orders are not selected again
+        assert refund_orders().selected == 0
+
+    def test_rejected_reversals(self, reversal_api):
+        reversal_api.status = 400
+        order = self.create_order()
+
+        report = refund_orders()
+
+        assert report.refunded == 0
+        assert report.failures == [
+            (order.order_number, 'Reversal request rejected')
+        ]
+        reversal = MPesaTransaction.objects.get(
+            transaction_type=TransactionType.REVERSAL
+        )
+        assert reversal.response_code == ResponseCode.UNKNOWN
+        # rejected reversals are retried
+        assert refund_orders(dry_run=True).selected == 1
+
+    def test_unknown_outcome(self, reversal_api, monkeypatch):
+        endpoint = http_client.get_endpoint('mpesa-reversal')
+        monkeypatch.setattr(endpoint, 'timeout', 0.1)
+        monkeypatch.setattr(endpoint, 'retries', 0)
+        reversal_api.delay = 0.3
+        order = self.create_order()
+
+        report = refund_orders()
+
+        assert report.refunded == 0
+        assert report.failed == 1
+        reversal = MPesaTransaction.objects.get(
+            transaction_type=TransactionType.REVERSAL
+        )
+        assert reversal.parent == order.payment.transaction
+        assert reversal.response_code == ''
+        # the reversal may have been delivered, it's not sent again
+        assert refund_orders(dry_run=True).selected == 0
+        assert len(reversal_api.requests) == 1
+
+    def test_command(self, reversal_api, capsys):
+        other_shop_order = OrderFactory(status=OrderStatus.CANCELED)
+        PaymentFactory(
+            order=other_shop_order,
+            transaction=TransactionFactory(
+                amount=10, status=TransactionStatus.SUCCESS
+            )
+        )
+        self.create_order()
+
+        call_command('refund_orders', shop=self.shop.pk)
+
+        assert 'Refunded 1 of 1 orders' in capsys.readouterr().out
+        assert refundable_orders().get() == other_shop_order
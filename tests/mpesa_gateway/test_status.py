@@ -0,0 +1,83 @@
+# system
+import datetime
+
+# django
+from django.urls import reverse
+from django.utils import timezone
+
+# third party
+import pytest
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing.websocket import WebsocketCommunicator
+
+# ofinta
+from apps.management.dashboard.tests.factories import OrderFactory, \
+    TransactionFactory
+from apps.management.orders.models import Payment
+from apps.mpesa_gateway.models import MPesaTransaction
+from apps.mpesa_gateway.utils import notify_transaction_status, \
+    get_transaction_status
+from ofinta.routing import application
+
+
+def create_payment(seconds_ago=0):
+    order = OrderFactory(pending_transaction=True)
+    txn = TransactionFactory()
+    MPesaTransaction.objects.filter(pk=txn.pk).update(
+        created_at=timezone.now() - datetime.timedelta(seconds=seconds_ago)
+    )
+    Payment.objects.create(order=order, transaction=txn)
+    return order
+
+
+class TestTransactionStatusView:
+    pytestmark = pytest.mark.django_db
+
+    def get_status(self, client, order_id):
+        url = reverse('get_transaction_status', args=(order_id, ))
+        return client.get(url)
+
+    def test_status(self, client, settings, django_assert_num_queries):
+        order = create_payment()
+        with django_assert_num_queries(1):
+            assert get_transaction_status(order.pk) == 'New'
+
+        response = self.get_status(client, order.pk)
+        assert response.json() == {'status': 'New'}
+
+        overdue_order = create_payment(settings.MPESA_REQUEST_TIMEOUT + 1)
+        response = self.get_status(client, overdue_order.pk)
+        assert response.json() == {'status': 'Expired'}
+
+    def test_no_transaction(self, client):
+        order = OrderFactory()
+        assert self.get_status(client, order.pk).status_code == 404
+
+
+class TestTransactionStatusConsumer:
+    pytestmark = pytest.mark.django_db(transaction=True)
+
+    def test_status_is_pushed(self, settings):
+        settings.CHANNEL_LAYERS = {
+            'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}
+        }
+        order = create_payment()
+
+        async def watch():
+            communicator = WebsocketCommunicator(
+                application, f'/ws/transaction/{order.pk}/status/'
+            )
+            connected, _ = await communicator.connect()
+            assert connected
+            assert await communicator.receive_json_from() == {'status': 'New'}
+
+            await database_sync_to_async(notify_transaction_status)(
+                order.pk, 'Success'
+            )
+            assert await communicator.receive_json_from() == {
+                'status': 'Success'
+            }
+            await communicator.disconnect()
+
+        async_to_sync(watch)()
@@ -0,0 +1,124 @@
+# system
+import threading
+
+# third party
+import pytest
+from asgiref.sync import async_to_sync
+
+# ofinta
+from apps.mpesa_gateway.tokens import TokenStore, access_tokens, \
+    get_access_tokens
+from tests.mpesa_gateway.stubs import StubServer
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenStore:
+
+    @pytest.fixture
+    def oauth(self):
+        with StubServer({'access_token': 'token-1', 'expires_in': '3599'}) \
+                as server:
+            yield server
+
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    def get_store(self, server, clock, **kwargs):
+        return TokenStore(
+            url=server.url, consumer_key='key', consumer_secret='secret',
+            refresh_margin=60, clock=clock, **kwargs
+        )
+
+    def test_token_is_reused(self, oauth, clock):
+        store = self.get_store(oauth, clock)
+        assert store.get() == 'token-1'
+        assert store.get() == 'token-1'
+
+        assert len(oauth.requests) == 1
+        assert 'grant_type=client_credentials' in oauth.requests[0]
+        assert store.stats == {
+            'hits': 1, 'misses': 1, 'refreshes': 1, 'failures': 0
+        }
+
+    def test_refresh_before_expiry(self, oauth, clock):
+        store = self.get_store(oauth, clock)
+        store.get()
+
+        clock.now += 3599 - 61
+        store.get()
+        assert len(oauth.requests) == 1
+
+        oauth.response = {'access_token': 'token-2', 'expires_in': '3599'}
+        clock.now += 2
+        assert store.get() == 'token-2'
+        assert len(oauth.requests) == 2
+
+    def test_failed_refresh_keeps_valid_token(self, oauth, clock):
+        store = self.get_store(oauth, clock)
+        store.get()
+
+        oauth.status = 500
+        clock.now += 3599 - 30
+        assert store.get() == 'token-1'
+        assert store.failures == 1
+
+        clock.now += 60
+        assert store.get() is None
+
+    def test_invalidate(self, oauth, clock):
+        store = self.get_store(oauth, clock)
+        store.get()
+        store.invalidate()
+        store.get()
+        assert len(oauth.requests) == 2
+
+    def test_ainvalidate_does_not_wait_for_refresh(self, oauth, clock):
+        store = self.get_store(oauth, clock)
+        store.get()
+
+        # a refresh is running in another thread
+        store._lock.acquire()
+        try:
+            async_to_sync(store.ainvalidate)()
+            assert store.get() == 'token-1'
+        finally:
+            store._lock.release()
+
+        async_to_sync(store.ainvalidate)()
+        store.get()
+        assert len(oauth.requests) == 2
+
+    def test_single_flight(self, oauth):
+        oauth.delay = 0.2
+        store = self.get_store(oauth, FakeClock())
+
+        tokens = []
+        threads = [
+            threading.Thread(target=lambda: tokens.append(store.get()))
+            for _ in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert tokens == ['token-1'] * 20
+        assert len(oauth.requests) == 1
+        assert store.misses == 1
+        assert store.hits == 19
+
+
+def test_get_access_tokens():
+    assert get_access_tokens() is access_tokens
+    store = get_access_tokens('http://daraja.test/oauth')
+    assert store.url == 'http://daraja.test/oauth'
+    assert get_access_tokens('http://daraja.test/oauth') is store